@@ -0,0 +1,426 @@
+# backends.py
+"""
+Accelerator back-ends used by the worker.
+
+``PynqBackend`` drives the real overlays through PYNQ (``Overlay`` + DMA
+``allocate``).  ``EmulatorBackend`` reproduces the same protocol in NumPy -
+packed-RGB ``uint32`` DMA streams, the ``image_width`` / ``image_height`` /
+``kernel_factor`` registers and the 3×3 kernel register bank - so the whole
+pipeline can run (and be benchmarked) on any Linux box.
+"""
+
+from __future__ import annotations
+import json, sys, time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "mysite"))   # Django-free helpers
+from api import swengine
+
+try:
+    from pynq import Overlay, allocate, DefaultIP
+except ImportError:                     # not running on a PYNQ board
+    Overlay = allocate = DefaultIP = None
+
+# --------------------------------------------------------------------------- #
+# Register map of the HLS s_axi_control slaves (see overlays/*/*.hwh)
+# --------------------------------------------------------------------------- #
+REG_CTRL   = 0x00
+REG_WIDTH  = 0x10
+REG_HEIGHT = 0x18
+REG_FACTOR = 0x20
+REG_KERNEL = 0x40                       # 9 × int32, row-major
+
+AP_START, AP_DONE, AP_IDLE = 0x1, 0x2, 0x4
+
+# --------------------------------------------------------------------------- #
+# FPGA custom driver
+# --------------------------------------------------------------------------- #
+def _shadowed(attr: str) -> property:
+    """Register property that skips the bus write when the value is unchanged."""
+    return property(lambda s: s.reg(getattr(s, attr)),
+                    lambda s, v: s.set_reg(getattr(s, attr), v))
+
+
+class _KernelRegisters:
+    """
+    Register accessors shared by the real and the emulated kernel IPs.
+    Writes go through a shadow copy of the register file so repeated
+    configuration of the same frame size / kernel never reaches the bus;
+    call ``invalidate_shadow()`` whenever the bitstream is (re)downloaded.
+    The 3×3 kernel bank is written as one 36-byte burst.
+    """
+    _shadow: dict[int, int]
+
+    def invalidate_shadow(self) -> None:
+        self._shadow = {}
+
+    def reg(self, addr: int) -> int:
+        v = self._shadow.get(addr)
+        return self.read(addr) if v is None else v
+
+    def set_reg(self, addr: int, value) -> None:
+        value = int(value) & 0xFFFFFFFF
+        if self._shadow.get(addr) != value:
+            self.write(addr, value)
+            self._shadow[addr] = value
+
+    width  = _shadowed("width_addr")
+    height = _shadowed("height_addr")
+    factor = _shadowed("factor_addr")
+
+    @property
+    def kernel(self):
+        flat = [self.reg(self.kernel_addr + 4*i) for i in range(9)]
+        return np.array(flat, np.uint32).view(np.int32).reshape(3, 3)
+
+    @kernel.setter
+    def kernel(self, m):
+        flat = np.array(m, np.int32).ravel()
+        if flat.size != 9:
+            raise ValueError("Kernel must be 3×3")
+        words = [int(v) & 0xFFFFFFFF for v in flat]
+        addrs = [self.kernel_addr + 4*i for i in range(9)]
+        if [self._shadow.get(a) for a in addrs] == words:
+            return
+        self.write(self.kernel_addr, flat.astype("<i4").tobytes())
+        self._shadow.update(zip(addrs, words))
+
+
+if DefaultIP is not None:
+    class FilterKernel(_KernelRegisters, DefaultIP):
+        bindto = ["xilinx.com:hls:filter_kernel:1.0"]
+
+        def __init__(self, desc):
+            super().__init__(description=desc)
+            rm = self.register_map
+            self.width_addr  = rm.image_width.address
+            self.height_addr = rm.image_height.address
+            self.factor_addr = rm.kernel_factor.address
+            self.kernel_addr = REG_KERNEL
+            self.invalidate_shadow()
+
+    class GrayscaleKernel(_KernelRegisters, DefaultIP):
+        bindto = ["xilinx.com:hls:grayscale_kernel:1.0"]
+
+        def __init__(self, desc):
+            super().__init__(description=desc)
+            rm = self.register_map
+            self.width_addr  = rm.width.address
+            self.height_addr = rm.height.address
+            self.invalidate_shadow()
+
+# --------------------------------------------------------------------------- #
+# Kernel semantics (what the HLS cores compute per pixel)
+# --------------------------------------------------------------------------- #
+GRAY_WEIGHTS = swengine.GRAY_WEIGHTS
+
+# A 0x00RRGGBB word is stored little-endian as the bytes B, G, R, 0, so a
+# uint8 view of a DMA buffer is a BGRA image with a zero alpha channel.
+assert sys.byteorder == "little", "packed-RGB views assume a little-endian host"
+
+def bgra_view(buf: np.ndarray) -> np.ndarray:
+    """Zero-copy (h, w, 4) uint8 view of a (h, w) uint32 buffer."""
+    return np.asarray(buf).view(np.uint8).reshape(*buf.shape, 4)
+
+def pack_into(frame: np.ndarray, buf: np.ndarray, order: str = "rgb") -> None:
+    """Write a (h, w, 3) uint8 frame straight into ``buf`` as 0x00RRGGBB words."""
+    u8 = bgra_view(buf)
+    code = cv2.COLOR_RGB2BGRA if order == "rgb" else cv2.COLOR_BGR2BGRA
+    cv2.cvtColor(frame, code, dst=u8)
+    u8[..., 3] = 0
+
+def unpack(view: np.ndarray, order: str = "rgb", dst: np.ndarray | None = None) -> np.ndarray:
+    """Contiguous (h, w, 3) copy of a :func:`bgra_view`, in one pass."""
+    code = cv2.COLOR_BGRA2RGB if order == "rgb" else cv2.COLOR_BGRA2BGR
+    return cv2.cvtColor(view, code, dst=dst)
+
+# the HLS cores' arithmetic lives in the software reference engine
+grayscale_kernel = swengine.grayscale
+filter_kernel    = swengine.filter3x3
+
+# --------------------------------------------------------------------------- #
+# Overlay metadata (.hwh) cache
+# --------------------------------------------------------------------------- #
+_META_CACHE: dict[str, dict] = {}
+
+def _parse_hwh(hwh: Path) -> dict:
+    root = ET.parse(hwh).getroot()
+    for mod in root.iter("MODULE"):
+        if mod.get("MODTYPE", "").endswith("_kernel"):
+            regs = {}
+            for reg in mod.iter("REGISTER"):
+                props = {p.get("NAME"): p.get("VALUE") for p in reg.findall("PROPERTY")}
+                regs[reg.get("NAME")] = int(props["ADDRESS_OFFSET"])
+            return {"ip": mod.get("INSTANCE"), "vlnv": mod.get("VLNV"), "registers": regs}
+    raise ValueError(f"{hwh}: no HLS kernel IP found")
+
+def overlay_metadata(bitfile: str) -> dict:
+    """
+    Kernel IP instance and register offsets from the overlay's ``.hwh``.
+    Cached in memory and in ``<name>.meta.json`` next to the ``.hwh`` (keyed
+    on its size + mtime), so even a cold start skips the XML parse.
+    """
+    hwh = Path(bitfile).with_suffix(".hwh")
+    st = hwh.stat()
+    stamp = [st.st_size, st.st_mtime_ns]
+    meta = _META_CACHE.get(str(hwh))
+    if meta is not None and meta["stamp"] == stamp:
+        return meta
+    cache = hwh.with_suffix(".meta.json")
+    try:
+        meta = json.loads(cache.read_text())
+        if meta.get("stamp") != stamp:
+            meta = None
+    except (OSError, ValueError):
+        meta = None
+    if meta is None:
+        meta = {**_parse_hwh(hwh), "stamp": stamp}
+        try:
+            cache.write_text(json.dumps(meta, indent=2))
+        except OSError:
+            pass                        # read-only checkout: memory cache only
+    _META_CACHE[str(hwh)] = meta
+    return meta
+
+# --------------------------------------------------------------------------- #
+# Emulated overlay
+# --------------------------------------------------------------------------- #
+class EmulatedBuffer(np.ndarray):
+    """Plain ndarray standing in for a contiguous ``pynq.allocate`` buffer."""
+    physical_address = 0
+
+    def freebuffer(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def invalidate(self) -> None:
+        pass
+
+
+class EmulatedIP(_KernelRegisters):
+    """Register file + compute core of ``grayscale_kernel`` / ``filter_kernel``."""
+
+    def __init__(self, kind: str, registers: dict[str, int]):
+        self.kind = kind
+        self.width_addr  = registers.get("image_width",  registers.get("width", REG_WIDTH))
+        self.height_addr = registers.get("image_height", registers.get("height", REG_HEIGHT))
+        self.factor_addr = registers.get("kernel_factor", REG_FACTOR)
+        self.kernel_addr = registers.get("Memory_kernel", REG_KERNEL)
+        self.reset()
+
+    def reset(self) -> None:
+        """Power-on register state, as after a bitstream download."""
+        self._regs: dict[int, int] = {REG_CTRL: AP_IDLE}
+        self.bus_writes = 0
+        self.invalidate_shadow()
+
+    def read(self, offset: int) -> int:
+        return self._regs.get(offset, 0)
+
+    def write(self, offset: int, value) -> None:
+        self.bus_writes += 1
+        if isinstance(value, (bytes, bytearray)):           # burst write
+            for i, v in enumerate(np.frombuffer(value, "<u4")):
+                self._regs[offset + 4*i] = int(v)
+            return
+        value = int(value) & 0xFFFFFFFF
+        if offset == REG_CTRL and value & AP_START:
+            value = (self._regs[REG_CTRL] & ~(AP_DONE | AP_IDLE)) | AP_START
+        self._regs[offset] = value
+
+    @property
+    def started(self) -> bool:
+        return bool(self._regs[REG_CTRL] & AP_START)
+
+    def process(self, src: np.ndarray, dst: np.ndarray) -> None:
+        """Consume one packed frame from ``src`` and stream the result to ``dst``."""
+        w, h = self.read(self.width_addr), self.read(self.height_addr)
+        if src.size != w*h or dst.size != w*h:
+            raise RuntimeError(f"DMA length {src.size} does not match {w}×{h} registers")
+        rgb = unpack(bgra_view(np.asarray(src).reshape(h, w)))
+        if self.kind == "grayscale":
+            out = grayscale_kernel(rgb)
+        else:
+            k = [self.read(self.kernel_addr + 4*i) for i in range(9)]
+            k = np.array(k, np.uint32).view(np.int32).reshape(3, 3)
+            out = filter_kernel(rgb, k, self.read(self.factor_addr))
+        pack_into(out, np.asarray(dst).reshape(h, w))
+        self._regs[REG_CTRL] = AP_DONE | AP_IDLE
+
+
+class _EmulatedChannel:
+    def __init__(self, dma: "EmulatedDMA"):
+        self._dma, self.buffer = dma, None
+
+    def start(self) -> None:
+        pass
+
+    def transfer(self, buffer, *_, **__) -> None:
+        self.buffer = buffer
+        self._dma._kick()
+
+    def wait(self) -> None:
+        if self.buffer is not None:
+            raise RuntimeError("DMA transfer never completed (is ap_start set?)")
+
+
+class EmulatedDMA:
+    """AXI DMA whose MM2S → S2MM streams loop through an :class:`EmulatedIP`."""
+
+    def __init__(self, ip: EmulatedIP):
+        self._ip = ip
+        self.sendchannel = _EmulatedChannel(self)
+        self.recvchannel = _EmulatedChannel(self)
+
+    def _kick(self) -> None:
+        src, dst = self.sendchannel.buffer, self.recvchannel.buffer
+        if src is None or dst is None or not self._ip.started:
+            return
+        self._ip.process(src, dst)
+        self.sendchannel.buffer = self.recvchannel.buffer = None
+
+
+class EmulatedOverlay:
+    """Exposes the same attribute names as the PYNQ overlays."""
+
+    def __init__(self, bitfile: str):
+        meta = overlay_metadata(bitfile)
+        self._ip = EmulatedIP(Path(bitfile).stem, meta["registers"])
+        setattr(self, meta["ip"], self._ip)
+        self.axi_dma_0 = EmulatedDMA(self._ip)
+
+    def download(self) -> None:
+        self._ip.reset()
+
+# --------------------------------------------------------------------------- #
+# DMA buffer pool
+# --------------------------------------------------------------------------- #
+class BufferPool:
+    """
+    Reusable DMA buffers keyed by (shape, dtype, tag), kept for as long as
+    the overlay they were allocated for.  When the pool grows past
+    ``max_bytes`` the least recently used buffers of *other* shapes are
+    freed, so a resolution change between jobs does not pin stale memory.
+    """
+
+    def __init__(self, allocate, max_bytes: int = 64 << 20):
+        self._allocate = allocate
+        self.max_bytes = max_bytes
+        self._bufs: OrderedDict[tuple, object] = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self._bufs.values())
+
+    def get(self, shape, dtype, tag: str = "in"):
+        key = (tuple(shape), np.dtype(dtype).str, tag)
+        buf = self._bufs.get(key)
+        if buf is not None:
+            self.hits += 1
+            self._bufs.move_to_end(key)
+            return buf
+        self.misses += 1
+        buf = self._bufs[key] = self._allocate(key[0], dtype)
+        self._evict(keep=key[0])
+        return buf
+
+    def _evict(self, keep: tuple) -> None:
+        while self.nbytes > self.max_bytes:
+            victim = next((k for k in self._bufs if k[0] != keep), None)
+            if victim is None:
+                break
+            self._bufs.pop(victim).freebuffer()
+            self.evictions += 1
+
+    def clear(self) -> None:
+        for buf in self._bufs.values():
+            buf.freebuffer()
+        self._bufs.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "buffers": len(self._bufs),
+                "bytes": self.nbytes}
+
+# --------------------------------------------------------------------------- #
+# Back-end interface
+# --------------------------------------------------------------------------- #
+class AcceleratorBackend:
+    """
+    What ``load_overlay`` / ``run_accelerator`` need from the hardware.
+    Overlay objects are parsed once per bitstream and kept; switching back
+    to one only re-programs the FPGA.  ``timing`` describes the last
+    ``overlay()`` call: metadata (parse) vs. program (download) time.
+    """
+    name = "?"
+
+    def __init__(self):
+        self._overlays: dict[str, object] = {}
+        self.timing: dict[str, float] = {}
+
+    def overlay(self, bitfile: str):
+        """Program *bitfile*; return an object exposing ``axi_dma_0`` and the kernel IP."""
+        t0 = time.perf_counter()
+        ol = self._overlays.get(bitfile)
+        cached = ol is not None
+        if ol is None:
+            ol = self._overlays[bitfile] = self._parse(bitfile)
+        t1 = time.perf_counter()
+        ol.download()
+        t2 = time.perf_counter()
+        self.timing = {"parse_ms": (t1 - t0)*1e3, "program_ms": (t2 - t1)*1e3,
+                       "cached": cached}
+        return ol
+
+    def _parse(self, bitfile: str):
+        """Build the overlay object for *bitfile* without programming it."""
+        raise NotImplementedError
+
+    def allocate(self, shape, dtype):
+        """Return a DMA-capable buffer with ``freebuffer()``."""
+        raise NotImplementedError
+
+
+class PynqBackend(AcceleratorBackend):
+    name = "pynq"
+
+    def _parse(self, bitfile: str):
+        try:
+            # PYNQ >= 3.0 pickles the parsed .hwh next to the bitstream
+            return Overlay(bitfile, download=False, gen_cache=True)
+        except TypeError:
+            return Overlay(bitfile, download=False)
+
+    def allocate(self, shape, dtype):
+        return allocate(shape, dtype=dtype)
+
+
+class EmulatorBackend(AcceleratorBackend):
+    name = "emulator"
+
+    def _parse(self, bitfile: str):
+        return EmulatedOverlay(bitfile)
+
+    def allocate(self, shape, dtype):
+        return np.zeros(shape, dtype).view(EmulatedBuffer)
+
+
+BACKENDS = {"pynq": PynqBackend, "emulator": EmulatorBackend}
+
+def get_backend(name: str = "auto") -> AcceleratorBackend:
+    """``auto`` picks PYNQ when it is importable, the emulator otherwise."""
+    if name == "auto":
+        name = "pynq" if Overlay is not None else "emulator"
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend «{name}»")
+    if name == "pynq" and Overlay is None:
+        raise RuntimeError("pynq is not installed - use WORKER_BACKEND=emulator")
+    return BACKENDS[name]()
@@ -0,0 +1,75 @@
+# benchmarks/bench_conv.py
+"""
+Software 3×3 filter: the original SciPy path against the NumPy engine.
+
+    python3 benchmarks/bench_conv.py [--repeat N] [--threads N]
+
+"scipy" is ``run_conv2d`` - the app's original software path, three float ``convolve2d`` calls with
+the kernel pre-divided by the factor.  "engine" is ``swengine.filter3x3`` -
+integer accumulation, floor-divide, saturate, exactly what the FPGA does.
+The last column is the share of pixels where the two disagree.  They are
+not meant to match: the SciPy path rounds in float, flips the kernel (a
+true convolution) and wraps out-of-range sums when it stores them into its
+uint8 array, so sharpening noise disagrees almost everywhere.
+"""
+
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+from scipy.signal import convolve2d
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mysite"))
+from api import swengine  # noqa: E402
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920), "4K": (2160, 3840)}
+KERNELS = {                             # name: (coeffs, factor)
+    "gauss":   ([1, 2, 1, 2, 4, 2, 1, 2, 1], 16),
+    "box":     ([1, 1, 1, 1, 1, 1, 1, 1, 1], 9),
+    "sharpen": ([0, -1, 0, -1, 5, -1, 0, -1, 0], 1),
+    "emboss":  ([-2, -1, 0, -1, 1, 1, 0, 1, 2], 1),
+}
+
+
+def run_conv2d(img_rgb, k):
+    """The original float SciPy filter."""
+    out = np.zeros_like(img_rgb)
+    for c in range(3):
+        out[..., c] = convolve2d(img_rgb[..., c], k, mode="same", boundary="symm")
+    return out.clip(0, 255).astype(np.uint8)
+
+
+def bench(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e3
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--threads", type=int, default=None,
+                    help="engine threads (default: one per CPU)")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'':6} {'kernel':8} {'scipy':>10} {'engine':>10} {'speed-up':>9} {'differ':>8}")
+    for name, (h, w) in RESOLUTIONS.items():
+        rgb = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        for kname, (coeffs, factor) in KERNELS.items():
+            k = np.array(coeffs).reshape(3, 3)
+            ref = run_conv2d(rgb, k / factor)
+            out = swengine.filter3x3(rgb, k, factor, threads=args.threads)
+            differ = np.count_nonzero((ref != out).any(axis=-1)) / (h * w)
+            t_scipy  = bench(lambda: run_conv2d(rgb, k / factor), args.repeat)
+            t_engine = bench(lambda: swengine.filter3x3(rgb, k, factor, threads=args.threads),
+                             args.repeat)
+            print(f"{name:6} {kname:8} {t_scipy:8.1f}ms {t_engine:8.1f}ms "
+                  f"{t_scipy/t_engine:8.1f}× {differ:8.1%}")
+
+
+if __name__ == "__main__":
+    main()
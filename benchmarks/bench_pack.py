@@ -0,0 +1,75 @@
+# benchmarks/bench_pack.py
+"""
+Per-frame host cost of moving a frame in and out of the DMA buffers
+(everything ``run_accelerator`` does except the DMA wait itself).
+
+    python3 benchmarks/bench_pack.py [--repeat N]
+
+"before" is the original path - allocate/freebuffer per frame, three
+``astype(np.uint32)`` copies + shifts into ``comb``, shift/stack unpack.
+"after" is the pooled buffer, in-place pack and BGRA-view unpack.
+"""
+
+from __future__ import annotations
+import argparse, sys, time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from backends import BufferPool, EmulatorBackend, bgra_view, pack_into, unpack  # noqa: E402
+
+RESOLUTIONS = {"720p": (720, 1280), "1080p": (1080, 1920)}
+
+
+def before(rgb: np.ndarray, allocate) -> np.ndarray:
+    comb = ((rgb[..., 0].astype(np.uint32) << 16) |
+            (rgb[..., 1].astype(np.uint32) <<  8) |
+             rgb[..., 2].astype(np.uint32))
+    input_buffer  = allocate(comb.shape, dtype=np.uint32)
+    output_buffer = allocate(comb.shape, dtype=np.uint32)
+    input_buffer[:] = comb
+    output_buffer[:] = input_buffer                  # stands in for the DMA
+    r = (output_buffer >> 16) & 0xFF
+    g = (output_buffer >>  8) & 0xFF
+    b =  output_buffer        & 0xFF
+    out = np.stack((r, g, b), axis=-1).astype(np.uint8)
+    input_buffer.freebuffer(); output_buffer.freebuffer()
+    return out
+
+
+def after(rgb: np.ndarray, pool: BufferPool) -> np.ndarray:
+    input_buffer  = pool.get(rgb.shape[:2], np.uint32, "in")
+    output_buffer = pool.get(rgb.shape[:2], np.uint32, "out")
+    pack_into(rgb, input_buffer)
+    output_buffer[:] = input_buffer                  # stands in for the DMA
+    return unpack(bgra_view(output_buffer))
+
+
+def bench(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1e3
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--repeat", type=int, default=50)
+    args = ap.parse_args()
+
+    backend = EmulatorBackend()
+    pool = BufferPool(backend.allocate)
+    rng = np.random.default_rng(0)
+    print(f"{'':6} {'before':>10} {'after':>10} {'speed-up':>9}")
+    for name, (h, w) in RESOLUTIONS.items():
+        rgb = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        assert np.array_equal(before(rgb, backend.allocate), after(rgb, pool))
+        t_before = bench(lambda: before(rgb, backend.allocate), args.repeat)
+        t_after  = bench(lambda: after(rgb, pool), args.repeat)
+        print(f"{name:6} {t_before:8.2f}ms {t_after:8.2f}ms {t_before/t_after:8.1f}×")
+
+
+if __name__ == "__main__":
+    main()
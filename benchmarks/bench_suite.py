@@ -0,0 +1,400 @@
+# benchmarks/bench_suite.py
+"""
+End-to-end benchmark suite; writes its numbers as JSON for comparing deploys.
+
+    python3 benchmarks/bench_suite.py [--backend emulator|pynq] [--only accel,video,...]
+                                      [--out FILE] [--baseline FILE] [--url URL | --serve]
+
+Sections:
+  accel    ``run_accelerator`` per-frame cost (wall and DMA wait) per kernel
+           and resolution; 4K goes through ``run_tiled``
+  video    ``process_video`` fps on a synthetic clip
+  history  ``list_history`` latency (first and last page) with N jobs indexed
+  api      enqueue→done latency through the REST endpoints
+
+accel / video / history run in this process, on the backend picked like the
+worker's (``--backend``, default ``WORKER_BACKEND`` or emulator), inside a
+temporary jobs dir and job index.  api talks to a running server (``--url``)
+or, with ``--serve``, starts ``manage.py runserver`` and ``worker.py`` on
+this box - only where no other worker is running - and removes its jobs
+afterwards.  Every image is random so the result cache never answers.
+
+The JSON holds ``meta`` (host, backend, versions, git revision) and a flat
+``metrics`` dict; ``*_ms`` are lower-is-better, ``*fps`` higher-is-better.
+``--baseline`` compares against an earlier file and exits with status 1 when
+a metric got worse by more than ``--tolerance``.
+"""
+
+from __future__ import annotations
+import argparse, io, json, os, platform, shutil, socket, statistics, subprocess
+import sys, tempfile, time, urllib.error, urllib.request, uuid
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+SECTIONS = ("accel", "video", "history", "api")
+RESOLUTIONS = {"480p": (480, 640), "720p": (720, 1280), "1080p": (1080, 1920),
+               "4K": (2160, 3840)}
+KERNELS = {                             # name: (worker kind, coeffs, factor)
+    "grayscale": ("grayscale", None, 1),
+    "gauss":     ("filter", [1, 2, 1, 2, 4, 2, 1, 2, 1], 16),
+}
+HISTORY_SIZES = (100, 1000, 5000)
+POLL_S = 0.02
+
+
+def bench(fn, repeat: int) -> list[float]:
+    """Milliseconds of each of *repeat* calls, after one warm-up call."""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1e3)
+    return times
+
+
+def _median(times: list[float]) -> float:
+    return round(statistics.median(times), 3)
+
+
+# --------------------------------------------------------------------------- #
+# In-process sections (worker + api modules in a scratch dir)
+# --------------------------------------------------------------------------- #
+def _sandbox(tmp: Path, backend: str):
+    """Import the worker with *backend*, its job files and index under *tmp*."""
+    os.environ["WORKER_BACKEND"] = backend
+    sys.path.insert(0, str(ROOT))
+    import worker                                       # noqa: E402
+    from api import jobqueue, jobutils, notify, resultcache
+
+    jobs = tmp / "jobs"
+    jobs.mkdir()
+    jobqueue.QUEUE_DB = tmp / "jobqueue.sqlite3"        # before the first connection
+    notify.NOTIFY_DIR = tmp / "notify"
+    resultcache.CACHE_DIR = tmp / "result_cache"
+    jobutils.JOBS_ROOT = worker.JOBS_DIR = jobs
+    worker.log.setLevel("WARNING")
+    return worker
+
+
+def _cfg(worker, kind: str, coeffs, factor: int):
+    if kind == "grayscale":
+        return worker.cfg_grayscale
+    kernel = np.array(coeffs, np.int32).reshape(3, 3)
+    return lambda a: worker.cfg_filter(a, factor, kernel)
+
+
+def bench_accel(worker, repeat: int, metrics: dict) -> None:
+    rng = np.random.default_rng(0)
+    print(f"{'accel':8} {'kernel':10} {'wall':>10} {'dma':>10} {'MP/s':>8}")
+    for name, (h, w) in RESOLUTIONS.items():
+        frame = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        for kname, (kind, coeffs, factor) in KERNELS.items():
+            worker.load_overlay(kind)
+            cfg = _cfg(worker, kind, coeffs, factor)
+            dma: list[float] = []
+            if worker._needs_tiling(frame):
+                out = np.empty_like(frame)
+                run = lambda: dma.append(worker.run_tiled(frame, cfg, "rgb", worker._halo(kind), out)[1])
+            else:
+                run = lambda: dma.append(worker.run_accelerator(frame, cfg)[1])
+            wall = bench(run, repeat)
+            key = f"accel.{kname}.{name}"
+            metrics[f"{key}.wall_ms"] = _median(wall)
+            metrics[f"{key}.dma_ms"] = _median(dma[1:])
+            mps = h * w / 1e6 / (metrics[f"{key}.wall_ms"] / 1e3)
+            print(f"{name:8} {kname:10} {metrics[f'{key}.wall_ms']:8.2f}ms "
+                  f"{metrics[f'{key}.dma_ms']:8.2f}ms {mps:8.1f}")
+
+
+def _write_clip(path: Path, size: tuple[int, int], frames: int, fps: float = 30.0) -> None:
+    import cv2
+    w, h = size
+    vw = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    rng = np.random.default_rng(1)
+    base = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+    for i in range(frames):                 # moving content, so every frame differs
+        vw.write(np.roll(base, 4 * i, axis=1))
+    vw.release()
+
+
+def bench_video(worker, tmp: Path, frames: int, metrics: dict) -> None:
+    print(f"{'video':8} {'kernel':10} {'fps':>10} {'ms/frame':>10}")
+    for name in ("720p", "1080p"):
+        h, w = RESOLUTIONS[name]
+        clip = tmp / f"clip_{name}.mp4"
+        _write_clip(clip, (w, h), frames)
+        for kname, (kind, coeffs, factor) in KERNELS.items():
+            job = worker.JOBS_DIR / f"job_vid_bench_{kname}_{name}"
+            job.mkdir()
+            shutil.copy(clip, job / "in.mp4")
+            if coeffs is not None:
+                (job / "factor.txt").write_text(str(factor))
+                (job / "filter.txt").write_text(" ".join(map(str, coeffs)))
+            worker.load_overlay(kind)       # not part of the measurement
+            t0 = time.perf_counter()
+            worker.process_video(job, f"{kind}_video")
+            wall = time.perf_counter() - t0
+            key = f"video.{kname}.{name}"
+            metrics[f"{key}.fps"] = round(frames / wall, 2)
+            metrics[f"{key}.frame_ms"] = round(wall / frames * 1e3, 3)
+            print(f"{name:8} {kname:10} {metrics[f'{key}.fps']:10.1f} "
+                  f"{metrics[f'{key}.frame_ms']:8.2f}ms")
+            shutil.rmtree(job)
+
+
+def _fake_jobs(jobs: Path, start: int, count: int) -> None:
+    from api import jobqueue
+    status = json.dumps({"stage": "finished", "timestamp": time.time(),
+                         "progress": {"done": 1, "total": 1}})
+    for i in range(start, start + count):
+        video = i % 10 == 0
+        job = jobs / f"job_{'vid' if video else 'img'}_{uuid.uuid4().hex}"
+        job.mkdir()
+        (job / "status.json").write_text(status)
+        (job / "hw_time.txt").write_text("1.00 ms")
+        kind = "filter_video" if video else ("filter" if i % 2 else "grayscale")
+        if kind.startswith("filter"):
+            (job / "factor.txt").write_text("16")
+            (job / "filter.txt").write_text("1 2 1 2 4 2 1 2 1")
+        jobqueue.enqueue(job, kind, state="done")
+
+
+def bench_history(worker, repeat: int, metrics: dict) -> None:
+    from api import jobqueue, jobutils
+    print(f"{'history':8} {'first page':>12} {'last page':>12}")
+    have = 0
+    for n in HISTORY_SIZES:
+        _fake_jobs(worker.JOBS_DIR, have, n - have)
+        have = n
+        rows = jobqueue.history_page(None, n)
+        last = rows[-jobutils.HISTORY_PAGE_SIZE - 1]["seq"]    # cursor of the oldest page
+        first_ms = bench(lambda: jobutils.list_history(), repeat)
+        last_ms = bench(lambda: jobutils.list_history(last), repeat)
+        metrics[f"history.{n}.first_page_ms"] = _median(first_ms)
+        metrics[f"history.{n}.last_page_ms"] = _median(last_ms)
+        print(f"{n:<8} {_median(first_ms):10.2f}ms {_median(last_ms):10.2f}ms")
+
+
+# --------------------------------------------------------------------------- #
+# REST API section
+# --------------------------------------------------------------------------- #
+def _multipart(fields: dict[str, str], files: dict[str, tuple[str, bytes]]) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for k, v in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode())
+    for k, (fname, data) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"; '
+                   f'filename="{fname}"\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+        body.write(data + b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def _request(url: str, data: bytes | None = None, ctype: str | None = None) -> tuple[int, dict]:
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": ctype} if ctype else {})
+    try:
+        with urllib.request.urlopen(req, timeout=600) as r:
+            return r.status, json.loads(r.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+
+
+def _wait_done(url: str, job_id: str, timeout: float = 600) -> str:
+    """Poll the history until *job_id* finishes; returns its final stage."""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        _, page = _request(f"{url}/api/history/?limit=100")
+        for j in page.get("results", []):
+            if j["id"] == job_id and j["status"] in ("finished", "error"):
+                return j["status"]
+        time.sleep(POLL_S)
+    raise TimeoutError(f"{job_id} did not finish within {timeout:.0f} s")
+
+
+def _jpeg(rng, h: int, w: int) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8)).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def bench_api(url: str, repeat: int, frames: int, tmp: Path, metrics: dict) -> None:
+    rng = np.random.default_rng(int(time.time()))
+    filt = {"filter": "1 2 1 2 4 2 1 2 1", "factor": "16"}
+    print(f"{'api':24} {'enqueue':>10} {'done':>10}")
+
+    def one(path: str, fields: dict, name: str, data: bytes) -> tuple[float, float]:
+        body, ctype = _multipart(fields, {name: (f"bench.{'mp4' if name == 'video' else 'jpg'}", data)})
+        t0 = time.perf_counter()
+        code, resp = _request(f"{url}{path}", body, ctype)
+        t_enq = time.perf_counter() - t0
+        if code not in (200, 202) or "job_id" not in resp and "hw_image" not in resp:
+            raise RuntimeError(f"POST {path} → {code} {resp}")
+        if code == 202 and _wait_done(url, resp["job_id"]) != "finished":
+            raise RuntimeError(f"{resp['job_id']} failed")
+        return t_enq * 1e3, (time.perf_counter() - t0) * 1e3
+
+    cases = [
+        ("image.grayscale.720p", "/api/grayscale/", {}, "image", lambda: _jpeg(rng, 720, 1280)),
+        ("image.gauss.720p", "/api/filter/", filt, "image", lambda: _jpeg(rng, 720, 1280)),
+        ("image.gauss.1080p", "/api/filter/", filt, "image", lambda: _jpeg(rng, 1080, 1920)),
+    ]
+    clip = tmp / "api_clip.mp4"
+    _write_clip(clip, (1280, 720), frames)
+    cases.append(("video.gauss.720p", "/api/video/filter/", filt, "video", clip.read_bytes))
+    for key, path, fields, name, make in cases:
+        runs = [one(path, fields, name, make()) for _ in range(1 if name == "video" else repeat)]
+        metrics[f"api.{key}.enqueue_ms"] = _median([r[0] for r in runs])
+        metrics[f"api.{key}.done_ms"] = _median([r[1] for r in runs])
+        print(f"{key:24} {metrics[f'api.{key}.enqueue_ms']:8.1f}ms "
+              f"{metrics[f'api.{key}.done_ms']:8.1f}ms")
+
+
+def _serve(backend: str, log: Path) -> tuple[str, list[subprocess.Popen]]:
+    """Start runserver + worker on a free port; returns (url, processes)."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {**os.environ, "WORKER_BACKEND": backend}
+    out = log.open("w")
+    procs = [
+        subprocess.Popen([sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+                         cwd=ROOT / "mysite", env=env, stdout=out, stderr=subprocess.STDOUT),
+        subprocess.Popen([sys.executable, "worker.py"], cwd=ROOT, env=env,
+                         stdout=out, stderr=subprocess.STDOUT),
+    ]
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            if _request(f"{url}/api/test/")[0] == 200:
+                return url, procs
+        except OSError:
+            pass
+        time.sleep(0.1)
+    _stop(procs)
+    raise RuntimeError(f"server did not come up - see {log}")
+
+
+def _stop(procs: list[subprocess.Popen]) -> None:
+    for p in procs:
+        p.terminate()
+    for p in procs:
+        try:
+            p.wait(10)
+        except subprocess.TimeoutExpired:
+            p.kill()
+
+
+def _job_dirs() -> set[str]:
+    jobs = ROOT / "mysite" / "api" / "jobs"
+    return {p.name for p in jobs.iterdir()} if jobs.is_dir() else set()
+
+def _remove_jobs(job_ids: list[str]) -> None:
+    """Delete benchmark jobs from the real jobs dir and index (--serve only)."""
+    for j in job_ids:
+        shutil.rmtree(ROOT / "mysite" / "api" / "jobs" / j, ignore_errors=True)
+    # a fresh interpreter: this one's jobqueue points at the scratch index
+    subprocess.run([sys.executable, "-c", "import sys; from api import jobqueue; "
+                    "jobqueue.forget(sys.argv[1:])", *job_ids], cwd=ROOT / "mysite", check=True)
+
+
+# --------------------------------------------------------------------------- #
+# Output
+# --------------------------------------------------------------------------- #
+def _meta(backend: str) -> dict:
+    import cv2
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        rev = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "host": platform.node(),
+        "machine": platform.machine(), "cpus": os.cpu_count(), "backend": backend,
+        "python": platform.python_version(), "numpy": np.__version__,
+        "opencv": cv2.__version__, "git": rev,
+    }
+
+
+def compare(metrics: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Metrics that got worse than *baseline* by more than *tolerance*."""
+    worse = []
+    for k, old in baseline.items():
+        new = metrics.get(k)
+        if new is None or not old:
+            continue
+        change = (new - old) / old if k.endswith("_ms") else (old - new) / old
+        if change > tolerance:
+            worse.append(f"{k}: {old} → {new} ({change:+.0%} worse)")
+    return worse
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--backend", default=os.getenv("WORKER_BACKEND", "emulator"),
+                    choices=["emulator", "pynq", "auto"])
+    ap.add_argument("--only", default=",".join(SECTIONS),
+                    help=f"comma-separated sections ({', '.join(SECTIONS)})")
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--frames", type=int, default=60, help="frames of the synthetic clips")
+    ap.add_argument("--url", help="server for the api section, e.g. http://pynq:8000")
+    ap.add_argument("--serve", action="store_true",
+                    help="start a server and worker here for the api section")
+    ap.add_argument("--out", type=Path, default=Path("bench.json"))
+    ap.add_argument("--baseline", type=Path, help="earlier --out file to compare with")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args()
+    only = [s for s in args.only.split(",") if s]
+    unknown = set(only) - set(SECTIONS)
+    if unknown:
+        ap.error(f"unknown section(s): {', '.join(sorted(unknown))}")
+
+    baseline = json.loads(args.baseline.read_text())["metrics"] if args.baseline else None
+    metrics: dict[str, float] = {}
+    skipped: dict[str, str] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        tmp = Path(tmp)
+        sys.path.insert(0, str(ROOT / "mysite"))
+        if {"accel", "video", "history"} & set(only):
+            worker = _sandbox(tmp, args.backend)
+            if "accel" in only:
+                bench_accel(worker, args.repeat, metrics)
+            if "video" in only:
+                bench_video(worker, tmp, args.frames, metrics)
+            if "history" in only:
+                bench_history(worker, args.repeat, metrics)
+        if "api" in only:
+            if args.url:
+                bench_api(args.url.rstrip("/"), args.repeat, args.frames, tmp, metrics)
+            elif args.serve:
+                before = _job_dirs()
+                url, procs = _serve(args.backend, tmp / "serve.log")
+                try:
+                    bench_api(url, args.repeat, args.frames, tmp, metrics)
+                finally:
+                    _stop(procs)
+                    created = sorted(_job_dirs() - before)
+                    if created:
+                        _remove_jobs(created)
+            else:
+                skipped["api"] = "needs --url or --serve"
+                print("api: skipped (needs --url or --serve)")
+
+    result = {"meta": _meta(args.backend), "metrics": metrics, "skipped": skipped}
+    args.out.write_text(json.dumps(result, indent=2))
+    print(f"wrote {len(metrics)} metrics to {args.out}")
+
+    if baseline is not None:
+        worse = compare(metrics, baseline, args.tolerance)
+        for line in worse:
+            print("REGRESSION", line)
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
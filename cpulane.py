@@ -0,0 +1,319 @@
+# cpulane.py
+"""
+CPU lane of the worker: image jobs run through the software engine
+(mysite/api/swengine.py - the FPGA's exact arithmetic) in a pool of spawned
+processes, so the host cores help drain a deep queue while the FPGA lane
+keeps the overlay and the DMA engine to itself.  The processes are spawned,
+not forked, so they inherit neither the overlay / DMA mappings nor the
+parent's threads; they never call ``load_overlay``, so no hardware is touched.
+
+A video job takes the whole pool.  One decoder and one encoder thread in the
+worker keep the container streams in order, while the frames fan out to
+the processes through a ring of shared-memory slots: each frame is decoded
+straight into a slot, filtered in place by whichever process is free and
+written out once every earlier frame has been.  A repeated frame of a job
+with frame skipping takes no slot: the encoder keeps the last filtered
+slot and writes it again.
+"""
+
+from __future__ import annotations
+import multiprocessing as mp
+import queue, sys, threading, time, traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Callable
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent / "mysite"))   # Django-free helpers
+from api import resultcache, swengine, thumbs, uploads
+from api.jobstatus import write_status
+from api.metrics import StageTimer
+from videoio import FrameSkipper, SegmentWriter, VideoSource, park_upload
+
+CPU_KINDS = ("grayscale", "filter")
+CPU_VIDEO_KINDS = ("grayscale_video", "filter_video")
+VIDEO_SLOTS_PER_WORKER = 2          # frames in flight per process (shared memory)
+
+
+# --------------------------------------------------------------------------- #
+# Child side
+# --------------------------------------------------------------------------- #
+def process_image(job_dir: str, kind: str) -> tuple[bool, float]:
+    """
+    Run one image job in software.  Returns (success, seconds for the whole
+    job); failures are recorded in the job dir, as the FPGA lane does.
+    """
+    job = Path(job_dir)
+    start = time.perf_counter()
+    timer = StageTimer(job)
+    try:
+        write_status(job, "processing")
+        with timer("decode"):
+            img = np.array(Image.open(job / "in.jpg").convert("RGB"))
+        t0 = time.perf_counter()
+        if kind == "grayscale":
+            out = swengine.grayscale(img)
+        elif kind == "filter":
+            factor = int((job / "factor.txt").read_text())
+            kernel = np.array((job / "filter.txt").read_text().split(), np.int32).reshape(3, 3)
+            out = swengine.filter3x3(img, kernel, factor, threads=1)
+        else:
+            raise ValueError(f"CPU lane cannot run «{kind}»")
+        t_ms = (time.perf_counter() - t0) * 1e3
+        timer.add("filter", t_ms / 1e3)
+
+        with timer("encode"):
+            Image.fromarray(out).save(job / "out.jpg")
+            thumbs.make_thumbnail(job)
+        if (job / "cache_key.txt").exists():
+            resultcache.store((job / "cache_key.txt").read_text().strip(), job / "out.jpg")
+        (job / "hw_time.txt").write_text(f"{t_ms:.2f} ms (CPU)")
+        write_status(job, "finished", progress=(1, 1), timings=timer.as_ms())
+        (job / "done.txt").write_text("done")
+        return True, time.perf_counter() - start
+    except Exception as exc:
+        (job / "error.txt").write_text(str(exc))
+        write_status(job, "error", note=str(exc))
+        traceback.print_exc()
+        return False, 0.0
+
+
+def _filter_frame(shm_name: str, shape: tuple[int, int, int], slot: int,
+                  kind: str, kernel: np.ndarray | None, factor: int) -> float:
+    """Filter one BGR frame in place in its shared-memory slot; returns ms."""
+    shm = SharedMemory(shm_name)
+    try:
+        frm = np.ndarray(shape, np.uint8, shm.buf, offset=slot * int(np.prod(shape)))
+        t0 = time.perf_counter()
+        if kind == "grayscale_video":
+            swengine.grayscale(frm[..., ::-1], out=frm)
+        else:
+            swengine.filter3x3(frm, kernel, factor, threads=1, out=frm)
+        t_ms = (time.perf_counter() - t0) * 1e3
+        del frm                         # release the view before closing the mapping
+        return t_ms
+    finally:
+        shm.close()
+
+
+# --------------------------------------------------------------------------- #
+# Parent side - video coordinator
+# --------------------------------------------------------------------------- #
+_EOS = object()                         # end-of-stream marker
+
+
+def process_video(pool: ProcessPoolExecutor, workers: int, job: Path, kind: str,
+                  max_size: tuple[int, int]) -> tuple[bool | None, float]:
+    """
+    Run one video job with the frames spread over *pool*.  Frames above
+    *max_size* are downscaled as on the FPGA lane.  Returns (success,
+    seconds) - success None when a too slow upload handed the job back;
+    failures are recorded in the job dir.
+    """
+    start = time.perf_counter()
+    timer = StageTimer(job)
+    shm = cap = vw = ring = None
+    try:
+        write_status(job, "processing")
+        cap = VideoSource(job)          # in.mp4 may still be uploading
+        if not cap.isOpened():
+            raise RuntimeError("OpenCV failed to open video")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        tot = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
+        w   = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h   = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        scale = max(w/max_size[0], h/max_size[1], 1.0)
+        ow, oh = int(w/scale), int(h/scale)
+        kernel, factor = None, 1
+        if kind == "filter_video":
+            factor = int((job / "factor.txt").read_text())
+            kernel = np.array((job / "filter.txt").read_text().split(), np.int32).reshape(3, 3)
+
+        n_slots = VIDEO_SLOTS_PER_WORKER * workers
+        shape = (oh, ow, 3)
+        shm = SharedMemory(create=True, size=n_slots * oh * ow * 3)
+        ring = np.ndarray((n_slots, *shape), np.uint8, shm.buf)
+        vw = SegmentWriter(job, fps, (ow, oh))
+        skipper = FrameSkipper.for_job(job)
+        skipped = lambda: skipper.skipped if skipper is not None else None
+
+        stop = threading.Event()
+        free_slots: queue.Queue = queue.Queue()
+        for slot in range(n_slots):
+            free_slots.put(slot)
+        in_flight: queue.Queue = queue.Queue()      # (slot, future) in frame order
+        decode_exc: list[BaseException] = []
+
+        def decode() -> None:
+            try:
+                while not stop.is_set():
+                    with timer("decode"):
+                        ok, frm = cap.read()
+                    if not ok:
+                        break
+                    if skipper is not None:
+                        with timer("fingerprint"):
+                            repeat = skipper.repeat(frm)
+                        if repeat:
+                            in_flight.put((None, None))
+                            continue
+                    slot = free_slots.get()
+                    if slot is _EOS:
+                        break
+                    if scale > 1.0:
+                        with timer("resize"):
+                            cv2.resize(frm, (ow, oh), ring[slot], interpolation=cv2.INTER_AREA)
+                    else:
+                        ring[slot] = frm
+                    in_flight.put((slot, pool.submit(_filter_frame, shm.name, shape, slot,
+                                                     kind, kernel, factor)))
+            except BaseException as exc:
+                decode_exc.append(exc)
+            finally:
+                in_flight.put(_EOS)
+
+        write_status(job, "processing", progress=(0, tot), skipped=skipped())
+        decoder = threading.Thread(target=decode, name=f"decode-{job.name}", daemon=True)
+        decoder.start()
+        first_snap = item = held = None
+        done, total_ms = 0, 0.0
+        try:
+            while (item := in_flight.get()) is not _EOS:
+                slot, fut = item
+                if fut is None:                 # repeated frame: the last output again
+                    with timer("encode"):
+                        vw.write(ring[held])
+                else:
+                    t_ms = fut.result()
+                    total_ms += t_ms
+                    timer.add("filter", t_ms / 1e3)
+                    if first_snap is None:
+                        with timer("cvtcolor"):
+                            first_snap = cv2.cvtColor(ring[slot], cv2.COLOR_BGR2RGB)
+                    with timer("encode"):
+                        vw.write(ring[slot])
+                    if skipper is not None:
+                        slot, held = held, slot
+                    if slot is not None:
+                        free_slots.put(slot)
+                done += 1
+                # update every 5 frames to limit disk I/O
+                if done % 5 == 0 or done == tot:
+                    write_status(job, "processing", progress=(done, tot), skipped=skipped())
+        finally:
+            stop.set()
+            free_slots.put(_EOS)                # unblock a decoder waiting for a slot
+            decoder.join()
+            while item is not _EOS and (item := in_flight.get()) is not _EOS:
+                if item[1] is not None and not item[1].cancel():
+                    item[1].exception()         # wait: no process may still use the ring
+        if decode_exc:
+            raise decode_exc[0]
+        vw.release()
+
+        if first_snap is not None:
+            Image.fromarray(first_snap).save(job / "out.jpg")
+            thumbs.make_thumbnail(job)
+        n_skip = skipped() or 0
+        note = (f"{total_ms:.2f} ms ({done}f, avg {total_ms/max(done - n_skip, 1):.2f} ms/f, "
+                f"CPU ×{workers}" + (f", {n_skip} skipped)" if skipper is not None else ")"))
+        (job / "hw_time.txt").write_text(note)
+        write_status(job, "merging")
+        with timer("merge"):
+            vw.finish()
+        write_status(job, "finished", note=note, progress=(done, done), timings=timer.as_ms(),
+                     skipped=skipped())
+        (job / "done.txt").write_text("done")
+        return True, time.perf_counter() - start
+    except uploads.Stalled:
+        park_upload(job)
+        return None, 0.0
+    except Exception as exc:
+        (job / "error.txt").write_text(str(exc) or type(exc).__name__)
+        write_status(job, "error", note=str(exc))
+        traceback.print_exc()
+        if isinstance(exc, BrokenProcessPool):
+            raise                       # the lane replaces the pool
+        return False, 0.0
+    finally:
+        if cap is not None:
+            cap.release()
+        if vw is not None:
+            vw.release()
+        if shm is not None:
+            ring = None                 # drop the view before unmapping
+            shm.close()
+            shm.unlink()
+
+
+# --------------------------------------------------------------------------- #
+# Parent side
+# --------------------------------------------------------------------------- #
+class CpuLane:
+    """``workers`` spawned processes; at most one image job each, or one video on all."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.busy = 0
+        self._lock = threading.Lock()
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: a forked child would inherit the parent's overlay / DMA state
+        return ProcessPoolExecutor(self.workers, mp_context=mp.get_context("spawn"))
+
+    def free_slots(self) -> int:
+        with self._lock:
+            return self.workers - self.busy
+
+    def submit(self, job: Path, kind: str,
+               on_done: Callable[[bool, float], None]) -> None:
+        """Start *job*; ``on_done(ok, seconds)`` runs on a pool thread when it ends."""
+        with self._lock:
+            self.busy += 1
+            pool = self._pool
+
+        def _done(fut: Future) -> None:
+            try:
+                ok, seconds = fut.result()
+            except Exception as exc:    # the child died (e.g. killed by the OOM killer)
+                ok, seconds = False, 0.0
+                if isinstance(exc, BrokenProcessPool):
+                    with self._lock:
+                        if self._pool is pool:
+                            self._pool = self._new_pool()
+            with self._lock:
+                self.busy -= 1
+            on_done(ok, seconds)
+
+        pool.submit(process_image, str(job), kind).add_done_callback(_done)
+
+    def submit_video(self, job: Path, kind: str, max_size: tuple[int, int],
+                     on_done: Callable[[bool | None, float], None]) -> None:
+        """Start video *job* on every process (all must be free); same callback."""
+        with self._lock:
+            self.busy += self.workers
+            pool = self._pool
+
+        def _run() -> None:
+            try:
+                ok, seconds = process_video(pool, self.workers, job, kind, max_size)
+            except Exception as exc:
+                ok, seconds = False, 0.0
+                if isinstance(exc, BrokenProcessPool):
+                    with self._lock:
+                        if self._pool is pool:
+                            self._pool = self._new_pool()
+            with self._lock:
+                self.busy -= self.workers
+            on_done(ok, seconds)
+
+        threading.Thread(target=_run, name=f"cpu-video-{job.name}", daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,186 @@
+# mysite/api/async_views.py
+"""
+Async (ASGI) variants of the upload endpoints, mounted under /api/async/.
+
+Same form fields and JSON as the APIViews in views.py.  Saving, hashing and
+resizing the upload and the optional SciPy comparison run on a thread pool;
+the wait for the FPGA is an ``await`` on the worker's ``done`` notification,
+so a request that is waiting for the worker holds a coroutine rather than a
+server thread.  Run under an ASGI server (e.g. ``uvicorn mysite.asgi:application``)
+to get that benefit - under WSGI Django runs these on a thread as usual.
+"""
+
+from __future__ import annotations
+import asyncio, json, time
+from pathlib import Path
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .jobutils import (
+    enqueue_grayscale_job, enqueue_filter_job,
+    enqueue_video_grayscale_job, enqueue_video_filter_job,
+    wait_for_done_async, run_sw_gray, run_sw_filter,
+    trim_video_history, MAX_VIDEO_BYTES
+)
+from .views import (
+    _queued_payload, _image_payload, _filter_params, _skip_param, _wants_software,
+    _has_pending_before, _stream_start, QUEUED_TIMEOUT, SLOW_MSG, SSE_PING_S, FINAL_STAGES
+)
+from . import jobqueue, notify
+
+ASYNC_SSE_MAX_S = 300   # a stream costs a coroutine, not a thread - reconnect less often
+
+
+def _in_thread(func: Callable, *args):
+    """Run blocking *func* on the shared thread pool (not the main thread)."""
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def _form(request):
+    # multipart parsing reads the (possibly disk-spooled) body
+    return await _in_thread(lambda: (request.POST, request.FILES))
+
+
+async def _queued(job: Path, *msg: str) -> JsonResponse:
+    # the jobs_ahead estimate is an SQLite query - keep it off the event loop
+    return JsonResponse(await _in_thread(_queued_payload, job, *msg), status=202)
+
+
+# --------------------------------------------------------------------------- #
+# Helper - “quick-if-idle else queue” logic (images only)
+# --------------------------------------------------------------------------- #
+async def _handle_image_request(enqueue_func: Callable[[], Path],
+                                do_software: Callable[[], tuple[str, str]] | None = None) -> JsonResponse:
+    job = await _in_thread(enqueue_func)
+
+    if not (job / "done.txt").exists():           # not a result cache hit
+        if await _in_thread(_has_pending_before, job):
+            return await _queued(job)
+        try:
+            ok = await wait_for_done_async(job, timeout=QUEUED_TIMEOUT)
+        except TimeoutError:
+            return await _queued(job, SLOW_MSG)
+        if not ok:
+            error = await _in_thread((job / "error.txt").read_text)
+            return JsonResponse({"job_id": job.name, "error": error}, status=500)
+    return JsonResponse(await _in_thread(_image_payload, job, do_software))
+
+
+# --------------------------------------------------------------------------- #
+# Images
+# --------------------------------------------------------------------------- #
+@csrf_exempt
+@require_POST
+async def grayscale(request):
+    post, files = await _form(request)
+    img = files.get("image")
+    if not img:
+        return JsonResponse({"error": "No image uploaded"}, status=400)
+    return await _handle_image_request(
+        enqueue_func=lambda: enqueue_grayscale_job(img),
+        do_software=(lambda: run_sw_gray(img)) if _wants_software(post) else None,
+    )
+
+
+@csrf_exempt
+@require_POST
+async def filter_image(request):
+    post, files = await _form(request)
+    img = files.get("image")
+    coeffs, factor, err = _filter_params(post)
+    if not img:
+        return JsonResponse({"error": "No image"}, status=400)
+    if err:
+        return JsonResponse({"error": err}, status=400)
+    return await _handle_image_request(
+        enqueue_func=lambda: enqueue_filter_job(img, coeffs, factor),
+        do_software=(lambda: run_sw_filter(img, coeffs, factor)) if _wants_software(post) else None,
+    )
+
+
+# --------------------------------------------------------------------------- #
+# Videos - always queued
+# --------------------------------------------------------------------------- #
+async def _enqueue_video(enqueue_func: Callable[[], Path]) -> JsonResponse:
+    job = await _in_thread(enqueue_func)
+    await _in_thread(trim_video_history)
+    return await _queued(job)
+
+
+@csrf_exempt
+@require_POST
+async def video_grayscale(request):
+    post, files = await _form(request)
+    vid = files.get("video")
+    skip, err = _skip_param(post)
+    if not vid:
+        return JsonResponse({"error": "No video"}, status=400)
+    if vid.size > MAX_VIDEO_BYTES:
+        return JsonResponse({"error": "Video > 1 GiB - please compress first"}, status=413)
+    if err:
+        return JsonResponse({"error": err}, status=400)
+    return await _enqueue_video(lambda: enqueue_video_grayscale_job(vid, skip))
+
+
+@csrf_exempt
+@require_POST
+async def video_filter(request):
+    post, files = await _form(request)
+    vid = files.get("video")
+    coeffs, factor, err = _filter_params(post)
+    skip, skip_err = _skip_param(post)
+    if not vid:
+        return JsonResponse({"error": "No video"}, status=400)
+    if vid.size > MAX_VIDEO_BYTES:
+        return JsonResponse({"error": "Video > 1 GiB - please compress first"}, status=413)
+    if err or skip_err:
+        return JsonResponse({"error": err or skip_err}, status=400)
+    return await _enqueue_video(lambda: enqueue_video_filter_job(vid, coeffs, factor, skip))
+
+
+# --------------------------------------------------------------------------- #
+# Live job status (Server-Sent Events)
+# --------------------------------------------------------------------------- #
+async def _event_stream(last_id: int, job_id: str | None):
+    try:
+        sub = notify.Subscriber(jobqueue.EVENTS_CHANNEL)
+    except OSError:
+        sub = None
+    try:
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + ASYNC_SSE_MAX_S
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            rows = await _in_thread(jobqueue.events_since, last_id, job_id)
+            for r in rows:
+                last_id = r["id"]
+                yield f"id: {r['id']}\nevent: status\ndata: {r['data']}\n\n"
+                if job_id and json.loads(r["data"]).get("stage") in FINAL_STAGES:
+                    return
+            if rows:
+                last_sent = time.monotonic()
+                continue
+            if time.monotonic() - last_sent >= SSE_PING_S:
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+            if sub is not None:
+                await sub.wait_async(max(min(SSE_PING_S, deadline - time.monotonic()), 0))
+            else:
+                await asyncio.sleep(1.0)
+    finally:
+        if sub is not None:
+            sub.close()
+
+
+@require_GET
+async def events(request):
+    """Async ``/api/events/``: each open stream costs a coroutine, not a thread."""
+    last_id, job_id = await _in_thread(_stream_start, request)
+    resp = StreamingHttpResponse(_event_stream(last_id, job_id), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"
+    return resp
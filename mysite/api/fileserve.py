@@ -0,0 +1,127 @@
+# mysite/api/fileserve.py
+"""
+Result downloads with HTTP validators and byte ranges.
+
+Every response carries an ETag (size + mtime) and Last-Modified, so a
+repeated download can be answered with 304, and ``Range: bytes=...`` gets
+206 with just that slice (416 when it lies past the end) - a video player
+can seek and an interrupted download can resume.  Multi-range requests get
+the whole file, as HTTP allows.
+
+With ``settings.RESULT_SENDFILE`` set, Django only checks the validators and
+hands the file to the front web server - ``"x-accel-redirect"`` (nginx,
+through the internal location ``RESULT_ACCEL_PREFIX`` aliased to the jobs
+dir) or ``"x-sendfile"`` (Apache / lighttpd) - which then serves the body and
+its ranges without holding a Python thread.
+"""
+
+from __future__ import annotations
+import mimetypes, re
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from .jobutils import JOBS_ROOT
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+BLOCK = 64 << 10
+
+
+def _etag(st) -> str:
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+def _byte_range(header: str, size: int) -> tuple[int, int] | None | bool:
+    """(first, last) of a single-range header, None to send everything, False if unsatisfiable."""
+    m = RANGE.fullmatch(header.strip())
+    if not m or m.group(1) == m.group(2) == "":
+        return None                 # malformed or multi-range - ignore it
+    first, last = m.groups()
+    if first == "":                 # suffix: the last N bytes
+        n = int(last)
+        return (max(size - n, 0), size - 1) if n and size else False
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        return False if first >= size else None
+    return first, last
+
+def _if_range_ok(request, etag: str, mtime: float) -> bool:
+    cond = request.headers.get("If-Range")
+    if cond is None:
+        return True
+    if cond.startswith('"') or cond.startswith("W/"):
+        return cond == etag
+    date = parse_http_date_safe(cond)
+    return date is not None and int(mtime) <= date
+
+def _slice(path: Path, first: int, length: int):
+    with path.open("rb") as f:
+        f.seek(first)
+        while length > 0:
+            block = f.read(min(BLOCK, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+def _disposition(filename: str | None, as_attachment: bool) -> str | None:
+    if filename is None:
+        return "attachment" if as_attachment else None
+    kind = "attachment" if as_attachment else "inline"
+    return f"{kind}; filename*=UTF-8''{quote(filename)}"
+
+def _offload(path: Path) -> HttpResponse | None:
+    mode = getattr(settings, "RESULT_SENDFILE", "")
+    if not mode:
+        return None
+    resp = HttpResponse()
+    if mode == "x-accel-redirect":
+        rel = path.resolve().relative_to(JOBS_ROOT.resolve())
+        resp["X-Accel-Redirect"] = settings.RESULT_ACCEL_PREFIX.rstrip("/") + "/" + quote(rel.as_posix())
+    elif mode == "x-sendfile":
+        resp["X-Sendfile"] = str(path.resolve())
+    else:
+        raise ValueError(f"unknown RESULT_SENDFILE «{mode}»")
+    del resp["Content-Type"]            # the front server sets it from the file
+    return resp
+
+def serve_file(request, path: Path, content_type: str | None = None,
+               filename: str | None = None, as_attachment: bool = True) -> HttpResponse:
+    """Conditional, range-aware download of *path*."""
+    st = path.stat()
+    etag, mtime = _etag(st), st.st_mtime
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if not_modified is not None:        # 304 or 412
+        return not_modified
+    content_type = content_type or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    resp = _offload(path)
+    if resp is None:
+        size = st.st_size
+        rng = None
+        if "Range" in request.headers and _if_range_ok(request, etag, mtime):
+            rng = _byte_range(request.headers["Range"], size)
+        if rng is False:
+            resp = HttpResponse(status=416, content_type=content_type)
+            resp["Content-Range"] = f"bytes */{size}"
+        elif rng is None:
+            resp = FileResponse(path.open("rb"), content_type=content_type)
+        else:
+            first, last = rng
+            resp = StreamingHttpResponse(_slice(path, first, last - first + 1),
+                                         status=206, content_type=content_type)
+            resp["Content-Range"] = f"bytes {first}-{last}/{size}"
+            resp["Content-Length"] = str(last - first + 1)
+        resp["Accept-Ranges"] = "bytes"
+    else:
+        resp["Content-Type"] = content_type
+    disposition = _disposition(filename, as_attachment)
+    if disposition:
+        resp["Content-Disposition"] = disposition
+    resp["ETag"] = etag
+    resp["Last-Modified"] = http_date(mtime)
+    return resp
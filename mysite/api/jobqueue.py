@@ -0,0 +1,395 @@
+# mysite/api/jobqueue.py
+"""
+SQLite index of jobs shared by the Django views (producers) and worker.py
+(the single consumer).
+
+Every job gets an explicit, monotonically increasing ``seq`` when it is
+enqueued - after all of its input files are on disk - so FIFO order no
+longer depends on directory mtimes.  The worker claims the lowest pending
+``seq`` through the (state, seq) index and sleeps on the ``queue`` notify
+channel in between, so a new job starts without any polling delay.
+
+``claim_next(prefer=...)`` may pull a later job that uses the overlay
+already on the FPGA ahead of the head of the queue; the head's ``bypassed``
+counter and age bound how far that reordering goes.  Small scheduler
+counters live in the ``stats`` table, next to ``history_version`` - bumped on
+every enqueue, status change and deletion so history polls can be answered
+with 304 when nothing moved.  Every status change is also appended to the
+``events`` journal and announced on the ``events`` notify channel; that is
+what the /api/events/ stream replays.  The ``histograms`` table backs the
+job timing histograms of /api/metrics/ (see metrics.py).  Django-free so the worker can import
+it too.
+"""
+
+from __future__ import annotations
+import json, sqlite3, threading, time
+from pathlib import Path
+
+from . import notify
+
+QUEUE_DB        = Path(__file__).resolve().parent / "jobqueue.sqlite3"
+WAKE_CHANNEL    = "queue"
+DONE_CHANNEL    = "done"            # job_id of every job the worker finishes
+HISTORY_VERSION = "history_version"
+EVENTS_CHANNEL  = "events"
+EVENTS_KEEP     = 5000              # journal rows kept for Last-Event-ID replay
+AHEAD_CAP       = 100               # jobs_ahead stops counting here
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    seq      INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id   TEXT    NOT NULL UNIQUE,
+    kind     TEXT    NOT NULL,
+    state    TEXT    NOT NULL DEFAULT 'pending',  -- pending|running|waiting|done|error
+    enqueued REAL    NOT NULL,
+    started  REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state_seq ON jobs (state, seq);
+CREATE TABLE IF NOT EXISTS stats (
+    name  TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT    NOT NULL,
+    ts     REAL    NOT NULL,
+    data   TEXT    NOT NULL               -- JSON, includes "job" and "stage"
+);
+CREATE INDEX IF NOT EXISTS events_job_id ON events (job_id, id);
+CREATE TABLE IF NOT EXISTS histograms (
+    name    TEXT NOT NULL,
+    labels  TEXT NOT NULL,
+    bounds  TEXT NOT NULL,      -- JSON upper bounds of the finite buckets
+    counts  TEXT NOT NULL,      -- JSON per-bucket counts, the last one is +Inf
+    sum     REAL NOT NULL,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+# columns added after the first release: (name, DDL)
+MIGRATIONS = [
+    ("overlay",  "ALTER TABLE jobs ADD COLUMN overlay TEXT"),
+    ("bypassed", "ALTER TABLE jobs ADD COLUMN bypassed INTEGER NOT NULL DEFAULT 0"),
+]
+INDEXES = """
+CREATE INDEX IF NOT EXISTS jobs_state_overlay_seq ON jobs (state, overlay, seq);
+"""
+
+_local = threading.local()
+
+
+def overlay_of(kind: str) -> str:
+    """Bitstream a job kind runs on: "filter_video" → "filter"."""
+    return kind.split("_", 1)[0]
+
+_OVERLAY_SQL = "CASE WHEN instr(kind, '_') THEN substr(kind, 1, instr(kind, '_') - 1) ELSE kind END"
+
+
+def _connect() -> sqlite3.Connection:
+    """One autocommit connection per thread (and per process)."""
+    con = getattr(_local, "con", None)
+    if con is None:
+        fresh = not QUEUE_DB.exists()
+        con = sqlite3.connect(QUEUE_DB, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.executescript(SCHEMA)
+        cols = {r["name"] for r in con.execute("PRAGMA table_info(jobs)")}
+        for name, ddl in MIGRATIONS:
+            if name not in cols:
+                try:
+                    con.execute(ddl)
+                except sqlite3.OperationalError:
+                    continue            # another process migrated first
+                if name == "overlay":
+                    con.execute("UPDATE jobs SET overlay = " + _OVERLAY_SQL)
+        con.executescript(INDEXES)
+        if fresh:
+            try:
+                QUEUE_DB.chmod(0o666)   # shared by root worker and web user
+            except OSError:
+                pass
+        _local.con = con
+    return con
+
+
+class _Tx:
+    """``with _Tx() as con:`` - an IMMEDIATE (write-locked) transaction."""
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.con = _connect()
+        self.con.execute("BEGIN IMMEDIATE")
+        return self.con
+
+    def __exit__(self, exc_type, *_) -> None:
+        self.con.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+# --------------------------------------------------------------------------- #
+# Producer side
+# --------------------------------------------------------------------------- #
+def enqueue(job: Path, kind: str, state: str = "pending") -> int:
+    """
+    Index *job*, wake the worker and return its sequence number.  Jobs that
+    are already finished (result cache hits) pass ``state="done"`` and
+    announce that through ``jobstatus.write_status`` once indexed.  A
+    ``park``ed job becomes pending again, keeping its place.
+    """
+    con = _connect()
+    now = time.time()
+    # a worker backfill may have indexed the dir a moment earlier - keep that row
+    con.execute("INSERT INTO jobs (job_id, kind, overlay, state, enqueued, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(job_id) DO UPDATE "
+                "SET state = excluded.state WHERE state = 'waiting'",
+                (job.name, kind, overlay_of(kind), state, now,
+                 None if state == "pending" else now))
+    if state == "pending":
+        record_event(job.name, {"stage": "queued", "kind": kind})
+        notify.publish(WAKE_CHANNEL, job.name)
+    return con.execute("SELECT seq FROM jobs WHERE job_id = ?", (job.name,)).fetchone()[0]
+
+
+def forget(job_ids: list[str] | None = None) -> None:
+    """Drop index rows of deleted job dirs (all rows when *job_ids* is None)."""
+    con = _connect()
+    if job_ids is None:
+        con.execute("DELETE FROM jobs")
+        record_event("*", {"stage": "cleared"})
+    else:
+        con.executemany("DELETE FROM jobs WHERE job_id = ?", [(j,) for j in job_ids])
+        for j in job_ids:
+            record_event(j, {"stage": "deleted"})
+
+
+# --------------------------------------------------------------------------- #
+# History
+# --------------------------------------------------------------------------- #
+def touch() -> None:
+    """Something visible in the history changed."""
+    bump(HISTORY_VERSION)
+
+
+def history_version() -> int:
+    row = _connect().execute("SELECT value FROM stats WHERE name = ?", (HISTORY_VERSION,)).fetchone()
+    return int(row[0]) if row else 0
+
+
+def record_event(job_id: str, data: dict) -> int:
+    """Journal a status change of *job_id*, wake the streams and return its id."""
+    data = {"job": job_id, **data}
+    with _Tx() as con:
+        eid = con.execute("INSERT INTO events (job_id, ts, data) VALUES (?, ?, ?)",
+                          (job_id, time.time(), json.dumps(data))).lastrowid
+        if eid % 500 == 0:
+            con.execute("DELETE FROM events WHERE id <= ?", (eid - EVENTS_KEEP,))
+        con.execute("INSERT INTO stats (name, value) VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + 1", (HISTORY_VERSION,))
+    notify.publish(EVENTS_CHANNEL, str(eid))
+    return eid
+
+
+def last_event_id() -> int:
+    return _connect().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+
+def events_since(after: int, job_id: str | None = None, limit: int = 500) -> list[sqlite3.Row]:
+    """Journal rows newer than *after*, oldest first (only *job_id*'s if given)."""
+    if job_id is None:
+        sql, args = "SELECT * FROM events WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
+    else:
+        sql, args = ("SELECT * FROM events WHERE job_id IN (?, '*') AND id > ? ORDER BY id LIMIT ?",
+                     (job_id, after, limit))
+    return _connect().execute(sql, args).fetchall()
+
+
+def history_page(before: int | None = None, limit: int = 50) -> list[sqlite3.Row]:
+    """Newest-first slice of the index: up to *limit* jobs with ``seq < before``."""
+    return _connect().execute(
+        "SELECT * FROM jobs WHERE seq < ? ORDER BY seq DESC LIMIT ?",
+        (before if before is not None else 2**63 - 1, limit)).fetchall()
+
+
+# Jobs the worker will get to before *me*: whatever is running plus the
+# pending ones enqueued earlier - both ranges come off the (state, seq) index
+_AHEAD_SQL = ("FROM jobs WHERE state = 'running' AND job_id != :me "
+              "OR state = 'pending' AND seq < (SELECT seq FROM jobs WHERE job_id = :me)")
+
+
+def enqueued_at(job_id: str) -> float | None:
+    row = _connect().execute("SELECT enqueued FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return row[0] if row else None
+
+
+def queue_depth() -> dict[tuple[str, str], int]:
+    """{(state, kind): jobs} of the jobs still pending or running."""
+    return {(r["state"], r["kind"]): r["n"] for r in _connect().execute(
+        "SELECT state, kind, COUNT(*) AS n FROM jobs "
+        "WHERE state IN ('pending', 'running') GROUP BY state, kind")}
+
+
+def has_jobs_ahead(job_id: str) -> bool:
+    """Is anything queued or running ahead of *job_id*?  Stops at the first hit."""
+    return bool(_connect().execute(f"SELECT EXISTS(SELECT 1 {_AHEAD_SQL})",
+                                   {"me": job_id}).fetchone()[0])
+
+
+def jobs_ahead(job_id: str, cap: int = AHEAD_CAP) -> int:
+    """
+    Upper bound on the jobs that run before *job_id*, counting no further
+    than *cap*.  Approximate: ``claim_next`` may run a later job for the
+    loaded overlay first, and *job_id* itself may be passed over.  Polls
+    should use ``has_jobs_ahead``; this is for the one-off queued reply.
+    """
+    return _connect().execute(f"SELECT COUNT(*) FROM (SELECT 1 {_AHEAD_SQL} LIMIT :cap)",
+                              {"me": job_id, "cap": cap}).fetchone()[0]
+
+
+def finished_beyond(prefix: str, keep: int) -> list[str]:
+    """Finished jobs named ``<prefix>*`` other than the newest *keep*."""
+    return [r[0] for r in _connect().execute(
+        "SELECT job_id FROM jobs WHERE state = 'done' AND job_id GLOB ? "
+        "ORDER BY seq DESC LIMIT -1 OFFSET ?", (prefix + "*", keep))]
+
+
+# --------------------------------------------------------------------------- #
+# Consumer side (worker.py)
+# --------------------------------------------------------------------------- #
+def claim_next(prefer: str | None = None, max_bypass: int = 0,
+               max_wait: float = 0.0) -> tuple[sqlite3.Row | None, bool]:
+    """
+    Atomically move the next job to 'running'; returns (row, reordered).
+
+    Normally the oldest pending job.  With *prefer* (the loaded overlay) the
+    oldest pending job for that overlay may run first instead, unless the
+    head of the queue has already been passed over *max_bypass* times or
+    has waited *max_wait* seconds - so no job starves.  Every job that gets
+    passed over has its ``bypassed`` counter bumped; the head always holds
+    the largest count, so checking it bounds the reordering for all of them.
+    """
+    now = time.time()
+    with _Tx() as con:
+        row = con.execute(
+            "SELECT * FROM jobs WHERE state = 'pending' ORDER BY seq LIMIT 1").fetchone()
+        if row is None:
+            return None, False
+        reordered = False
+        if (prefer and row["overlay"] != prefer and row["bypassed"] < max_bypass
+                and now - row["enqueued"] < max_wait):
+            alt = con.execute(
+                "SELECT * FROM jobs WHERE state = 'pending' AND overlay = ? "
+                "ORDER BY seq LIMIT 1", (prefer,)).fetchone()
+            if alt is not None:
+                con.execute("UPDATE jobs SET bypassed = bypassed + 1 "
+                            "WHERE state = 'pending' AND seq < ?", (alt["seq"],))
+                row, reordered = alt, True
+        con.execute("UPDATE jobs SET state = 'running', started = ? WHERE seq = ?",
+                    (now, row["seq"]))
+    return row, reordered
+
+
+def finish(job_id: str, state: str = "done") -> None:
+    _connect().execute("UPDATE jobs SET state = ?, finished = ? WHERE job_id = ?",
+                       (state, time.time(), job_id))
+    touch()
+    notify.publish(DONE_CHANNEL, job_id)
+
+
+def park(job_id: str) -> None:
+    """A claimed job waits for its input again (a stalled upload) until re-``enqueue``d."""
+    _connect().execute("UPDATE jobs SET state = 'waiting', started = NULL WHERE job_id = ?",
+                       (job_id,))
+    touch()
+
+
+def requeue_running() -> int:
+    """Startup recovery: jobs left 'running' by a crashed worker run again."""
+    return _connect().execute(
+        "UPDATE jobs SET state = 'pending', started = NULL WHERE state = 'running'").rowcount
+
+
+def backfill(jobs_dir: Path) -> int:
+    """
+    Index job dirs created before the index existed (or while it was lost),
+    oldest mtime first.  Returns how many were added.
+    """
+    known = {r[0] for r in _connect().execute("SELECT job_id FROM jobs")}
+    new = sorted((p for p in jobs_dir.iterdir() if p.is_dir() and p.name not in known),
+                 key=lambda p: p.stat().st_mtime)
+    added, recent = 0, time.time() - 5
+    with _Tx() as con:
+        for p in new:
+            try:
+                kind = (p / "kernel.txt").read_text().strip()
+            except FileNotFoundError:
+                continue
+            state = ("done" if (p / "done.txt").exists() else
+                     "error" if (p / "error.txt").exists() else "pending")
+            mtime = p.stat().st_mtime
+            if state == "pending" and mtime > recent:
+                continue                # probably still being written - enqueue() adds it
+            added += con.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, kind, overlay, state, enqueued) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (p.name, kind, overlay_of(kind), state, mtime)).rowcount
+    if added:
+        touch()
+    return added
+
+
+def bump(name: str, delta: float = 1) -> None:
+    """Add *delta* to the scheduler counter *name*."""
+    _connect().execute(
+        "INSERT INTO stats (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, delta))
+
+
+def stats() -> dict[str, float]:
+    return {r["name"]: r["value"] for r in _connect().execute("SELECT * FROM stats")}
+
+
+def observe(name: str, labels: str, value: float, bounds: tuple[float, ...]) -> None:
+    """Count *value* into the histogram *name*{*labels*} with bucket *bounds*."""
+    with _Tx() as con:
+        row = con.execute("SELECT bounds, counts, sum FROM histograms WHERE name = ? AND labels = ?",
+                          (name, labels)).fetchone()
+        if row is None or json.loads(row["bounds"]) != list(bounds):
+            counts, total = [0] * (len(bounds) + 1), 0.0    # new, or re-bucketed
+        else:
+            counts, total = json.loads(row["counts"]), row["sum"]
+        counts[next((i for i, b in enumerate(bounds) if value <= b), len(bounds))] += 1
+        con.execute("INSERT OR REPLACE INTO histograms (name, labels, bounds, counts, sum) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (name, labels, json.dumps(list(bounds)), json.dumps(counts), total + value))
+
+
+def histograms() -> list[sqlite3.Row]:
+    return _connect().execute("SELECT * FROM histograms ORDER BY name, labels").fetchall()
+
+
+def scheduler_stats() -> dict[str, float]:
+    """
+    Overlay reload counters, the reload time overlay affinity saved and how
+    many jobs each worker lane ran.
+    """
+    st = stats()
+    reloads = int(st.get("overlay_reloads", 0))
+    avoided = int(st.get("overlay_reloads_avoided", 0))
+    avg_ms = st.get("overlay_reload_ms", 0.0) / reloads if reloads else 0.0
+    return {
+        "overlay_reloads": reloads,
+        "overlay_reload_ms_avg": round(avg_ms, 2),
+        "overlay_reloads_avoided": avoided,
+        "overlay_reload_ms_saved": round(avoided * avg_ms, 2),
+        "jobs_fpga": int(st.get("jobs_fpga", 0)),
+        "jobs_cpu": int(st.get("jobs_cpu", 0)),
+    }
+
+
+def wait_for_work(sub: notify.Subscriber | None, timeout: float) -> None:
+    """Sleep until something is enqueued (or *timeout* passes)."""
+    if sub is None:
+        time.sleep(timeout)
+    else:
+        sub.wait(timeout)
@@ -0,0 +1,84 @@
+# mysite/api/jobstatus.py
+"""
+Per-job ``status.json``, written by worker.py and its CPU lane processes and
+read by the history views.  Every write is also journalled in the job index
+for the live event stream.  Videos also get ``segments.json``, the list of
+output segments finished so far, and batch jobs ``batch.json``, their
+images and per-image results.  Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import json, time
+from pathlib import Path
+from typing import Literal
+
+from . import jobqueue
+
+STATUS_FILE   = "status.json"
+SEGMENTS_FILE = "segments.json"
+SEGMENT_NAME  = "seg_{:05d}.mp4"
+BATCH_FILE    = "batch.json"
+
+Stage = Literal[
+    "queued", "receiving", "kernel_loaded",
+    "processing", "merging",
+    "finished", "error"
+]
+
+
+def write_status(job: Path,
+                 stage: Stage,
+                 note: str | None = None,
+                 progress: tuple[int, int] | None = None,
+                 timings: dict[str, float] | None = None,
+                 skipped: int | None = None) -> None:
+    data: dict[str, object] = {
+        "stage": stage,
+        "timestamp": time.time(),
+    }
+    if note is not None:
+        data["note"] = note
+    if progress is not None:
+        done, total = progress
+        data["progress"] = {"done": done, "total": total}
+    if skipped is not None:
+        data["skipped"] = skipped       # repeated video frames whose output was reused
+    if timings is not None:
+        data["timings"] = timings       # ms per stage (metrics.StageTimer)
+    tmp = (job / STATUS_FILE).with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(job / STATUS_FILE)
+    jobqueue.record_event(job.name, data)
+
+
+def read_status(job: Path) -> dict:
+    try:
+        return json.loads((job / STATUS_FILE).read_text())
+    except Exception:
+        return {}
+
+
+def write_segments(job: Path, manifest: dict) -> None:
+    tmp = (job / SEGMENTS_FILE).with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.rename(job / SEGMENTS_FILE)
+
+
+def read_segments(job: Path) -> dict | None:
+    try:
+        return json.loads((job / SEGMENTS_FILE).read_text())
+    except Exception:
+        return None
+
+
+def write_batch(job: Path, manifest: dict) -> None:
+    tmp = (job / BATCH_FILE).with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2))
+    tmp.rename(job / BATCH_FILE)
+
+
+def read_batch(job: Path) -> dict | None:
+    try:
+        return json.loads((job / BATCH_FILE).read_text())
+    except Exception:
+        return None
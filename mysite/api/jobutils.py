@@ -4,12 +4,14 @@ Utility helpers for enqueueing jobs, polling results and maintaining history.
 """
 
 from __future__ import annotations
-import io, json, shutil, time, uuid, base64
+import asyncio, io, os, shutil, time, uuid, base64, hashlib, zipfile
 from pathlib import Path
 
 import numpy as np
 from PIL import Image
-from scipy.signal import convolve2d
+
+from . import jobqueue, notify, resultcache, swengine, uploads
+from .jobstatus import read_status, write_batch, write_status
 
 # --------------------------------------------------------------------------- #
 # Globals & limits
@@ -18,40 +20,105 @@ JOBS_ROOT            = Path(__file__).resolve().parent / "jobs"
 JOBS_ROOT.mkdir(exist_ok=True)
 MAX_WIDTH            = 1920
 MAX_HEIGHT           = 1080
+# with tiling the worker runs larger images as MAX_WIDTH×MAX_HEIGHT tiles,
+# so uploads are only downscaled above 8K (keep in sync with worker.py)
+TILING               = bool(int(os.getenv("FPGA_TILING", "1")))
+TILED_MAX_WIDTH      = 7680
+TILED_MAX_HEIGHT     = 4320
 MAX_VIDEO_BYTES      = 1_073_741_824  # 1 GiB
 HISTORY_LIMIT_IMG    = 10
 HISTORY_LIMIT_VIDEO  = 1
-STATUS_FILE          = "status.json"
+HISTORY_LIMIT_BATCH  = 3
+MAX_BATCH_IMAGES     = 500            # keep DATA_UPLOAD_MAX_NUMBER_FILES in sync
+MAX_BATCH_BYTES      = MAX_VIDEO_BYTES
+IMAGE_SUFFIXES       = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp")
+HISTORY_PAGE_SIZE    = 50
+SKIP_MODES           = ("exact", "fuzzy")  # repeated-frame skipping of video jobs (videoio)
 
 
 # --------------------------------------------------------------------------- #
 # Helpers
 # --------------------------------------------------------------------------- #
-def save_uploaded(uploaded_file, dst: Path) -> None:
-    """Stream-save a Django *UploadedFile*."""
+def save_uploaded(uploaded_file, dst: Path) -> str:
+    """Stream-save a Django *UploadedFile*; return the SHA-256 of its bytes."""
+    digest = hashlib.sha256()
     with dst.open("wb") as f:
         for chunk in uploaded_file.chunks():
             f.write(chunk)
+            digest.update(chunk)
     try:
         uploaded_file.seek(0)
     except Exception:
         pass
+    return digest.hexdigest()
+
+def _size_cap() -> tuple[int, int]:
+    return (TILED_MAX_WIDTH, TILED_MAX_HEIGHT) if TILING else (MAX_WIDTH, MAX_HEIGHT)
 
 def resize_image_if_needed(path: Path) -> None:
+    max_w, max_h = _size_cap()
     with Image.open(path) as im:
         w, h = im.size
-        if w <= MAX_WIDTH and h <= MAX_HEIGHT:
+        if w <= max_w and h <= max_h:
             return
-        im.thumbnail((MAX_WIDTH, MAX_HEIGHT), Image.LANCZOS)
+        im.thumbnail((max_w, max_h), Image.LANCZOS)
         im.save(path, format="JPEG", quality=100)
 
-def wait_for_file(path: Path, timeout: int = 45) -> None:
-    """Block until *path* exists or raise *TimeoutError*."""
-    start = time.perf_counter()
-    while not path.exists():
-        if time.perf_counter() - start > timeout:
-            raise TimeoutError(f"{path} not written after {timeout}s")
-        time.sleep(0.4)
+def _outcome(job: Path) -> bool | None:
+    """True once *job* is done, False if it failed, None while unfinished."""
+    if (job / "done.txt").exists():
+        return True
+    if (job / "error.txt").exists():
+        return False
+    return None
+
+def wait_for_done(job: Path, timeout: float = 45) -> bool:
+    """
+    Block until the worker finishes *job*: True when it succeeded, False on
+    error, *TimeoutError* after *timeout* seconds.  Wakes on the worker's
+    ``done`` notification; the files stay the source of truth (and the
+    fallback when notifications are unavailable).
+    """
+    try:
+        sub = notify.Subscriber(jobqueue.DONE_CHANNEL)
+    except OSError:
+        sub = None
+    deadline = time.monotonic() + timeout
+    try:
+        # subscribed before the first look, so a finish in between is not missed
+        while (ok := _outcome(job)) is None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"{job.name} not finished after {timeout}s")
+            if sub is None:
+                time.sleep(min(left, 0.4))
+            else:
+                sub.wait(min(left, 2.0))    # periodic re-check covers dropped datagrams
+        return ok
+    finally:
+        if sub is not None:
+            sub.close()
+
+async def wait_for_done_async(job: Path, timeout: float = 45) -> bool:
+    """``wait_for_done`` for async views - no thread is held while waiting."""
+    try:
+        sub = notify.Subscriber(jobqueue.DONE_CHANNEL)
+    except OSError:
+        sub = None
+    deadline = time.monotonic() + timeout
+    try:
+        while (ok := _outcome(job)) is None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"{job.name} not finished after {timeout}s")
+            if sub is None:
+                await asyncio.sleep(min(left, 0.4))
+            else:
+                await sub.wait_async(min(left, 2.0))
+        return ok
+    finally:
+        if sub is not None:
+            sub.close()
 
 def read_time(job: Path) -> str:
     try:
@@ -74,128 +141,274 @@ def create_job(prefix: str) -> Path:
     job.mkdir()
     return job
 
+def _enqueue_image(job: Path, kind: str, key: str) -> None:
+    """
+    Finish *job* straight from the result cache when *key* is known,
+    otherwise hand it to the worker (which fills the cache when done).
+    """
+    if resultcache.fetch(key, job / "out.jpg"):
+        (job / "hw_time.txt").write_text("0.00 ms (cached)")
+        (job / "done.txt").write_text("done")
+        jobqueue.enqueue(job, kind, state="done")
+        write_status(job, "finished", note="result cache hit", progress=(1, 1))
+        return
+    resize_image_if_needed(job / "in.jpg")
+    (job / "cache_key.txt").write_text(key)
+    jobqueue.enqueue(job, kind)
+
 def enqueue_grayscale_job(uploaded_file):
     job = create_job("job_img")
-    save_uploaded(uploaded_file, job / "in.jpg")
-    resize_image_if_needed(job / "in.jpg")
+    digest = save_uploaded(uploaded_file, job / "in.jpg")
     (job / "kernel.txt").write_text("grayscale")
+    _enqueue_image(job, "grayscale",
+                   resultcache.cache_key(digest, "grayscale", size_cap=_size_cap()))
     return job
 
 def enqueue_filter_job(uploaded_file, coeffs, factor: int):
     job = create_job("job_img")
-    save_uploaded(uploaded_file, job / "in.jpg")
-    resize_image_if_needed(job / "in.jpg")
+    digest = save_uploaded(uploaded_file, job / "in.jpg")
     (job / "kernel.txt").write_text("filter")
     (job / "factor.txt").write_text(str(factor))
     (job / "filter.txt").write_text(" ".join(map(str, coeffs)))
+    _enqueue_image(job, "filter",
+                   resultcache.cache_key(digest, "filter", coeffs, factor, _size_cap()))
     return job
 
-def enqueue_video_grayscale_job(uploaded_file):
+def _write_skip(job: Path, skip: str | None) -> None:
+    if skip:
+        (job / "skip.txt").write_text(skip)
+
+def enqueue_video_grayscale_job(uploaded_file, skip: str | None = None):
     if uploaded_file.size > MAX_VIDEO_BYTES:
         raise ValueError("Video exceeds 1 GiB limit")
     job = create_job("job_vid")
     save_uploaded(uploaded_file, job / "in.mp4")
+    _write_skip(job, skip)
     (job / "kernel.txt").write_text("grayscale_video")
+    jobqueue.enqueue(job, "grayscale_video")
     return job
 
-def enqueue_video_filter_job(uploaded_file, coeffs, factor: int):
+def enqueue_video_filter_job(uploaded_file, coeffs, factor: int, skip: str | None = None):
     if uploaded_file.size > MAX_VIDEO_BYTES:
         raise ValueError("Video exceeds 1 GiB limit")
     job = create_job("job_vid")
     save_uploaded(uploaded_file, job / "in.mp4")
+    _write_skip(job, skip)
     (job / "kernel.txt").write_text("filter_video")
     (job / "factor.txt").write_text(str(factor))
     (job / "filter.txt").write_text(" ".join(map(str, coeffs)))
+    jobqueue.enqueue(job, "filter_video")
+    return job
+
+
+# --------------------------------------------------------------------------- #
+# Batch image jobs
+# --------------------------------------------------------------------------- #
+def _extract_images(archive, dst: Path, start: int) -> list[dict]:
+    """Unpack the images of zip *archive* into *dst* as <start>.<ext>, <start+1>..."""
+    try:
+        zf = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as exc:
+        raise ValueError("zip: not a zip archive") from exc
+    with zf:
+        members = sorted((m for m in zf.infolist() if not m.is_dir()
+                          and Path(m.filename).suffix.lower() in IMAGE_SUFFIXES
+                          and not Path(m.filename).name.startswith(".")),   # macOS "._x.jpg"
+                         key=lambda m: m.filename)
+        if start + len(members) > MAX_BATCH_IMAGES:
+            raise ValueError(f"Batch exceeds {MAX_BATCH_IMAGES} images")
+        if sum(m.file_size for m in members) > MAX_BATCH_BYTES:
+            raise ValueError("Batch exceeds 1 GiB limit")
+        out = []
+        for i, m in enumerate(members, start):
+            name = f"{i:05d}{Path(m.filename).suffix.lower()}"
+            with zf.open(m) as src, (dst / name).open("wb") as f:
+                shutil.copyfileobj(src, f, 1 << 20)
+            out.append({"name": Path(m.filename).name, "input": f"in/{name}"})
+    return out
+
+def enqueue_batch_job(kind: str, files=(), archive=None, coeffs=None, factor: int = 1) -> Path:
+    """
+    One job for many images: the uploaded *files* plus the images inside the
+    zip *archive* go to in/ and are listed in batch.json, and the worker runs
+    them back to back on one overlay load.  *ValueError* (and no job dir)
+    when there are no images, too many, or one of them is not an image.
+    """
+    if len(files) > MAX_BATCH_IMAGES:
+        raise ValueError(f"Batch exceeds {MAX_BATCH_IMAGES} images")
+    if sum(f.size for f in files) + (archive.size if archive is not None else 0) > MAX_BATCH_BYTES:
+        raise ValueError("Batch exceeds 1 GiB limit")
+    job = create_job("job_bat")
+    try:
+        (job / "in").mkdir()
+        images = []
+        for i, f in enumerate(files):
+            suffix = Path(f.name).suffix.lower()
+            name = f"{i:05d}{suffix if suffix in IMAGE_SUFFIXES else '.jpg'}"
+            save_uploaded(f, job / "in" / name)
+            images.append({"name": Path(f.name).name, "input": f"in/{name}"})
+        if archive is not None:
+            images += _extract_images(archive, job / "in", len(images))
+        if not images:
+            raise ValueError("No images in the batch")
+        for im in images:
+            try:
+                resize_image_if_needed(job / im["input"])
+            except Exception as exc:
+                raise ValueError(f"{im['name']}: not an image") from exc
+    except BaseException:
+        shutil.rmtree(job, ignore_errors=True)
+        raise
+    write_batch(job, {"images": images})
+    if kind == "filter_batch":
+        (job / "factor.txt").write_text(str(factor))
+        (job / "filter.txt").write_text(" ".join(map(str, coeffs)))
+    (job / "kernel.txt").write_text(kind)
+    jobqueue.enqueue(job, kind)
     return job
 
 
 # --------------------------------------------------------------------------- #
-# Optional SciPy reference (images only)
+# Chunked (resumable) video uploads
 # --------------------------------------------------------------------------- #
-def run_conv2d(img_rgb, k):
-    out = np.zeros_like(img_rgb)
-    for c in range(3):
-        out[..., c] = convolve2d(img_rgb[..., c], k, mode="same", boundary="symm")
-    return out.clip(0, 255).astype(np.uint8)
+def create_video_upload(kind: str, size: int, coeffs=None, factor: int = 1,
+                        skip: str | None = None) -> Path:
+    """Job dir for a video of *size* bytes that arrives in chunks (see uploads)."""
+    if size > MAX_VIDEO_BYTES:
+        raise ValueError("Video exceeds 1 GiB limit")
+    job = create_job("job_vid")
+    if kind == "filter_video":
+        (job / "factor.txt").write_text(str(factor))
+        (job / "filter.txt").write_text(" ".join(map(str, coeffs)))
+    _write_skip(job, skip)
+    uploads.start(job, kind, size)
+    write_status(job, "receiving", progress=(0, size))
+    return job
+
+def _queue_upload(job: Path, st: dict) -> None:
+    # kernel.txt last: the worker's backfill ignores dirs without it
+    (job / "kernel.txt").write_text(st["kind"])
+    uploads.update(job, queued=True)
+    jobqueue.enqueue(job, st["kind"])
+
+def receive_upload_chunk(job: Path, start: int, chunks) -> dict:
+    """
+    Append one PUT body at byte *start*; queue the job as soon as the
+    worker can start decoding.  Returns the upload state.
+    """
+    st = uploads.state(job)
+    if st["complete"]:
+        raise ValueError("upload already complete")
+    pos = uploads.append(job, start, st["size"], chunks)
+    # receiving progress in 5 % steps, until the worker reports its own
+    if pos * 20 // st["size"] > start * 20 // st["size"] and \
+            read_status(job).get("stage") == "receiving":
+        write_status(job, "receiving", progress=(pos, st["size"]))
+    if not st["queued"] and not st.get("parked") and uploads.sample_layout(job) is not None:
+        _queue_upload(job, st)
+        st["queued"] = True
+    return {**st, "offset": pos}
+
+def complete_upload(job: Path) -> None:
+    """Close the upload; *OffsetMismatch* while bytes are still missing."""
+    st = uploads.state(job)
+    pos = uploads.offset(job)
+    if pos != st["size"]:
+        raise uploads.OffsetMismatch(pos)
+    if not st["complete"]:
+        st = uploads.update(job, complete=True)
+    if not st["queued"]:
+        _queue_upload(job, st)
 
-def run_scipy_gray(img_file):
+
+# --------------------------------------------------------------------------- #
+# Software references (images only)
+# --------------------------------------------------------------------------- #
+def run_sw_gray(img_file):
+    """Software reference with the hardware's exact arithmetic (see swengine)."""
     img_rgb = np.array(Image.open(img_file).convert("RGB"))
-    gray = (img_rgb @ np.array([[0.299, 0.587, 0.114]]).T).astype(np.uint8)
-    img = np.repeat(gray, 3, axis=2)
-    buf, t0 = io.BytesIO(), time.perf_counter()
-    Image.fromarray(img).save(buf, format="JPEG")
-    return base64.b64encode(buf.getvalue()).decode(), time.perf_counter() - t0
+    t0 = time.perf_counter()
+    out = swengine.grayscale(img_rgb)
+    return _encode(out), time.perf_counter() - t0
 
-def run_scipy_filter(img_file, coeffs, factor: int):
+def run_sw_filter(img_file, coeffs, factor: int):
     img_rgb = np.array(Image.open(img_file).convert("RGB"))
-    k = np.array(coeffs, dtype=np.int32).reshape(3, 3) / factor
     t0 = time.perf_counter()
-    out = run_conv2d(img_rgb, k)
+    out = swengine.filter3x3(img_rgb, coeffs, factor)
     return _encode(out), time.perf_counter() - t0
 
 
 # --------------------------------------------------------------------------- #
 # History helpers
 # --------------------------------------------------------------------------- #
-def read_status(job: Path) -> dict:
-    try:
-        return json.loads((job / STATUS_FILE).read_text())
-    except Exception:
-        return {}
-
-def list_history() -> list[dict]:
-    """Return image + video job list (newest first) including live status."""
-    jobs = sorted(JOBS_ROOT.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
-
-    out: list[dict] = []
-    for j in jobs:
-        kind = (j / "kernel.txt").read_text().strip() if (j / "kernel.txt").exists() else "?"
-        is_video = kind.endswith("_video")
-        status = read_status(j) or {"stage": "queued"}
-        stage = status.get("stage", "unknown")
-        prog = status.get("progress", {})
-        done, tot = prog.get("done", 0), prog.get("total", 0)
-        pct = int(done / tot * 100) if tot else (100 if stage == "finished" else 0)
-
-        meta = {
-            "id": j.name,
-            "kind": kind,
-            "is_video": is_video,
-            "status": stage,
-            "progress": pct,
-            "time": read_time(j),
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(j.stat().st_mtime)),
-        }
-
-        # preview / download links
-        if (j / "out.jpg").exists():
-            meta["image"] = _encode(np.array(Image.open(j / "out.jpg")))
-            meta["image_url"] = f"/api/image/result/{j.name}/"
-        else:
-            meta["image"] = ""
-
-        if is_video:
-            meta["video_url"] = f"/api/video/result/{j.name}/"
-
-        if kind in ("filter", "filter_video") and (j / "filter.txt").exists():
-            meta["factor"] = (j / "factor.txt").read_text().strip()
-            meta["kernel"] = (j / "filter.txt").read_text().strip()
-
-        out.append(meta)
-    return out
+def _job_meta(row) -> dict | None:
+    j = JOBS_ROOT / row["job_id"]
+    if not j.is_dir():
+        return None
+    kind = row["kind"]
+    is_video = kind.endswith("_video")
+    status = read_status(j) or {"stage": "queued"}
+    stage = status.get("stage", "unknown")
+    prog = status.get("progress", {})
+    done, tot = prog.get("done", 0), prog.get("total", 0)
+    pct = int(done / tot * 100) if tot else (100 if stage == "finished" else 0)
+
+    meta = {
+        "id": j.name,
+        "seq": row["seq"],
+        "kind": kind,
+        "is_video": is_video,
+        "status": stage,
+        "progress": pct,
+        "time": read_time(j),
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["enqueued"])),
+    }
+
+    # preview / download links
+    if (j / "out.jpg").exists():
+        meta["thumb_url"] = f"/api/image/thumb/{j.name}/"
+        meta["image_url"] = f"/api/image/result/{j.name}/"
+
+    if is_video:
+        meta["video_url"] = f"/api/video/result/{j.name}/"
+    elif kind.endswith("_batch"):
+        meta["batch_url"] = f"/api/batch/result/{j.name}/"
+        if (j / "out.zip").exists():
+            meta["zip_url"] = f"/api/batch/result/{j.name}/zip/"
+
+    if kind in ("filter", "filter_video", "filter_batch") and (j / "filter.txt").exists():
+        meta["factor"] = (j / "factor.txt").read_text().strip()
+        meta["kernel"] = (j / "filter.txt").read_text().strip()
+    return meta
+
+
+def list_history(before: int | None = None,
+                 limit: int = HISTORY_PAGE_SIZE) -> tuple[list[dict], int | None]:
+    """
+    One page of the image + video job list (newest first) including live
+    status, and the cursor of the next page (None on the last one).
+    """
+    rows = jobqueue.history_page(before, limit)
+    out = [m for m in map(_job_meta, rows) if m is not None]
+    nxt = rows[-1]["seq"] if len(rows) == limit else None
+    return out, nxt
+
+
+def _trim_history(prefix: str, limit: int) -> None:
+    stale = jobqueue.finished_beyond(prefix, limit)
+    for name in stale:
+        shutil.rmtree(JOBS_ROOT / name, ignore_errors=True)
+    if stale:
+        jobqueue.forget(stale)
 
 
 def trim_image_history(limit: int = HISTORY_LIMIT_IMG):
-    imgs = sorted([p for p in JOBS_ROOT.iterdir()
-                   if p.name.startswith("job_img") and (p / "done.txt").exists()],
-                  key=lambda p: p.stat().st_mtime, reverse=True)
-    for p in imgs[limit:]:
-        shutil.rmtree(p, ignore_errors=True)
+    _trim_history("job_img", limit)
 
 
 def trim_video_history(limit: int = HISTORY_LIMIT_VIDEO):
-    vids = sorted([p for p in JOBS_ROOT.iterdir()
-                   if p.name.startswith("job_vid") and (p / "done.txt").exists()],
-                  key=lambda p: p.stat().st_mtime, reverse=True)
-    for p in vids[limit:]:
-        shutil.rmtree(p, ignore_errors=True)
+    _trim_history("job_vid", limit)
+
+
+def trim_batch_history(limit: int = HISTORY_LIMIT_BATCH):
+    _trim_history("job_bat", limit)
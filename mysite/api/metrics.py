@@ -0,0 +1,145 @@
+# mysite/api/metrics.py
+"""
+Where a job's time goes, per job and in aggregate.
+
+The worker times each pipeline stage of a job with a ``StageTimer`` and
+stores the totals, in ms, as ``timings`` in the job's final status record.
+Stages: ``queued`` (enqueue → start), ``load_overlay``, ``decode``,
+``resize``, ``pack``, ``config``, ``dma``, ``unpack``, ``cvtcolor``,
+``encode``, ``merge`` and ``zip`` (batches) - ``filter`` instead of
+pack…unpack on the CPU lane, ``fingerprint`` with frame skipping - plus
+``total``, the wall time from start to finish.  Video and batch stages run
+on their own threads, so they may add up to more than ``total``.
+
+``record_job`` folds a finished job into histograms and counters kept in the
+job index, and ``render`` serves them with the queue depth and overlay
+counters in the Prometheus text format (/api/metrics/).  Django-free so the
+worker can import it too.
+"""
+
+from __future__ import annotations
+import json, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import jobqueue
+from .jobstatus import read_status
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 300, 1800)
+FPS_BUCKETS = (1, 5, 10, 15, 20, 25, 30, 45, 60, 120, 240)
+
+
+class StageTimer:
+    """Seconds per stage; ``with timer("decode"):`` or ``timer.add``.  Thread-safe."""
+
+    def __init__(self, job: Path | None = None):
+        self.start = time.perf_counter()
+        self.seconds: dict[str, float] = {}
+        self._lock = threading.Lock()
+        enqueued = job is not None and jobqueue.enqueued_at(job.name)
+        if enqueued:
+            self.add("queued", max(time.time() - enqueued, 0.0))
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def __call__(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - t0)
+
+    def as_ms(self) -> dict[str, float]:
+        """Stage totals in ms, ``total`` included - the status record's ``timings``."""
+        with self._lock:
+            out = {k: round(v * 1e3, 3) for k, v in self.seconds.items()}
+        out["total"] = round((time.perf_counter() - self.start) * 1e3, 3)
+        return out
+
+
+# --------------------------------------------------------------------------- #
+# Aggregation (worker side)
+# --------------------------------------------------------------------------- #
+def _labels(**kw: str) -> str:
+    return ",".join(f'{k}="{v}"' for k, v in kw.items())
+
+def record_job(job: Path, kind: str, lane: str, ok: bool) -> None:
+    """Count a finished job; its stage timings and fps go into the histograms."""
+    jobqueue.bump(f"jobs_total{{{_labels(kind=kind, lane=lane, outcome='done' if ok else 'error')}}}")
+    status = read_status(job)
+    timings = status.get("timings") if ok else None
+    if not timings:
+        return
+    for stage, ms in timings.items():
+        name = "job_seconds" if stage == "total" else "job_stage_seconds"
+        labels = _labels(kind=kind, lane=lane) if stage == "total" else \
+                 _labels(kind=kind, lane=lane, stage=stage)
+        jobqueue.observe(name, labels, ms / 1e3, SECONDS_BUCKETS)
+    frames = status.get("progress", {}).get("done", 0)
+    if kind.endswith("_video") and frames and timings["total"] > 0:
+        labels = _labels(kind=kind, lane=lane)
+        jobqueue.bump(f"video_frames_total{{{labels}}}", frames)
+        jobqueue.bump(f"video_frames_skipped_total{{{labels}}}", status.get("skipped") or 0)
+        jobqueue.observe("video_fps", labels, frames / (timings["total"] / 1e3), FPS_BUCKETS)
+
+
+# --------------------------------------------------------------------------- #
+# Exposition (Django side)
+# --------------------------------------------------------------------------- #
+HELP = {
+    "jobs_total": ("counter", "Jobs finished, by kind, lane and outcome."),
+    "job_seconds": ("histogram", "Wall time of a job from start to finish."),
+    "job_stage_seconds": ("histogram", "Time a job spent in each pipeline stage."),
+    "video_fps": ("histogram", "Frames per second of finished video jobs."),
+    "video_frames_total": ("counter", "Frames written by finished video jobs."),
+    "video_frames_skipped_total": ("counter", "Repeated frames whose previous output was reused."),
+    "queue_jobs": ("gauge", "Jobs waiting or running, by state and kind."),
+    "overlay_reloads_total": ("counter", "Bitstream downloads."),
+    "overlay_reload_seconds_total": ("counter", "Time spent downloading bitstreams."),
+    "overlay_reloads_avoided_total": ("counter", "Jobs run early on the loaded overlay."),
+}
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+def _header(name: str) -> list[str]:
+    typ, text = HELP[name]
+    return [f"# HELP {name} {text}", f"# TYPE {name} {typ}"]
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (0.0.4)."""
+    st = jobqueue.stats()
+    lines = _header("queue_jobs")
+    depth = jobqueue.queue_depth()
+    for (state, kind), n in sorted(depth.items()):
+        lines.append(f"queue_jobs{{{_labels(state=state, kind=kind)}}} {n}")
+
+    for name, key, scale in (("overlay_reloads_total", "overlay_reloads", 1),
+                             ("overlay_reload_seconds_total", "overlay_reload_ms", 1e-3),
+                             ("overlay_reloads_avoided_total", "overlay_reloads_avoided", 1)):
+        lines += _header(name)
+        lines.append(f"{name} {_fmt(st.get(key, 0) * scale)}")
+
+    for name in ("jobs_total", "video_frames_total", "video_frames_skipped_total"):
+        lines += _header(name)
+        lines += [f"{k} {_fmt(v)}" for k, v in sorted(st.items()) if k.startswith(name + "{")]
+
+    seen = set()
+    for row in jobqueue.histograms():
+        name, labels = row["name"], row["labels"]
+        if name not in seen and name in HELP:
+            seen.add(name)
+            lines += _header(name)
+        bounds, counts = json.loads(row["bounds"]), json.loads(row["counts"])
+        cum = 0
+        for le, n in zip([*map(_fmt, bounds), "+Inf"], counts):
+            cum += n
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cum}')
+        lines.append(f"{name}_sum{{{labels}}} {_fmt(row['sum'])}")
+        lines.append(f"{name}_count{{{labels}}} {cum}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,275 @@
+# mysite/api/mp4.py
+"""
+Just enough ISO-BMFF (MP4) for the video pipeline: the sample table of the
+video track - where each frame's bytes live, used to decode uploads that
+are still arriving - and ``concat``, which joins the segment files the
+worker writes into one ``out.mp4`` without decoding or re-encoding a frame.
+Handles the single-track files ``cv2.VideoWriter`` produces and ordinary
+camera / ffmpeg MP4s.  Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import struct
+from pathlib import Path
+
+_CONTAINERS = {"moov", "trak", "mdia", "minf", "stbl"}
+_COPY_BLOCK = 1 << 20
+
+
+# --------------------------------------------------------------------------- #
+# Reading
+# --------------------------------------------------------------------------- #
+def boxes(data: bytes | memoryview, start: int = 0, end: int | None = None):
+    """(type, payload start, box end) of the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    while start + 8 <= end:
+        size, typ = struct.unpack_from(">I4s", data, start)
+        hdr = 8
+        if size == 1:
+            if start + 16 > end:
+                return
+            size, hdr = struct.unpack_from(">Q", data, start + 8)[0], 16
+        elif size == 0:
+            size = end - start
+        if size < hdr:
+            return
+        yield typ.decode("latin-1"), start + hdr, start + size
+        start += size
+
+def _child(data: bytes, start: int, end: int, typ: str) -> tuple[int, int] | None:
+    for t, s, e in boxes(data, start, end):
+        if t == typ:
+            return s, e
+    return None
+
+def top_level(path: Path) -> dict[str, tuple[int, int]]:
+    """{type: (payload start, box end)} of the complete top-level boxes on disk."""
+    found: dict[str, tuple[int, int]] = {}
+    with path.open("rb") as f:
+        length = f.seek(0, 2)
+        pos = 0
+        while pos + 8 <= length:
+            f.seek(pos)
+            hdr = f.read(16)
+            size, typ = struct.unpack_from(">I4s", hdr)
+            skip = 8
+            if size == 1 and len(hdr) == 16:
+                size, skip = struct.unpack_from(">Q", hdr, 8)[0], 16
+            elif size == 0:
+                size = length - pos     # runs to the end of the file (as written so far)
+            if size < skip or pos + size > length:
+                break
+            found.setdefault(typ.decode("latin-1"), (pos + skip, pos + size))
+            pos += size
+    return found
+
+def read_moov(path: Path) -> bytes | None:
+    """The ``moov`` payload once it is entirely on disk, else None."""
+    box = top_level(path).get("moov")
+    if box is None:
+        return None
+    with path.open("rb") as f:
+        f.seek(box[0])
+        return f.read(box[1] - box[0])
+
+def _video_track(moov: bytes) -> dict[str, tuple[int, int]] | None:
+    """
+    (payload start, end) of the first video track's boxes: "trak", "mdia",
+    "mdhd" and every sample table ("stsz", "stco", ...).
+    """
+    for typ, s, e in boxes(moov):
+        if typ != "trak":
+            continue
+        mdia = _child(moov, s, e, "mdia")
+        hdlr = mdia and _child(moov, *mdia, "hdlr")
+        if not hdlr or moov[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+            continue
+        minf = _child(moov, *mdia, "minf")
+        stbl = minf and _child(moov, *minf, "stbl")
+        mdhd = _child(moov, *mdia, "mdhd")
+        if not stbl or not mdhd:
+            return None
+        track = {t: (ps, pe) for t, ps, pe in boxes(moov, *stbl)}
+        track.update(trak=(s, e), mdia=mdia, mdhd=mdhd)
+        return track
+    return None
+
+def _entries(moov: bytes, track: dict[str, tuple[int, int]], name: str, fmt: str) -> list[tuple]:
+    if name not in track:
+        return []
+    ps = track[name][0]
+    n = struct.unpack_from(">I", moov, ps + 4)[0]
+    size = struct.calcsize(fmt)
+    return [struct.unpack_from(fmt, moov, ps + 8 + size*i) for i in range(n)]
+
+def sample_table(moov: bytes) -> tuple[list[int], list[int]] | None:
+    """(file offset, size) of every video sample in decode order, or None."""
+    tables = _video_track(moov)
+    if tables is None or "stsz" not in tables or "stsc" not in tables:
+        return None
+    ps = tables["stsz"][0]
+    fixed, count = struct.unpack_from(">II", moov, ps + 4)
+    sizes = [fixed] * count if fixed else list(struct.unpack_from(f">{count}I", moov, ps + 12))
+    if "stco" in tables:
+        chunks = [c for c, in _entries(moov, tables, "stco", ">I")]
+    elif "co64" in tables:
+        chunks = [c for c, in _entries(moov, tables, "co64", ">Q")]
+    else:
+        return None
+    runs = [r[:2] for r in _entries(moov, tables, "stsc", ">III")]
+    offsets = []
+    for r, (first, per_chunk) in enumerate(runs):
+        last = runs[r + 1][0] - 1 if r + 1 < len(runs) else len(chunks)
+        for c in range(first - 1, last):
+            pos = chunks[c]
+            for _ in range(per_chunk):
+                if len(offsets) == count:
+                    break
+                offsets.append(pos)
+                pos += sizes[len(offsets) - 1]
+    return offsets, sizes
+
+
+# --------------------------------------------------------------------------- #
+# Concatenation
+# --------------------------------------------------------------------------- #
+def _box(typ: str, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), typ.encode("latin-1")) + payload
+
+def _full(typ: str, fmt: str, rows: list[tuple]) -> bytes:
+    """A version-0 full box holding an entry count and *rows*."""
+    body = b"".join(struct.pack(fmt, *r) for r in rows)
+    return _box(typ, b"\0\0\0\0" + struct.pack(">I", len(rows)) + body)
+
+def _set_duration(payload: bytes, typ: str, duration: int) -> bytes:
+    """mvhd / tkhd / mdhd with a new duration (either box version)."""
+    p = bytearray(payload)
+    v1 = p[0] == 1
+    if typ == "tkhd":
+        at = 28 if v1 else 20
+    else:
+        at = 24 if v1 else 16
+    struct.pack_into(">Q" if v1 else ">I", p, at, duration)
+    return bytes(p)
+
+def _timescale(payload: bytes) -> int:
+    """Timescale of an mvhd / mdhd payload."""
+    return struct.unpack_from(">I", payload, 20 if payload[0] == 1 else 12)[0]
+
+def _rebuild(moov: bytes, start: int, end: int, path: str, new: dict[str, bytes]) -> bytes:
+    """Re-serialise the boxes in moov[start:end], replacing/dropping via *new*."""
+    out = []
+    for typ, s, e in boxes(moov, start, end):
+        key = f"{path}/{typ}"
+        if key in new:
+            if new[key]:
+                out.append(new[key])
+        elif typ in _CONTAINERS:
+            out.append(_box(typ, _rebuild(moov, s, e, key, new)))
+        else:
+            out.append(_box(typ, bytes(moov[s:e])))
+    return b"".join(out)
+
+def concat(parts: list[Path], dst: Path) -> int:
+    """
+    Join single-track video MP4 *parts* written with identical encoder
+    settings (the worker's segments) into *dst*, ``moov`` first so it
+    streams.  Returns the frame count.
+    """
+    metas = []
+    for p in parts:
+        moov = read_moov(p)
+        table = moov and sample_table(moov)
+        if not table or sum(t == "trak" for t, _, _ in boxes(moov)) != 1:
+            raise ValueError(f"{p.name} is not a single-track video")
+        tables = _video_track(moov)
+        stss = [n for n, in _entries(moov, tables, "stss", ">I")] if "stss" in tables else None
+        metas.append((moov, tables, table, stss,
+                      [r for r in _entries(moov, tables, "stts", ">II")],
+                      [r for r in _entries(moov, tables, "ctts", ">II")] if "ctts" in tables else None))
+
+    moov = metas[0][0]
+    stts: list[list[int]] = []
+    stss: list[tuple[int]] = []
+    ctts: list[tuple[int, int]] = []
+    sizes: list[int] = []
+    all_sync = all(m[3] is None for m in metas)
+    for _, _, (_, sz), sync, tts, cts in metas:
+        base = len(sizes)
+        for count, delta in tts:
+            if stts and stts[-1][1] == delta:
+                stts[-1][0] += count
+            else:
+                stts.append([count, delta])
+        if not all_sync:
+            stss += [(base + n,) for n in sync] if sync is not None else \
+                    [(base + n + 1,) for n in range(len(sz))]
+        if cts is not None:
+            ctts += cts
+        sizes += sz
+    media_dur = sum(c * d for c, d in stts)
+
+    track = metas[0][1]
+    mvhd = _child(moov, 0, len(moov), "mvhd")
+    tkhd = _child(moov, *track["trak"], "tkhd")
+    mdhd = track["mdhd"]
+    movie_dur = media_dur * _timescale(moov[mvhd[0]:mvhd[1]]) // _timescale(moov[mdhd[0]:mdhd[1]])
+    stsd = _box("stsd", bytes(moov[slice(*track["stsd"])]))
+    use64 = sum(sizes) + (1 << 16) >= 1 << 32
+
+    def build(offsets: list[int]) -> bytes:
+        tabs = [stsd, _full("stts", ">II", [tuple(r) for r in stts])]
+        if not all_sync:
+            tabs.append(_full("stss", ">I", stss))
+        if ctts:
+            tabs.append(_full("ctts", ">II", ctts))
+        tabs.append(_full("stsc", ">III", [(1, 1, 1)]))        # one sample per chunk
+        tabs.append(_box("stsz", b"\0\0\0\0" + struct.pack(">II", 0, len(sizes)) +
+                         struct.pack(f">{len(sizes)}I", *sizes)))
+        tabs.append(_full("co64", ">Q", [(o,) for o in offsets]) if use64 else
+                    _full("stco", ">I", [(o,) for o in offsets]))
+        return _box("moov", _rebuild(moov, 0, len(moov), "", {
+            "/mvhd": _box("mvhd", _set_duration(moov[mvhd[0]:mvhd[1]], "mvhd", movie_dur)),
+            "/trak/tkhd": _box("tkhd", _set_duration(moov[tkhd[0]:tkhd[1]], "tkhd", movie_dur)),
+            "/trak/edts": b"",          # the first part's edit list would cut the rest off
+            "/trak/mdia/mdhd": _box("mdhd", _set_duration(moov[mdhd[0]:mdhd[1]], "mdhd", media_dur)),
+            "/trak/mdia/minf/stbl": _box("stbl", b"".join(tabs)),
+        }))
+
+    with parts[0].open("rb") as f:
+        ftyp_box = top_level(parts[0]).get("ftyp")
+        f.seek(ftyp_box[0] - 8)
+        ftyp = f.read(ftyp_box[1] - ftyp_box[0] + 8)
+    mdat_hdr = 16 if use64 else 8
+    head = len(ftyp) + len(build([0] * len(sizes))) + mdat_hdr
+    offsets, pos = [], head
+    for s in sizes:
+        offsets.append(pos)
+        pos += s
+
+    tmp = dst.with_suffix(".tmp")
+    with tmp.open("wb") as out:
+        out.write(ftyp)
+        out.write(build(offsets))
+        total = sum(sizes) + mdat_hdr
+        out.write(struct.pack(">I4sQ", 1, b"mdat", total) if use64 else
+                  struct.pack(">I4s", total, b"mdat"))
+        for p, (_, _, (offs, szs), *_rest) in zip(parts, metas):
+            with p.open("rb") as f:
+                i = 0
+                while i < len(offs):        # copy runs of back-to-back samples
+                    j, end = i + 1, offs[i] + szs[i]
+                    while j < len(offs) and offs[j] == end:
+                        end += szs[j]
+                        j += 1
+                    f.seek(offs[i])
+                    left = end - offs[i]
+                    while left:
+                        block = f.read(min(left, _COPY_BLOCK))
+                        if not block:
+                            raise ValueError(f"{p.name} is truncated")
+                        out.write(block)
+                        left -= len(block)
+                    i = j
+    tmp.replace(dst)
+    return len(sizes)
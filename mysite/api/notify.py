@@ -0,0 +1,108 @@
+# mysite/api/notify.py
+"""
+Local fire-and-forget pub/sub between the Django processes and worker.py.
+
+A subscriber binds a Unix datagram socket under ``NOTIFY_DIR/<channel>/``;
+``publish`` sends one datagram to every socket in that directory.  Publishing
+never blocks, and with nobody listening the message is simply dropped, so
+callers must always be able to fall back to looking at the files themselves.
+Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import asyncio, os, select, socket, uuid
+from pathlib import Path
+
+NOTIFY_DIR = Path(__file__).resolve().parent / "notify"
+AVAILABLE  = hasattr(socket, "AF_UNIX")
+
+
+def _channel_dir(channel: str) -> Path:
+    d = NOTIFY_DIR / channel
+    if not d.is_dir():
+        d.mkdir(parents=True, exist_ok=True)
+        # the worker runs as root, the web server usually does not
+        for p in (NOTIFY_DIR, d):
+            try:
+                p.chmod(0o777)
+            except OSError:
+                pass
+    return d
+
+
+class Subscriber:
+    """Receive end of one channel; use as a context manager."""
+
+    def __init__(self, channel: str):
+        if not AVAILABLE:
+            raise OSError("Unix domain sockets are not available")
+        self.path = _channel_dir(channel) / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(str(self.path))
+        self.sock.setblocking(False)
+        try:
+            self.path.chmod(0o777)
+        except OSError:
+            pass
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def drain(self) -> list[str]:
+        """Return every message already received, without blocking."""
+        msgs = []
+        while True:
+            try:
+                msgs.append(self.sock.recv(4096).decode())
+            except (BlockingIOError, InterruptedError):
+                return msgs
+
+    def wait(self, timeout: float | None) -> list[str]:
+        """Block up to *timeout* seconds; return the messages received (maybe none)."""
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        return self.drain() if ready else []
+
+    async def wait_async(self, timeout: float | None) -> list[str]:
+        """``wait`` for asyncio code: suspends the coroutine, not the thread."""
+        loop = asyncio.get_running_loop()
+        try:
+            first = await asyncio.wait_for(loop.sock_recv(self.sock, 4096), timeout)
+        except asyncio.TimeoutError:
+            return []
+        return [first.decode(), *self.drain()]
+
+    def close(self) -> None:
+        self.sock.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "Subscriber":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+
+def publish(channel: str, message: str = "") -> int:
+    """Send *message* to every subscriber of *channel*; return how many got it."""
+    d = NOTIFY_DIR / channel
+    if not AVAILABLE or not d.is_dir():
+        return 0
+    sent = 0
+    data = message.encode()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as s:
+        s.setblocking(False)
+        for p in d.glob("*.sock"):
+            try:
+                s.sendto(data, str(p))
+                sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                try:
+                    p.unlink()          # subscriber died without closing
+                except OSError:
+                    pass
+            except OSError:
+                pass                    # receiver full / not permitted: drop
+    return sent
@@ -0,0 +1,108 @@
+# mysite/api/resultcache.py
+"""
+Content-addressed cache of finished image results.
+
+The key is a SHA-256 over the uploaded bytes, the kernel kind, the 9
+coefficients and the factor (plus the resize cap, which changes the input
+the accelerator sees).  Entries are plain ``<key>.jpg`` files hard-linked
+to/from the jobs' ``out.jpg``, so a hit costs one ``link()`` and nothing is
+copied.  The LRU clock is the mtime of an empty ``<key>.used`` sidecar -
+not of the ``.jpg``, whose inode is every linked job's ``out.jpg`` (and
+its Last-Modified/ETag).  Past ``CACHE_LIMIT`` entries the least recently
+used go.  Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import hashlib, os, shutil, uuid
+from pathlib import Path
+
+CACHE_DIR   = Path(__file__).resolve().parent / "result_cache"
+CACHE_LIMIT = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+
+
+def cache_key(digest: str, kind: str, coeffs=None, factor: int | None = None,
+              size_cap: tuple[int, int] | None = None) -> str:
+    """Key for *digest* (hex SHA-256 of the upload) run through *kind*."""
+    parts = [digest, kind]
+    if coeffs is not None:
+        parts.append(" ".join(map(str, coeffs)))
+        parts.append(str(factor))
+    if size_cap is not None:
+        parts.append("%dx%d" % size_cap)
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _entry(key: str) -> Path:
+    return CACHE_DIR / f"{key}.jpg"
+
+
+def _stamp(key: str) -> Path:
+    return CACHE_DIR / f"{key}.used"
+
+
+def _link(src: Path, dst: Path) -> None:
+    """Hard link *src* to *dst*, copying when linking is not possible."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def fetch(key: str, dst: Path) -> bool:
+    """On a hit, link the cached result to *dst*, refresh its LRU stamp and return True."""
+    src = _entry(key)
+    try:
+        _link(src, dst)
+    except FileNotFoundError:
+        return False
+    try:
+        os.utime(_stamp(key))
+    except OSError:
+        pass
+    return True
+
+
+def store(key: str, result: Path) -> None:
+    """Remember *result* (a finished ``out.jpg``) under *key* and apply the size cap."""
+    if not CACHE_DIR.is_dir():
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        try:
+            CACHE_DIR.chmod(0o777)      # written by the worker, linked by the web app
+        except OSError:
+            pass
+    tmp = CACHE_DIR / f".{uuid.uuid4().hex}.tmp"
+    _link(result, tmp)
+    try:
+        tmp.chmod(0o666)                # protected_hardlinks: linker needs rw access
+    except OSError:
+        pass
+    tmp.replace(_entry(key))
+    stamp = _stamp(key)
+    stamp.touch()
+    try:
+        stamp.chmod(0o666)              # the web app refreshes it on hits
+    except OSError:
+        pass
+    evict(CACHE_LIMIT)
+
+
+def _mtime(p: Path) -> float:
+    try:
+        return p.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def evict(limit: int) -> int:
+    """Drop least recently used entries beyond *limit*; returns how many."""
+    if not CACHE_DIR.is_dir():
+        return 0
+    entries = sorted(CACHE_DIR.glob("*.jpg"), key=lambda p: _mtime(_stamp(p.stem)))
+    stale = entries[:max(len(entries) - limit, 0)]
+    for p in stale:
+        for f in (p, _stamp(p.stem)):
+            try:
+                f.unlink()
+            except FileNotFoundError:
+                pass
+    return len(stale)
@@ -0,0 +1,163 @@
+# mysite/api/swengine.py
+"""
+Software reference engine with the FPGA kernels' fixed-point semantics (the
+worker's emulator backend runs on it too):
+
+* grayscale - float32 luma ``0.299 R + 0.587 G + 0.114 B`` truncated to
+  uint8, replicated on R, G and B
+* filter    - 3×3 window·kernel sum in integers, floor-divided by
+  ``factor`` and saturated to [0, 255]; borders replicate the edge pixel
+
+All three channels go through together, as strided tap views
+(``sliding_window_view``) of one edge-padded copy.  Rank-1 kernels (box,
+gauss, sobel, ...) take a separable row-then-column path, 6 taps instead of
+9.  The accumulator is int16 when the kernel's absolute sum proves it
+cannot overflow and int32 otherwise - int32 wraps exactly like the
+hardware's sum, whatever the order of the taps.  Images are processed in
+row bands, on a thread pool when more than one CPU is available (NumPy
+releases the GIL inside the ufuncs).  NumPy only, Django-free.
+"""
+
+from __future__ import annotations
+import os, threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], np.float32)
+BAND_ROWS    = 64                   # rows per band - keeps the accumulators in cache
+THREADS      = int(os.getenv("SW_THREADS", "0")) or (os.cpu_count() or 1)
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(THREADS, thread_name_prefix="swengine")
+    return _pool
+
+
+# --------------------------------------------------------------------------- #
+# Grayscale
+# --------------------------------------------------------------------------- #
+def grayscale(rgb: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Luma in float32 truncated to uint8, replicated on R, G and B (pass
+    ``bgr[..., ::-1]`` for BGR frames - the result is the same either way).
+    """
+    y = (rgb.astype(np.float32) @ GRAY_WEIGHTS).astype(np.uint8)
+    if out is None:
+        return np.repeat(y[..., None], 3, axis=-1)
+    out[...] = y[..., None]
+    return out
+
+
+# --------------------------------------------------------------------------- #
+# 3×3 filter
+# --------------------------------------------------------------------------- #
+def separable(k) -> tuple[np.ndarray, np.ndarray] | None:
+    """Integer (col, row) with ``outer(col, row) == k`` for a rank-1 kernel, else None."""
+    k = np.asarray(k, np.int64).reshape(3, 3)
+    rows = np.flatnonzero(k.any(axis=1))
+    if rows.size == 0:
+        return None
+    v = k[rows[0]]
+    row = v // np.gcd.reduce(v)
+    j = np.flatnonzero(row)[0]
+    col, rem = np.divmod(k[:, j], row[j])
+    if rem.any() or not np.array_equal(np.outer(col, row), k):
+        return None
+    return col, row
+
+
+def _mac(acc: np.ndarray, tap: np.ndarray, c: int, tmp: np.ndarray) -> None:
+    """acc += c * tap, without a temporary for the common ±1 taps."""
+    if c == 0:
+        return
+    if c == 1:
+        np.add(acc, tap, out=acc, dtype=acc.dtype, casting="unsafe")
+    elif c == -1:
+        np.subtract(acc, tap, out=acc, dtype=acc.dtype, casting="unsafe")
+    else:
+        np.multiply(tap, c, out=tmp, dtype=acc.dtype, casting="unsafe")
+        acc += tmp
+
+
+def _direct(band: np.ndarray, k: np.ndarray, dtype) -> np.ndarray:
+    win = sliding_window_view(band, (3, 3), axis=(0, 1))     # (h, w, C, 3, 3)
+    acc = np.zeros(win.shape[:3], dtype)
+    tmp = np.empty_like(acc)
+    for (dy, dx), c in np.ndenumerate(k):
+        _mac(acc, win[..., dy, dx], int(c), tmp)
+    return acc
+
+
+def _separable(band: np.ndarray, col: np.ndarray, row: np.ndarray, dtype) -> np.ndarray:
+    win = sliding_window_view(band, 3, axis=1)               # (h+2, w, C, 3)
+    rows = np.zeros(win.shape[:3], dtype)
+    tmp = np.empty_like(rows)
+    for dx, c in enumerate(row):
+        _mac(rows, win[..., dx], int(c), tmp)
+    win = sliding_window_view(rows, 3, axis=0)               # (h, w, C, 3)
+    acc = np.zeros(win.shape[:3], dtype)
+    tmp = tmp[:acc.shape[0]]
+    for dy, c in enumerate(col):
+        _mac(acc, win[..., dy], int(c), tmp)
+    return acc
+
+
+def _finish(acc: np.ndarray, factor: int, out: np.ndarray) -> None:
+    """out = clip(acc // factor, 0, 255), in place on *acc*."""
+    if factor > 1:
+        if factor & (factor - 1) == 0:
+            np.right_shift(acc, factor.bit_length() - 1, out=acc)   # floor, like //
+        else:
+            np.floor_divide(acc, factor, out=acc)
+    np.clip(acc, 0, 255, out=acc)
+    np.copyto(out, acc, casting="unsafe")
+
+
+def filter3x3(rgb: np.ndarray, k, factor: int, threads: int | None = None,
+              out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Hardware-exact 3×3 filter of a (h, w, C) uint8 image; *k* is any 9
+    integers.  Floor vs. truncating division only differs below zero, which
+    saturates to 0 either way.  At most *threads* (default ``THREADS``,
+    capped by the shared pool's ``THREADS``) bands run at once; 1 runs on
+    the calling thread.
+    """
+    factor = int(factor)
+    if factor <= 0:
+        raise ValueError(f"kernel_factor must be positive, got {factor}")
+    h, w = rgb.shape[:2]
+    out = np.empty_like(rgb) if out is None else out
+    k = np.asarray(k).astype(np.int64).reshape(3, 3).astype(np.int32)  # the register's width
+    bound = 255 * int(np.abs(k.astype(np.int64)).sum())
+    if factor > bound:
+        out[...] = 0                    # |acc| < factor: every quotient is 0 or -1
+        return out
+    dtype = np.int16 if bound < 2**15 else np.int32
+    sep = separable(k) if bound < 2**31 else None
+    pad = np.pad(rgb, ((1, 1), (1, 1), (0, 0)), mode="edge")
+
+    def band(y0: int, y1: int) -> None:
+        rows = pad[y0:y1 + 2]
+        acc = _separable(rows, *sep, dtype) if sep else _direct(rows, k, dtype)
+        _finish(acc, factor, out[y0:y1])
+
+    spans = [(y, min(y + BAND_ROWS, h)) for y in range(0, h, BAND_ROWS)]
+    n = min(threads or THREADS, len(spans))
+    if n > 1:
+        def chunk(i: int) -> None:      # every n-th band, so n tasks in flight
+            for s in spans[i::n]:
+                band(*s)
+        for f in [_executor().submit(chunk, i) for i in range(n)]:
+            f.result()
+    else:
+        for s in spans:
+            band(*s)
+    return out
@@ -0,0 +1,59 @@
+# mysite/api/tests/__init__.py
+"""
+Tests of the api app and the worker:  python3 manage.py test api
+
+``sandbox`` points the job dirs, the job index, the result cache and the
+wake-up sockets of a test class at a scratch dir, so tests never touch the
+real ones (or a worker running next to them); ``write_video`` makes small
+MP4s the way the worker's ``cv2.VideoWriter`` does.
+"""
+
+from __future__ import annotations
+import os, sys, tempfile, threading
+from pathlib import Path
+from unittest import mock
+
+import cv2
+import numpy as np
+
+from api import fileserve, jobqueue, jobutils, notify, resultcache, views
+
+ROOT = Path(__file__).resolve().parents[3]      # worker.py, backends.py
+
+
+def sandbox(cls) -> Path:
+    """Patch the app's state dirs to a temp dir for the test class *cls*; returns it."""
+    tmp = tempfile.TemporaryDirectory()
+    cls.addClassCleanup(tmp.cleanup)
+    root = Path(tmp.name)
+    (root / "jobs").mkdir()
+    patches = [mock.patch.object(jobqueue, "QUEUE_DB", root / "jobqueue.sqlite3"),
+               mock.patch.object(jobqueue, "_local", threading.local()),
+               mock.patch.object(notify, "NOTIFY_DIR", root / "notify"),
+               mock.patch.object(resultcache, "CACHE_DIR", root / "result_cache")]
+    patches += [mock.patch.object(m, "JOBS_ROOT", root / "jobs")
+                for m in (jobutils, views, fileserve)]
+    for patch in patches:
+        patch.start()
+        cls.addClassCleanup(patch.stop)
+    return root
+
+
+def import_worker():
+    """worker.py on the emulator backend."""
+    os.environ["WORKER_BACKEND"] = "emulator"
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    import worker
+    return worker
+
+
+def write_video(path: Path, frames: int, size: tuple[int, int] = (64, 48), seed: int = 0) -> Path:
+    """*frames* frames of moving noise, ``moov`` last."""
+    w, h = size
+    base = np.random.default_rng(seed).integers(0, 256, (h, w, 3), dtype=np.uint8)
+    vw = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, size)
+    for i in range(frames):
+        vw.write(np.roll(base, 4 * i, axis=1))
+    vw.release()
+    return path
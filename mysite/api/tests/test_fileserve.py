@@ -0,0 +1,80 @@
+import tempfile
+from pathlib import Path
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from api.fileserve import _byte_range, serve_file
+
+
+class ByteRangeTests(SimpleTestCase):
+
+    def test_ranges(self):
+        cases = {
+            "bytes=0-99":     (0, 99),
+            "bytes=100-":     (100, 999),
+            "bytes=-100":     (900, 999),
+            "bytes=-5000":    (0, 999),           # suffix longer than the file
+            "bytes=900-5000": (900, 999),         # last clamped to the end
+            " bytes=5-5 ":    (5, 5),
+        }
+        for header, want in cases.items():
+            self.assertEqual(_byte_range(header, 1000), want, header)
+
+    def test_whole_file(self):
+        for header in ("bytes=-", "bytes=0-1,5-9", "items=0-9", "bytes=a-b", "bytes=50-10"):
+            self.assertIsNone(_byte_range(header, 1000), header)
+
+    def test_unsatisfiable(self):
+        for header, size in (("bytes=1000-", 1000), ("bytes=1000-2000", 1000),
+                             ("bytes=-0", 1000), ("bytes=-10", 0)):
+            self.assertIs(_byte_range(header, size), False, header)
+
+
+@override_settings(RESULT_SENDFILE="")
+class ServeFileTests(SimpleTestCase):
+    """Validators, ranges and If-Range of serve_file."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.data = bytes(range(256)) * 40
+        self.path = Path(tmp.name) / "out.mp4"
+        self.path.write_bytes(self.data)
+        self.rf = RequestFactory()
+
+    def get(self, **headers):
+        resp = serve_file(self.rf.get("/", headers=headers), self.path, "video/mp4", "result.mp4")
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        resp.close()
+        return resp, body
+
+    def test_full_and_not_modified(self):
+        resp, body = self.get()
+        self.assertEqual((resp.status_code, body), (200, self.data))
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(self.get(If_None_Match=resp["ETag"])[0].status_code, 304)
+        self.assertEqual(self.get(If_Modified_Since=resp["Last-Modified"])[0].status_code, 304)
+
+    def test_range(self):
+        resp, body = self.get(Range="bytes=100-199")
+        self.assertEqual((resp.status_code, body), (206, self.data[100:200]))
+        self.assertEqual(resp["Content-Range"], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(resp["Content-Length"], "100")
+
+    def test_unsatisfiable_range(self):
+        resp, _ = self.get(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_if_range(self):
+        etag = self.get()[0]["ETag"]
+        mtime = self.path.stat().st_mtime
+        resp, body = self.get(Range="bytes=-10", If_Range=etag)
+        self.assertEqual((resp.status_code, body), (206, self.data[-10:]))
+        resp, body = self.get(Range="bytes=-10", If_Range=http_date(mtime))
+        self.assertEqual(resp.status_code, 206)
+        # the file changed since the client's copy: the whole new file
+        for stale in ('"0-0"', http_date(mtime - 3600)):
+            resp, body = self.get(Range="bytes=-10", If_Range=stale)
+            self.assertEqual((resp.status_code, body), (200, self.data), stale)
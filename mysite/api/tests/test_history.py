@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+
+from api import jobqueue, jobutils
+from api.jobstatus import write_status
+
+from . import sandbox
+
+
+class HistoryTests(SimpleTestCase):
+    """Cursor pages stay put while jobs arrive; the ETag follows the history version."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sandbox(cls)
+
+    def setUp(self):
+        jobqueue.forget()
+        self.jobs = [self.add() for _ in range(7)]
+
+    def add(self):
+        job = jobutils.create_job("job_img")
+        jobqueue.enqueue(job, "grayscale")
+        return job
+
+    def page(self, **params) -> dict:
+        resp = self.client.get("/api/history/", params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_cursor_pages(self):
+        first = self.page(limit=3)
+        late = self.add()                                   # must not shift the later pages
+        ids, cursor = [r["id"] for r in first["results"]], first["next"]
+        while cursor is not None:
+            page = self.page(limit=3, cursor=cursor)
+            ids += [r["id"] for r in page["results"]]
+            cursor = page["next"]
+        self.assertEqual(ids, [j.name for j in reversed(self.jobs)])
+        self.assertEqual(self.page(limit=3)["results"][0]["id"], late.name)
+
+    def test_deleted_dirs_are_skipped(self):
+        self.jobs[-1].rename(self.jobs[-1].with_name("gone"))
+        self.assertEqual([r["id"] for r in self.page()["results"]],
+                         [j.name for j in reversed(self.jobs[:-1])])
+
+    def test_bad_params(self):
+        for params in ({"cursor": "x"}, {"limit": "many"}):
+            self.assertEqual(self.client.get("/api/history/", params).status_code, 400)
+        self.assertEqual(len(self.page(limit=0)["results"]), 1)             # clamped
+
+    def test_etag(self):
+        resp = self.client.get("/api/history/", {"limit": 3})
+        etag = resp["ETag"]
+        again = self.client.get("/api/history/", {"limit": 3}, headers={"If-None-Match": etag})
+        self.assertEqual((again.status_code, again.content), (304, b""))
+        other = self.client.get("/api/history/", {"limit": 3, "cursor": resp.json()["next"]},
+                                headers={"If-None-Match": etag})
+        self.assertEqual(other.status_code, 200)            # another page, another tag
+        write_status(self.jobs[0], "processing", progress=(1, 2))
+        changed = self.client.get("/api/history/", {"limit": 3}, headers={"If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
@@ -0,0 +1,86 @@
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from api import jobqueue
+
+from . import sandbox
+
+
+class ClaimNextTests(SimpleTestCase):
+    """claim_next may run a job for the loaded overlay first, but only so far."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sandbox(cls)
+
+    def setUp(self):
+        jobqueue.forget()
+
+    def queue(self, *kinds: str) -> list[str]:
+        names = [f"job_{i}_{kind}" for i, kind in enumerate(kinds)]
+        for name, kind in zip(names, kinds):
+            jobqueue.enqueue(Path(name), kind)
+        return names
+
+    def claim(self, prefer="grayscale", max_bypass=2, max_wait=60.0):
+        row, reordered = jobqueue.claim_next(prefer, max_bypass, max_wait)
+        return (row["job_id"] if row else None), reordered
+
+    def bypassed(self, job_id: str) -> int:
+        return jobqueue._connect().execute(
+            "SELECT bypassed FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def test_fifo_without_preference(self):
+        names = self.queue("filter", "grayscale", "filter")
+        self.assertEqual([self.claim(prefer=None) for _ in names] + [self.claim(prefer=None)],
+                         [(n, False) for n in names] + [(None, False)])
+
+    def test_matching_overlay_runs_first(self):
+        f0, g1, f2, g3 = self.queue("filter", "grayscale", "filter", "grayscale_video")
+        self.assertEqual(self.claim(), (g1, True))
+        self.assertEqual(self.bypassed(f0), 1)
+        self.assertEqual(self.bypassed(f2), 0)          # only jobs ahead of it are passed over
+        self.assertEqual(self.claim(), (g3, True))
+        self.assertEqual((self.bypassed(f0), self.bypassed(f2)), (2, 1))
+
+    def test_head_runs_when_nothing_matches(self):
+        f0, _ = self.queue("filter", "filter")
+        self.assertEqual(self.claim(), (f0, False))
+        self.assertEqual(self.bypassed(f0), 0)
+
+    def test_bypass_limit(self):
+        f0, *_ = self.queue("filter", "grayscale", "grayscale", "grayscale")
+        self.assertTrue(self.claim()[1])
+        self.assertTrue(self.claim()[1])
+        self.assertEqual(self.claim(), (f0, False))     # passed over max_bypass times
+
+    def test_aging(self):
+        f0, _ = self.queue("filter", "grayscale")
+        jobqueue._connect().execute("UPDATE jobs SET enqueued = enqueued - 61 WHERE job_id = ?", (f0,))
+        self.assertEqual(self.claim(), (f0, False))     # waited max_wait already
+        self.assertEqual(self.bypassed(f0), 0)
+
+
+class JobsAheadTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sandbox(cls)
+
+    def setUp(self):
+        jobqueue.forget()
+
+    def test_counts_running_and_earlier_pending(self):
+        names = [f"job_{i}" for i in range(5)]
+        for name in names:
+            jobqueue.enqueue(Path(name), "filter")
+        jobqueue.claim_next()
+        self.assertEqual([jobqueue.jobs_ahead(n) for n in names], [0, 1, 2, 3, 4])
+        self.assertEqual([jobqueue.has_jobs_ahead(n) for n in names], [False] + [True] * 4)
+        self.assertEqual(jobqueue.jobs_ahead(names[4], cap=2), 2)
+        jobqueue.finish(names[0])
+        jobqueue.park(names[1])                         # waiting for its upload
+        self.assertEqual(jobqueue.jobs_ahead(names[4]), 2)
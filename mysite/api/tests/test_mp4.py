@@ -0,0 +1,126 @@
+import struct, tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import mp4, uploads
+from api.mp4 import _box, _full
+
+from . import write_video
+
+
+def moov_of(stbl: list[bytes], handler: bytes = b"vide") -> bytes:
+    """A minimal moov payload: one track with *stbl*'s boxes."""
+    hdlr = _box("hdlr", b"\0" * 8 + handler + b"\0" * 12)
+    mdhd = _box("mdhd", b"\0" * 12 + struct.pack(">II", 1000, 0) + b"\0" * 4)
+    minf = _box("minf", _box("stbl", b"".join(stbl)))
+    return _box("trak", _box("mdia", mdhd + hdlr + minf))
+
+
+def decode(path: Path) -> list[np.ndarray]:
+    cap, frames = cv2.VideoCapture(str(path)), []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            return frames
+        frames.append(frame)
+
+
+def stsz(sizes: list[int]) -> bytes:
+    return _box("stsz", b"\0" * 4 + struct.pack(f">II{len(sizes)}I", 0, len(sizes), *sizes))
+
+
+class SampleTableTests(SimpleTestCase):
+    """mp4.sample_table must locate every frame of an upload still arriving."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+    def test_chunk_runs(self):
+        # chunks 1-2 hold 2 samples each, chunks 3 on 1 each
+        moov = moov_of([_full("stsc", ">III", [(1, 2, 1), (3, 1, 1)]),
+                        stsz([10, 20, 30, 40, 50, 60]),
+                        _full("stco", ">I", [(100,), (500,), (900,), (1000,)])])
+        self.assertEqual(mp4.sample_table(moov),
+                         ([100, 110, 500, 530, 900, 1000], [10, 20, 30, 40, 50, 60]))
+
+    def test_fixed_size_and_co64(self):
+        moov = moov_of([_full("stsc", ">III", [(1, 3, 1)]),
+                        _box("stsz", b"\0" * 4 + struct.pack(">II", 7, 5)),
+                        _full("co64", ">Q", [(1 << 33,), (1 << 34,)])])
+        base = [1 << 33, (1 << 33) + 7, (1 << 33) + 14, 1 << 34, (1 << 34) + 7]
+        self.assertEqual(mp4.sample_table(moov), (base, [7] * 5))
+
+    def test_no_video_track(self):
+        tables = [_full("stsc", ">III", [(1, 1, 1)]), stsz([1]), _full("stco", ">I", [(0,)])]
+        self.assertIsNone(mp4.sample_table(moov_of(tables, handler=b"soun")))
+        self.assertIsNone(mp4.sample_table(moov_of(tables[:2])))        # no chunk offsets
+
+    def test_writer_output(self):
+        path = write_video(self.dir / "in.mp4", 12)
+        offsets, sizes = mp4.sample_table(mp4.read_moov(path))
+        self.assertEqual(len(offsets), 12)
+        mdat = mp4.top_level(path)["mdat"]
+        self.assertTrue(all(mdat[0] <= o and o + s <= mdat[1] for o, s in zip(offsets, sizes)))
+
+    def test_layout_of_growing_upload(self):
+        data = write_video(self.dir / "src.mp4", 12).read_bytes()
+        fast = self.dir / "fast.mp4"
+        mp4.concat([self.dir / "src.mp4"], fast)             # moov first
+        job = self.dir / "job"
+        job.mkdir()
+        (job / uploads.VIDEO_FILE).write_bytes(data[:len(data) // 2])
+        self.assertIsNone(uploads.sample_layout(job))       # moov is at the end
+        data = fast.read_bytes()
+        moov_end = mp4.top_level(fast)["moov"][1]
+        (job / uploads.VIDEO_FILE).write_bytes(data[:moov_end])
+        layout = uploads.sample_layout(job)
+        self.assertEqual(len(layout), 12)
+        self.assertEqual(uploads.frames_on_disk(layout, moov_end), 0)
+        self.assertEqual(uploads.frames_on_disk(layout, layout[4]), 5)
+        self.assertEqual(uploads.frames_on_disk(layout, len(data)), 12)
+
+
+class ConcatTests(SimpleTestCase):
+    """mp4.concat joins the worker's segments without touching a frame."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.parts = [write_video(self.dir / f"seg{i}.mp4", n, seed=i)
+                      for i, n in enumerate((5, 7, 3))]
+
+    def samples(self, path: Path) -> list[bytes]:
+        data = path.read_bytes()
+        return [data[o:o + s] for o, s in zip(*mp4.sample_table(mp4.read_moov(path)))]
+
+    def test_join(self):
+        out = self.dir / "out.mp4"
+        self.assertEqual(mp4.concat(self.parts, out), 15)
+        self.assertEqual(self.samples(out), sum((self.samples(p) for p in self.parts), []))
+        boxes = mp4.top_level(out)
+        self.assertLess(boxes["moov"][0], boxes["mdat"][0])      # streams: moov first
+        joined = decode(out)
+        self.assertEqual(len(joined), 15)
+        for a, b in zip(joined, sum((decode(p) for p in self.parts), [])):
+            np.testing.assert_array_equal(a, b)
+        moov = mp4.read_moov(out)
+        mvhd = moov[slice(*mp4._child(moov, 0, len(moov), "mvhd"))]
+        self.assertAlmostEqual(struct.unpack_from(">I", mvhd, 16)[0] / mp4._timescale(mvhd), 15 / 25, 2)
+
+    def test_single_part(self):
+        out = self.dir / "out.mp4"
+        self.assertEqual(mp4.concat(self.parts[:1], out), 5)
+        self.assertEqual(self.samples(out), self.samples(self.parts[0]))
+
+    def test_rejects_non_video(self):
+        junk = self.dir / "junk.mp4"
+        junk.write_bytes(b"\0\0\0\x08free")
+        with self.assertRaises(ValueError):
+            mp4.concat([self.parts[0], junk], self.dir / "out.mp4")
+        self.assertFalse((self.dir / "out.mp4").exists())
@@ -0,0 +1,87 @@
+import os, time
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from api import jobqueue, jobutils, resultcache
+
+from . import sandbox
+
+INPUT = Path(__file__).resolve().parent.parent / "test_img" / "input.jpg"
+
+
+class ResultCacheTests(SimpleTestCase):
+    """Hits link the stored result; eviction drops the least recently used."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = sandbox(cls)
+
+    def setUp(self):
+        for p in resultcache.CACHE_DIR.glob("*") if resultcache.CACHE_DIR.is_dir() else ():
+            p.unlink()
+        self.dir = self.root / self._testMethodName
+        self.dir.mkdir()
+
+    def result(self, name: str, data: bytes) -> Path:
+        path = self.dir / f"{name}.jpg"
+        path.write_bytes(data)
+        os.utime(path, (1_000_000, 1_000_000))
+        return path
+
+    def test_keys(self):
+        k = resultcache.cache_key("ab" * 32, "filter", [1] * 9, 9, (1920, 1080))
+        self.assertEqual(k, resultcache.cache_key("ab" * 32, "filter", [1] * 9, 9, (1920, 1080)))
+        others = {resultcache.cache_key("ab" * 32, "grayscale"),
+                  resultcache.cache_key("cd" * 32, "filter", [1] * 9, 9, (1920, 1080)),
+                  resultcache.cache_key("ab" * 32, "filter", [1] * 9, 8, (1920, 1080)),
+                  resultcache.cache_key("ab" * 32, "filter", [1] * 9, 9, (640, 480)),
+                  resultcache.cache_key("ab" * 32, "filter", [1] * 9, 9)}
+        self.assertEqual(len(others), 5)
+        self.assertNotIn(k, others)
+
+    def test_store_and_fetch(self):
+        self.assertFalse(resultcache.fetch("k", self.dir / "miss.jpg"))
+        src = self.result("a", b"jpeg bytes")
+        resultcache.store("k", src)
+        dst = self.dir / "hit.jpg"
+        self.assertTrue(resultcache.fetch("k", dst))
+        self.assertEqual(dst.read_bytes(), b"jpeg bytes")
+        # a hit leaves every linked out.jpg as it was - its ETag too
+        self.assertEqual((src.stat().st_mtime, dst.stat().st_mtime), (1_000_000, 1_000_000))
+
+    def test_evicts_least_recently_used(self):
+        for i in range(3):
+            resultcache.store(f"k{i}", self.result(f"r{i}", b"%d" % i))
+            time.sleep(0.01)
+        self.assertTrue(resultcache.fetch("k0", self.dir / "hit.jpg"))   # k1 is now the oldest
+        self.assertEqual(resultcache.evict(2), 1)
+        hits = [resultcache.fetch(f"k{i}", self.dir / f"h{i}.jpg") for i in range(3)]
+        self.assertEqual(hits, [True, False, True])
+        self.assertFalse((resultcache.CACHE_DIR / "k1.used").exists())
+
+    def test_store_applies_limit(self):
+        with mock.patch.object(resultcache, "CACHE_LIMIT", 2):
+            for i in range(4):
+                resultcache.store(f"k{i}", self.result(f"r{i}", b"%d" % i))
+                time.sleep(0.01)
+        self.assertEqual(sorted(p.name for p in resultcache.CACHE_DIR.glob("*.jpg")),
+                         ["k2.jpg", "k3.jpg"])
+
+    def test_repeated_upload_is_a_hit(self):
+        upload = lambda: SimpleUploadedFile("in.jpg", INPUT.read_bytes(), "image/jpeg")
+        first = jobutils.enqueue_grayscale_job(upload())
+        self.assertFalse((first / "done.txt").exists())
+        (first / "out.jpg").write_bytes(b"result")          # what the worker does
+        resultcache.store((first / "cache_key.txt").read_text(), first / "out.jpg")
+        second = jobutils.enqueue_grayscale_job(upload())
+        self.assertEqual((second / "out.jpg").read_bytes(), b"result")
+        self.assertTrue((second / "done.txt").exists())
+        row = jobqueue._connect().execute("SELECT state FROM jobs WHERE job_id = ?",
+                                          (second.name,)).fetchone()
+        self.assertEqual(row[0], "done")
+        other = jobutils.enqueue_filter_job(upload(), [1] * 9, 9)
+        self.assertFalse((other / "done.txt").exists())
@@ -0,0 +1,52 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import jobutils
+from api.jobstatus import read_segments
+
+from . import import_worker, sandbox
+
+
+class SegmentTests(SimpleTestCase):
+    """Segments are served while the video job runs, then give way to out.mp4."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sandbox(cls)
+        import_worker()
+        import videoio
+        cls.videoio = videoio
+
+    def get(self, job, **params):
+        return self.client.get(f"/api/video/result/{job.name}/", params)
+
+    def test_segments_then_joined(self):
+        job = jobutils.create_job("job_vid")
+        with mock.patch.object(self.videoio, "SEGMENT_S", 1.0):
+            writer = self.videoio.SegmentWriter(job, 10, (32, 24))
+        self.assertEqual(self.get(job).json()["segments"], [])
+        for i in range(25):
+            writer.write(np.full((24, 32, 3), i * 8, np.uint8))
+        resp = self.get(job)
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual([s["frames"] for s in resp.json()["segments"]], [10, 10])
+        seg = self.get(job, segment=1)
+        self.assertEqual((seg.status_code, seg["Content-Type"]), (200, "video/mp4"))
+        seg.close()
+        self.assertEqual(self.get(job, segment=2).status_code, 404)     # still being written
+
+        writer.release()
+        writer.finish()
+        manifest = read_segments(job)
+        self.assertEqual((manifest["segments"], manifest["final"]), ([], "out.mp4"))
+        self.assertEqual(sorted(p.name for p in job.glob("*.mp4")), ["out.mp4"])
+        resp = self.get(job)
+        self.assertEqual(resp.status_code, 200)
+        resp.close()
+        for n in (0, 2, 9):
+            gone = self.get(job, segment=n)
+            self.assertEqual(gone.status_code, 410)
+            self.assertEqual(gone.json()["video_url"], f"/api/video/result/{job.name}/")
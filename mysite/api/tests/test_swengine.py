@@ -0,0 +1,74 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from api import swengine
+
+
+def reference_filter(rgb: np.ndarray, k, factor: int) -> np.ndarray:
+    """The FPGA's filter spelt out: int64 window sums wrapped to int32, floor-divided, saturated."""
+    k = np.asarray(k, np.int64).reshape(3, 3)
+    h, w = rgb.shape[:2]
+    pad = np.pad(rgb, ((1, 1), (1, 1), (0, 0)), mode="edge").astype(np.int64)
+    acc = np.zeros(rgb.shape, np.int64)
+    for dy in range(3):
+        for dx in range(3):
+            acc += k[dy, dx] * pad[dy:dy + h, dx:dx + w]
+    acc = (acc + 2**31) % 2**32 - 2**31                   # the 32-bit accumulator wraps
+    return np.clip(acc // factor, 0, 255).astype(np.uint8)
+
+
+class SoftwareEngineTests(SimpleTestCase):
+    """swengine must match the hardware bit for bit, whichever path it takes."""
+
+    def setUp(self):
+        self.rng = np.random.default_rng(1234)
+
+    def image(self, h: int = 37, w: int = 53) -> np.ndarray:
+        return self.rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+    def check(self, k, factor: int, img: np.ndarray | None = None) -> None:
+        img = self.image() if img is None else img
+        for threads in (1, 3):
+            np.testing.assert_array_equal(
+                swengine.filter3x3(img, k, factor, threads=threads),
+                reference_filter(img, k, factor), err_msg=f"k={list(k)} factor={factor}")
+
+    def test_fuzz_against_reference(self):
+        for i in range(300):
+            scale = (2, 8, 200, 2**16, 2**28)[i % 5]       # int16, int32 and wrapping sums
+            k = self.rng.integers(-scale, scale + 1, 9)
+            factor = int(self.rng.integers(1, 300))
+            self.check(k, factor, self.image(int(self.rng.integers(1, 80)),
+                                              int(self.rng.integers(1, 80))))
+
+    def test_separable_kernels(self):
+        for _ in range(50):
+            col, row = self.rng.integers(-4, 5, 3), self.rng.integers(-4, 5, 3)
+            k = np.outer(col, row).ravel()
+            if not k.any():
+                continue
+            self.assertIsNotNone(swengine.separable(k))
+            self.check(k, int(self.rng.integers(1, 40)))
+        self.assertIsNone(swengine.separable([0, -1, 0, -1, 5, -1, 0, -1, 0]))
+
+    def test_int16_and_int32_paths(self):
+        self.check([1, 2, 1, 2, 4, 2, 1, 2, 1], 16)              # int16, separable
+        self.check([0, -1, 0, -1, 5, -1, 0, -1, 0], 1)           # int16, direct
+        self.check([100, -50, 25, 7, 300, 7, 25, -50, 100], 3)   # 255 * 664 > int16
+        self.check([2**30, 1, -(2**30), 3, 2**29, 3, 1, 2**30, 1], 5)   # wraps int32
+
+    def test_negative_kernels(self):
+        self.check([-1] * 9, 1)
+        self.check([-2, -1, 0, -1, 1, 1, 0, 1, 2], 1)
+        self.check([-1, -2, -1, 0, 0, 0, 1, 2, 1], 4)
+
+    def test_factor_above_bound(self):
+        k = [1, 2, 1, 2, 4, 2, 1, 2, 1]
+        self.check(k, 255 * 16 + 1)
+        self.check([-1] * 9, 255 * 9 + 7)
+        self.assertFalse(swengine.filter3x3(self.image(), k, 10**6).any())
+
+    def test_grayscale(self):
+        img = self.image()
+        y = (img.astype(np.float32) @ np.array([0.299, 0.587, 0.114], np.float32)).astype(np.uint8)
+        np.testing.assert_array_equal(swengine.grayscale(img), np.repeat(y[..., None], 3, -1))
@@ -0,0 +1,30 @@
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from . import import_worker, sandbox
+
+
+class TiledRunTests(SimpleTestCase):
+    """worker.run_tiled must give exactly what a single full-frame pass does."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        sandbox(cls)                    # overlay loads are counted in the job index
+        cls.worker = import_worker()
+
+    def test_tiled_equals_full_frame(self):
+        w = self.worker
+        frame = np.random.default_rng(7).integers(0, 256, (181, 263, 3), dtype=np.uint8)
+        for kind in ("grayscale", "filter"):
+            w.load_overlay(kind)
+            cfg = (w.cfg_grayscale if kind == "grayscale" else
+                   lambda a: w.cfg_filter(a, 3, np.array([[1, -2, 1], [3, 5, 3], [1, -2, 1]])))
+            for order in ("rgb", "bgr"):
+                full, _ = w.run_accelerator(frame, cfg, order)
+                full = w.unpack(full, order)
+                with mock.patch.object(w, "MAX_W", 64), mock.patch.object(w, "MAX_H", 48):
+                    tiled, _ = w.run_tiled(frame, cfg, order, w._halo(kind))
+                np.testing.assert_array_equal(tiled, full, err_msg=f"{kind} {order}")
@@ -0,0 +1,112 @@
+import os
+
+from django.test import SimpleTestCase
+
+from api import jobqueue, mp4, uploads
+
+from . import import_worker, sandbox, write_video
+
+
+class UploadTests(SimpleTestCase):
+    """Chunked uploads: offsets, 409 on a wrong one, resuming and early queueing."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        root = sandbox(cls)
+        write_video(root / "src.mp4", 30)
+        cls.plain = (root / "src.mp4").read_bytes()          # moov last
+        mp4.concat([root / "src.mp4"], root / "fast.mp4")
+        cls.fast = (root / "fast.mp4").read_bytes()          # moov first
+        cls.jobs = root / "jobs"
+
+    def setUp(self):
+        jobqueue.forget()
+
+    def create(self, data: bytes) -> str:
+        resp = self.client.post("/api/upload/video/", {"kind": "grayscale", "size": len(data)})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.json()["offset"], 0)
+        return resp.json()["upload_url"]
+
+    def put(self, url: str, data: bytes, first: int, last: int):
+        return self.client.put(url, data[first:last + 1], content_type="application/octet-stream",
+                               headers={"Content-Range": f"bytes {first}-{last}/{len(data)}"})
+
+    def state(self, url: str) -> str | None:
+        row = jobqueue._connect().execute("SELECT state FROM jobs WHERE job_id = ?",
+                                          (url.strip("/").split("/")[-1],)).fetchone()
+        return row and row[0]
+
+    def test_offsets_and_conflicts(self):
+        data = self.plain
+        url = self.create(data)
+        resp = self.put(url, data, 0, 999)
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (200, 1000))
+        resp = self.put(url, data, 2000, 2999)                 # skipped a chunk
+        self.assertEqual((resp.status_code, resp.json()["offset"]), (409, 1000))
+        self.assertEqual(resp["Upload-Offset"], "1000")
+        resp = self.put(url, data, 0, 999)                     # sent twice
+        self.assertEqual(resp.status_code, 409)
+        resp = self.client.get(url)
+        self.assertEqual((resp.json()["offset"], resp["Upload-Offset"]), (1000, "1000"))
+        self.assertEqual(self.client.post(url + "complete/").status_code, 409)
+        self.assertIsNone(self.state(url))                     # moov last: nothing to decode yet
+
+        resp = self.put(url, data, 1000, len(data) - 1)
+        self.assertEqual((resp.status_code, resp.json()["queued"]), (200, True))   # moov arrived
+        resp = self.client.post(url + "complete/")
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(self.state(url), "pending")
+        self.assertEqual(self.put(url, data, 0, 9).status_code, 400)   # already complete
+
+    def test_bad_ranges(self):
+        url = self.create(self.plain)
+        for header in ("", "bytes 0-9", f"bytes 0-9/{len(self.plain) + 1}", "bytes 9-0/*"):
+            resp = self.client.put(url, self.plain[:10], content_type="application/octet-stream",
+                                   headers={"Content-Range": header})
+            self.assertEqual(resp.status_code, 400, header)
+        resp = self.client.put(url, self.plain[:10], content_type="application/octet-stream",
+                               headers={"Content-Range": f"bytes 0-19/{len(self.plain)}"})
+        self.assertEqual(resp.status_code, 400)                # body shorter than the range
+        self.assertEqual(self.client.get("/api/upload/job_vid_missing/").status_code, 404)
+
+    def test_faststart_queues_early(self):
+        data = self.fast
+        url = self.create(data)
+        moov_end = mp4.top_level(self.jobs.parent / "fast.mp4")["moov"][1]
+        resp = self.put(url, data, 0, moov_end - 1)
+        self.assertEqual((resp.status_code, resp.json()["queued"]), (200, True))
+        self.assertEqual(self.state(url), "pending")
+        job = self.jobs / url.strip("/").split("/")[-1]
+        self.assertTrue(uploads.receiving(job))
+        self.put(url, data, moov_end, len(data) - 1)
+        self.assertEqual(self.client.post(url + "complete/").status_code, 202)
+        self.assertFalse(uploads.receiving(job))
+
+    def test_stalled_upload_is_parked(self):
+        import_worker()
+        from videoio import park_upload
+        data = self.fast
+        url = self.create(data)
+        moov_end = mp4.top_level(self.jobs.parent / "fast.mp4")["moov"][1]
+        self.put(url, data, 0, moov_end - 1)
+        job = self.jobs / url.strip("/").split("/")[-1]
+        seq = jobqueue.enqueue(job, "grayscale_video")          # queued already - a no-op
+        self.assertEqual(jobqueue.claim_next()[0]["job_id"], job.name)
+        park_upload(job)                                       # the worker gave up waiting
+        self.assertEqual(self.state(url), "waiting")
+        resp = self.put(url, data, moov_end, len(data) - 1)
+        self.assertEqual((resp.json()["queued"], self.state(url)), (False, "waiting"))
+        self.assertEqual(self.client.post(url + "complete/").status_code, 202)
+        self.assertEqual(self.state(url), "pending")
+        self.assertEqual(jobqueue.enqueue(job, "grayscale_video"), seq)   # kept its place
+
+    def test_abandoned_uploads_expire(self):
+        urls = [self.create(self.plain) for _ in range(3)]
+        jobs = [self.jobs / u.strip("/").split("/")[-1] for u in urls]
+        self.put(urls[1], self.plain, 0, len(self.plain) - 1)      # queued
+        for job in jobs[1:]:
+            os.utime(job / uploads.VIDEO_FILE, (0, 0))
+        self.assertEqual(uploads.expire(self.jobs), [jobs[2].name])
+        self.assertEqual([j.is_dir() for j in jobs], [True, True, False])
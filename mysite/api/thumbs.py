@@ -0,0 +1,40 @@
+# mysite/api/thumbs.py
+"""
+History thumbnails.
+
+The worker writes ``thumb.jpg`` next to ``out.jpg`` when a job finishes, so
+the history page never has to decode full-size results.  Jobs that predate
+this (or finished from the result cache) get theirs lazily on first request.
+Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import uuid
+from pathlib import Path
+
+from PIL import Image
+
+THUMB_FILE = "thumb.jpg"
+THUMB_SIZE = (160, 160)
+
+
+def make_thumbnail(job: Path) -> Path | None:
+    """(Re)write *job*/thumb.jpg from out.jpg; None while there is no result."""
+    src, dst = job / "out.jpg", job / THUMB_FILE
+    try:
+        with Image.open(src) as im:
+            im.draft("RGB", THUMB_SIZE)     # JPEG: decode at 1/2..1/8 scale
+            im = im.convert("RGB")
+            im.thumbnail(THUMB_SIZE)
+            tmp = job / f".{uuid.uuid4().hex[:8]}.thumb"
+            im.save(tmp, "JPEG", quality=80)
+    except FileNotFoundError:
+        return None
+    tmp.replace(dst)
+    return dst
+
+
+def thumbnail(job: Path) -> Path | None:
+    """Path of *job*'s thumbnail, creating it if needed."""
+    dst = job / THUMB_FILE
+    return dst if dst.exists() else make_thumbnail(job)
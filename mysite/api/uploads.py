@@ -0,0 +1,144 @@
+# mysite/api/uploads.py
+"""
+Resumable chunked video uploads, written straight into the job dir.
+
+The client declares the total size, PUTs byte ranges at the current offset
+- the size of ``in.mp4`` on disk, so a dropped connection resumes where it
+stopped - and then completes the upload.  ``upload.json`` holds the upload's
+state next to the other job files.
+
+An MP4 whose ``moov`` box comes before the media data ("faststart") is
+handed to the worker as soon as that box is in: its sample table says where
+every frame lives, so ``frames_on_disk`` can tell the decoder how far it may
+read into the growing file.  Other files are queued once complete.  A job
+whose decoder keeps waiting for bytes gives the worker back (``Stalled``):
+it is "parked" and runs again once the upload is complete.
+Django-free so the worker can import it too.
+"""
+
+from __future__ import annotations
+import bisect, fcntl, json, shutil, struct, time
+from pathlib import Path
+from typing import Iterable
+
+from . import mp4
+
+UPLOAD_FILE = "upload.json"
+VIDEO_FILE  = "in.mp4"
+CHUNK_SIZE  = 8 << 20               # suggested PUT size
+EXPIRE_S    = 24 * 3600             # unfinished uploads idle this long are dropped
+
+
+class Stalled(RuntimeError):
+    """The worker waited too long for an upload still in progress."""
+
+
+class OffsetMismatch(ValueError):
+    """A chunk did not start at the current end of the upload."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"upload is at byte {offset}")
+        self.offset = offset
+
+
+# --------------------------------------------------------------------------- #
+# Upload state
+# --------------------------------------------------------------------------- #
+def _write_state(job: Path, data: dict) -> None:
+    tmp = (job / UPLOAD_FILE).with_suffix(".tmp")
+    tmp.write_text(json.dumps(data, indent=2))
+    tmp.rename(job / UPLOAD_FILE)
+
+def start(job: Path, kind: str, size: int) -> None:
+    (job / VIDEO_FILE).touch()
+    _write_state(job, {"kind": kind, "size": size, "complete": False,
+                       "queued": False, "created": time.time()})
+
+def state(job: Path) -> dict | None:
+    """``upload.json`` of *job*, or None for jobs uploaded in one request."""
+    try:
+        return json.loads((job / UPLOAD_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+def update(job: Path, **fields) -> dict:
+    # the views and the worker both update it - read-modify-write under a lock
+    with (job / ".upload.lock").open("w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        st = state(job) or {}
+        st.update(fields)
+        _write_state(job, st)
+    return st
+
+def expire(jobs_dir: Path, max_age: float = EXPIRE_S) -> list[str]:
+    """
+    Delete the job dirs of uploads abandoned before they were queued (or
+    after the worker parked them); returns their names.  The worker runs
+    this now and then, not every upload request.
+    """
+    cutoff, gone = time.time() - max_age, []
+    for job in jobs_dir.glob("job_vid_*"):
+        st = state(job)
+        try:
+            stale = st is not None and not st["queued"] and (job / VIDEO_FILE).stat().st_mtime < cutoff
+        except FileNotFoundError:
+            continue
+        if stale:
+            shutil.rmtree(job, ignore_errors=True)
+            gone.append(job.name)
+    return gone
+
+def receiving(job: Path) -> bool:
+    """True while bytes of *job*'s input are still to come."""
+    st = state(job)
+    return st is not None and not st["complete"]
+
+def offset(job: Path) -> int:
+    try:
+        return (job / VIDEO_FILE).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+def append(job: Path, start: int, size: int, chunks: Iterable[bytes]) -> int:
+    """
+    Write *chunks* at byte *start*, which must be the current offset; the
+    upload may not grow past *size*.  Whatever arrived is kept even if the
+    stream breaks off.  Returns the new offset.
+    """
+    with (job / VIDEO_FILE).open("ab") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)           # one writer per upload
+        pos = f.seek(0, 2)
+        if pos != start:
+            raise OffsetMismatch(pos)
+        for chunk in chunks:
+            if pos + len(chunk) > size:
+                raise ValueError(f"upload exceeds its declared {size} bytes")
+            f.write(chunk)
+            pos += len(chunk)
+        return pos
+
+
+# --------------------------------------------------------------------------- #
+# MP4 layout
+# --------------------------------------------------------------------------- #
+def sample_layout(job: Path) -> list[int] | None:
+    """
+    Per-frame byte ends of *job*'s input when its ``moov`` box is already on
+    disk, None when decoding has to wait for the whole file.
+    """
+    try:
+        moov = mp4.read_moov(job / VIDEO_FILE)
+        table = moov and mp4.sample_table(moov)
+    except (OSError, struct.error):
+        return None
+    if not table:
+        return None
+    ends = [o + s for o, s in zip(*table)]
+    # a frame needs every earlier sample too
+    for j in range(1, len(ends)):
+        ends[j] = max(ends[j], ends[j - 1])
+    return ends
+
+def frames_on_disk(layout: list[int], size: int) -> int:
+    """How many frames of *layout* are entirely within the first *size* bytes."""
+    return bisect.bisect_right(layout, size)
@@ -1,10 +1,13 @@
 # mysite/api/urls.py
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     GrayscaleAPIView, FilterAPIView,
-    VideoGrayscaleAPIView, VideoFilterAPIView,
-    VideoResultAPIView, ImageResultAPIView,
-    HistoryAPIView, TestAPIView
+    VideoGrayscaleAPIView, VideoFilterAPIView, BatchGrayscaleAPIView, BatchFilterAPIView,
+    UploadCreateAPIView, UploadAPIView, UploadCompleteAPIView,
+    VideoResultAPIView, ImageResultAPIView, ThumbnailAPIView, BatchResultAPIView, BatchZipAPIView,
+    HistoryAPIView, StatsAPIView, TestAPIView, events_view, metrics_view
 )
 
 urlpatterns = [
@@ -15,12 +18,34 @@ urlpatterns = [
     # Video endpoints
     path("video/grayscale/",           VideoGrayscaleAPIView.as_view(), name="api_video_grayscale"),
     path("video/filter/",              VideoFilterAPIView.as_view(),    name="api_video_filter"),
+
+    # Batch endpoints - many images, one job
+    path("batch/grayscale/",           BatchGrayscaleAPIView.as_view(), name="api_batch_grayscale"),
+    path("batch/filter/",              BatchFilterAPIView.as_view(),    name="api_batch_filter"),
+
+    # Chunked, resumable video upload
+    path("upload/video/",                   UploadCreateAPIView.as_view(),   name="api_upload_create"),
+    path("upload/<str:job_id>/",            UploadAPIView.as_view(),         name="api_upload"),
+    path("upload/<str:job_id>/complete/",   UploadCompleteAPIView.as_view(), name="api_upload_complete"),
     
     # Result endpoints
     path("video/result/<str:job_id>/", VideoResultAPIView.as_view(),    name="api_video_result"),
     path("image/result/<str:job_id>/", ImageResultAPIView.as_view(),    name="api_image_result"),
+    path("image/thumb/<str:job_id>/",  ThumbnailAPIView.as_view(),      name="api_image_thumb"),
+    path("batch/result/<str:job_id>/", BatchResultAPIView.as_view(),    name="api_batch_result"),
+    path("batch/result/<str:job_id>/zip/", BatchZipAPIView.as_view(),   name="api_batch_zip"),
+
+    # Async (ASGI) variants - same fields and responses
+    path("async/grayscale/",       async_views.grayscale,       name="api_async_grayscale"),
+    path("async/filter/",          async_views.filter_image,    name="api_async_filter"),
+    path("async/video/grayscale/", async_views.video_grayscale, name="api_async_video_grayscale"),
+    path("async/video/filter/",    async_views.video_filter,    name="api_async_video_filter"),
+    path("async/events/",          async_views.events,          name="api_async_events"),
 
     # Misc
     path("history/", HistoryAPIView.as_view(), name="api_history"),
+    path("stats/",   StatsAPIView.as_view(),   name="api_stats"),
+    path("metrics/", metrics_view,             name="api_metrics"),
+    path("events/",  async_views.events if settings.ASGI else events_view, name="api_events"),
     path("test/",    TestAPIView.as_view()),
 ]
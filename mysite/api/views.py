@@ -1,10 +1,11 @@
 # mysite/api/views.py
 from __future__ import annotations
-import base64, shutil
+import base64, json, re, shutil, time
 from pathlib import Path
 from typing import Callable
 
-from django.http import FileResponse, Http404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
@@ -12,11 +13,15 @@ from rest_framework import status
 
 from .jobutils import (
     enqueue_grayscale_job, enqueue_filter_job,
-    enqueue_video_grayscale_job, enqueue_video_filter_job,
-    wait_for_file, run_scipy_gray, run_scipy_filter,
-    read_time, list_history, trim_image_history, trim_video_history,
-    JOBS_ROOT, MAX_VIDEO_BYTES
+    enqueue_video_grayscale_job, enqueue_video_filter_job, enqueue_batch_job,
+    create_video_upload, receive_upload_chunk, complete_upload,
+    wait_for_done, run_sw_gray, run_sw_filter,
+    read_time, list_history, trim_image_history, trim_video_history, trim_batch_history,
+    JOBS_ROOT, MAX_VIDEO_BYTES, MAX_BATCH_IMAGES, MAX_BATCH_BYTES, HISTORY_PAGE_SIZE, SKIP_MODES
 )
+from . import jobqueue, metrics, notify, thumbs, uploads
+from .fileserve import serve_file
+from .jobstatus import read_batch, read_segments, read_status
 
 OK_3X3 = lambda lst: len(lst) == 9
 QUEUED_TIMEOUT = 10  # seconds to wait before giving 202
@@ -33,28 +38,58 @@ class TestAPIView(APIView):
 # --------------------------------------------------------------------------- #
 # Helper - return a standard queued response
 # --------------------------------------------------------------------------- #
-def _queued(job, msg: str = "Job queued - please check progress in the History tab.") -> Response:
-    return Response(
-        {
-            "job_id": job.name,
-            "queued": True,
-            "message": msg
-        },
-        status=status.HTTP_202_ACCEPTED,
-    )
+QUEUED_MSG = "Job queued - please check progress in the History tab."
+SLOW_MSG   = "Job is taking longer than expected - please check progress in the History tab."
+
+def _queued_payload(job, msg: str = QUEUED_MSG) -> dict:
+    # an estimate taken once: affinity scheduling may reorder the queue, and
+    # the count stops at AHEAD_CAP - the History tab has the live status
+    ahead = jobqueue.jobs_ahead(job.name)
+    return {
+        "job_id": job.name,
+        "queued": True,
+        "queue_position": ahead + 1,
+        "jobs_ahead": ahead,
+        "jobs_ahead_is_estimate": True,
+        "message": msg
+    }
+
+def _queued(job, msg: str = QUEUED_MSG) -> Response:
+    return Response(_queued_payload(job, msg), status=status.HTTP_202_ACCEPTED)
+
+
+# --------------------------------------------------------------------------- #
+# Helper - parse and validate the 3×3 filter fields
+# --------------------------------------------------------------------------- #
+def _filter_params(data) -> tuple[list[int], int, str | None]:
+    """(coeffs, factor, error message or None) from a form's filter/factor."""
+    raw = data.get("filter", "").strip()
+    coeffs = list(map(int, raw.split())) if raw else []
+    factor = int(data.get("factor", 1) or 1)
+    if not OK_3X3(coeffs):
+        return coeffs, factor, "Kernel must have 9 integers"
+    if factor <= 0:
+        return coeffs, factor, "Factor must be positive"
+    return coeffs, factor, None
+
+def _skip_param(data) -> tuple[str | None, str | None]:
+    """(repeated-frame skipping mode or None, error message or None) of a video form."""
+    skip = (data.get("skip_frames") or "").strip().lower()
+    if skip in ("", "off", "0", "false"):
+        return None, None
+    if skip not in SKIP_MODES:
+        return None, f"skip_frames must be one of: off, {', '.join(SKIP_MODES)}"
+    return skip, None
+
+def _wants_software(data) -> bool:
+    """The form asked for the software reference ("use_scipy" is its old name)."""
+    return "use_software" in data or "use_scipy" in data
 
 # --------------------------------------------------------------------------- #
 # Helper - check is there any unfinished job created before
 # --------------------------------------------------------------------------- #
 def _has_pending_before(me: Path) -> bool:
-    for p in JOBS_ROOT.iterdir():
-        if p == me:
-            continue
-        if (p / "done.txt").exists() or (p / "error.txt").exists():
-            continue           # finished jobs don't count
-        if p.stat().st_mtime < me.stat().st_mtime:
-            return True
-    return False
+    return jobqueue.has_jobs_ahead(me.name)
 
 
 # --------------------------------------------------------------------------- #
@@ -63,24 +98,37 @@ def _has_pending_before(me: Path) -> bool:
 def _handle_image_request(enqueue_func: Callable[[], Path], do_software: Callable[[], tuple[str, str]] | None = None) -> Response:
     job = enqueue_func()
 
+    # Result cache hit - finished without touching the worker
+    if (job / "done.txt").exists():
+        return _image_result(job, do_software)
+
     # If another job is already running/queued, respond immediately
     if _has_pending_before(job):
         return _queued(job)
 
     # Otherwise wait a bit - ideal case for single-image workflows
     try:
-        wait_for_file(job / "done.txt", timeout=QUEUED_TIMEOUT)
+        ok = wait_for_done(job, timeout=QUEUED_TIMEOUT)
     except TimeoutError:
-        return _queued(job, "Job is taking longer than expected - please check progress in the History tab.")
+        return _queued(job, SLOW_MSG)
+    if not ok:
+        return Response({"job_id": job.name, "error": (job / "error.txt").read_text()},
+                        status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return _image_result(job, do_software)
 
-    # Finished quickly - return hardware (and optional software) image
+
+def _image_payload(job: Path, do_software: Callable[[], tuple[str, str]] | None) -> dict:
+    """Finished quickly - hardware (and optional software) image."""
     hw_b64 = base64.b64encode((job / "out.jpg").read_bytes()).decode()
     resp   = {"hw_image": hw_b64, "hw_time": read_time(job)}
     if do_software is not None:
         sw_b64, sw_time = do_software()
         resp.update({"sw_image": sw_b64, "sw_time": f"{sw_time*1e3:.2f} ms"})
     trim_image_history()
-    return Response(resp)
+    return resp
+
+def _image_result(job: Path, do_software: Callable[[], tuple[str, str]] | None) -> Response:
+    return Response(_image_payload(job, do_software))
 
 
 # --------------------------------------------------------------------------- #
@@ -96,7 +144,7 @@ class GrayscaleAPIView(APIView):
 
         return _handle_image_request(
             enqueue_func=lambda: enqueue_grayscale_job(img),
-            do_software=(lambda: run_scipy_gray(img)) if "use_scipy" in request.POST else None,
+            do_software=(lambda: run_sw_gray(img)) if _wants_software(request.POST) else None,
         )
 
 
@@ -108,21 +156,17 @@ class FilterAPIView(APIView):
 
     def post(self, request):
         img = request.FILES.get("image")
-        raw = request.data.get("filter", "").strip()
-        coeffs = list(map(int, raw.split())) if raw else []
-        factor = int(request.data.get("factor", 1) or 1)
+        coeffs, factor, err = _filter_params(request.data)
 
         # Validate
         if not img:
             return Response({"error": "No image"}, status=400)
-        if not OK_3X3(coeffs):
-            return Response({"error": "Kernel must have 9 integers"}, status=400)
-        if factor <= 0:
-            return Response({"error": "Factor must be positive"}, status=400)
+        if err:
+            return Response({"error": err}, status=400)
 
         return _handle_image_request(
             enqueue_func=lambda: enqueue_filter_job(img, coeffs, factor),
-            do_software=(lambda: run_scipy_filter(img, coeffs, factor)) if "use_scipy" in request.POST else None,
+            do_software=(lambda: run_sw_filter(img, coeffs, factor)) if _wants_software(request.POST) else None,
         )
 
 
@@ -134,12 +178,15 @@ class VideoGrayscaleAPIView(APIView):
 
     def post(self, request):
         vid = request.FILES.get("video")
+        skip, err = _skip_param(request.data)
         if not vid:
             return Response({"error": "No video"}, status=400)
         if vid.size > MAX_VIDEO_BYTES:
             return Response({"error": "Video > 1 GiB - please compress first"}, 413)
+        if err:
+            return Response({"error": err}, status=400)
 
-        job = enqueue_video_grayscale_job(vid)
+        job = enqueue_video_grayscale_job(vid, skip)
         trim_video_history()
         return _queued(job)  # always queue - videos are long
 
@@ -152,24 +199,154 @@ class VideoFilterAPIView(APIView):
 
     def post(self, request):
         vid = request.FILES.get("video")
-        raw = request.data.get("filter", "").strip()
-        coeffs = list(map(int, raw.split())) if raw else []
-        factor = int(request.data.get("factor", 1) or 1)
+        coeffs, factor, err = _filter_params(request.data)
+        skip, skip_err = _skip_param(request.data)
 
         if not vid:
             return Response({"error": "No video"}, status=400)
         if vid.size > MAX_VIDEO_BYTES:
             return Response({"error": "Video > 1 GiB - please compress first"}, 413)
-        if not OK_3X3(coeffs):
-            return Response({"error": "Kernel must have 9 integers"}, status=400)
-        if factor <= 0:
-            return Response({"error": "Factor must be positive"}, status=400)
+        if err or skip_err:
+            return Response({"error": err or skip_err}, status=400)
 
-        job = enqueue_video_filter_job(vid, coeffs, factor)
+        job = enqueue_video_filter_job(vid, coeffs, factor, skip)
         trim_video_history()
         return _queued(job)  # always queue - videos are long
 
 
+# --------------------------------------------------------------------------- #
+# Batch of images → one job, one overlay load
+#   POST /api/batch/grayscale/           images (repeated) and / or zip
+#   POST /api/batch/filter/              same + filter, factor
+# --------------------------------------------------------------------------- #
+def _handle_batch_request(request, kind: str, coeffs=None, factor: int = 1) -> Response:
+    files = request.FILES.getlist("images")
+    archive = request.FILES.get("zip")
+    if not files and archive is None:
+        return Response({"error": "No images - send images and / or a zip"}, status=400)
+    if len(files) > MAX_BATCH_IMAGES:
+        return Response({"error": f"More than {MAX_BATCH_IMAGES} images"}, 413)
+    if sum(f.size for f in files) + (archive.size if archive is not None else 0) > MAX_BATCH_BYTES:
+        return Response({"error": "Batch > 1 GiB - please split it"}, 413)
+    try:
+        job = enqueue_batch_job(kind, files, archive, coeffs, factor)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    trim_batch_history()
+    payload = _queued_payload(job)
+    payload.update(images=len(read_batch(job)["images"]),
+                   result_url=f"/api/batch/result/{job.name}/")
+    return Response(payload, status=status.HTTP_202_ACCEPTED)  # always queue, like videos
+
+class BatchGrayscaleAPIView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request):
+        return _handle_batch_request(request, "grayscale_batch")
+
+class BatchFilterAPIView(APIView):
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request):
+        coeffs, factor, err = _filter_params(request.data)
+        if err:
+            return Response({"error": err}, status=400)
+        return _handle_batch_request(request, "filter_batch", coeffs, factor)
+
+
+# --------------------------------------------------------------------------- #
+# Video → chunked, resumable upload
+#   POST /api/upload/video/                  kind, size (+ filter, factor) → 201
+#   GET  /api/upload/<job_id>/               offset to resume from
+#   PUT  /api/upload/<job_id>/               Content-Range: bytes a-b/size
+#   POST /api/upload/<job_id>/complete/      → 202 like the one-shot endpoints
+# --------------------------------------------------------------------------- #
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+def _upload_job(job_id: str) -> tuple[Path, dict]:
+    job = JOBS_ROOT / job_id
+    st = uploads.state(job) if job.is_dir() else None
+    if st is None:
+        raise Http404
+    return job, st
+
+def _offset_conflict(exc: uploads.OffsetMismatch) -> Response:
+    return Response({"error": str(exc), "offset": exc.offset},
+                    status=status.HTTP_409_CONFLICT, headers={"Upload-Offset": str(exc.offset)})
+
+class UploadCreateAPIView(APIView):
+    def post(self, request):
+        kind = request.data.get("kind")
+        if kind not in ("grayscale", "filter"):
+            return Response({"error": "kind must be grayscale or filter"}, status=400)
+        try:
+            size = int(request.data.get("size", 0))
+        except (TypeError, ValueError):
+            size = 0
+        if size <= 0:
+            return Response({"error": "size must be a positive byte count"}, status=400)
+        if size > MAX_VIDEO_BYTES:
+            return Response({"error": "Video > 1 GiB - please compress first"}, 413)
+        coeffs, factor = None, 1
+        if kind == "filter":
+            coeffs, factor, err = _filter_params(request.data)
+            if err:
+                return Response({"error": err}, status=400)
+        skip, err = _skip_param(request.data)
+        if err:
+            return Response({"error": err}, status=400)
+
+        job = create_video_upload(f"{kind}_video", size, coeffs, factor, skip)
+        url = f"/api/upload/{job.name}/"
+        return Response({"job_id": job.name, "upload_url": url, "offset": 0, "size": size,
+                         "chunk_size": uploads.CHUNK_SIZE},
+                        status=status.HTTP_201_CREATED, headers={"Location": url})
+
+class UploadAPIView(APIView):
+    """
+    Bytes go to ``in.mp4`` as they are read, without spooling.  A chunk must
+    start at the current offset (409 and the offset otherwise); after a
+    dropped connection, GET the offset and resume from there.
+    """
+    def get(self, _, job_id: str):
+        job, st = _upload_job(job_id)
+        offset = uploads.offset(job)
+        return Response({"offset": offset, "size": st["size"], "complete": st["complete"],
+                         "queued": st["queued"]}, headers={"Upload-Offset": str(offset)})
+
+    def put(self, request, job_id: str):
+        job, st = _upload_job(job_id)
+        m = CONTENT_RANGE.fullmatch(request.headers.get("Content-Range", ""))
+        if not m:
+            return Response({"error": "Content-Range: bytes <first>-<last>/<size> required"},
+                            status=400)
+        first, last, total = map(int, m.groups())
+        if total != st["size"] or last < first or \
+                int(request.headers.get("Content-Length") or 0) != last - first + 1:
+            return Response({"error": "Content-Range does not match the upload or the body"},
+                            status=400)
+        stream = request.stream
+        chunks = iter(lambda: stream.read(1 << 20), b"") if stream is not None else ()
+        try:
+            st = receive_upload_chunk(job, first, chunks)
+        except uploads.OffsetMismatch as exc:
+            return _offset_conflict(exc)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=400)
+        return Response({"offset": st["offset"], "size": st["size"], "queued": st["queued"]},
+                        headers={"Upload-Offset": str(st["offset"])})
+
+class UploadCompleteAPIView(APIView):
+    def post(self, _, job_id: str):
+        job, _st = _upload_job(job_id)
+        try:
+            complete_upload(job)
+        except uploads.OffsetMismatch as exc:
+            return _offset_conflict(exc)
+        trim_video_history()
+        return _queued(job)
+
+
 # --------------------------------------------------------------------------- #
 # Results download
 # --------------------------------------------------------------------------- #
@@ -177,32 +354,166 @@ class ImageResultAPIView(APIView):
     """
     Download finished image (out.jpg) for a job.
     """
-    def get(self, _, job_id: str):
+    def get(self, request, job_id: str):
         img_path: Path = JOBS_ROOT / job_id / "out.jpg"
         if not img_path.exists():
             raise Http404
-        return FileResponse(open(img_path, "rb"),
-                            content_type="image/jpeg",
-                            as_attachment=True,
-                            filename="result.jpg")
+        return serve_file(request, img_path, "image/jpeg", "result.jpg")
+
+class ThumbnailAPIView(APIView):
+    """
+    Small preview of a finished job for the history table.  Results never
+    change once written, so the browser may keep it.
+    """
+    def get(self, request, job_id: str):
+        thumb = thumbs.thumbnail(JOBS_ROOT / job_id) if (JOBS_ROOT / job_id).is_dir() else None
+        if thumb is None:
+            raise Http404
+        resp = serve_file(request, thumb, "image/jpeg", as_attachment=False)
+        resp["Cache-Control"] = "private, max-age=86400"
+        return resp
 
 class VideoResultAPIView(APIView):
-    def get(self, _, job_id: str):
-        video_path = JOBS_ROOT / job_id / "out.mp4"
-        if not video_path.exists():
+    """
+    Download the finished video (out.mp4) - byte ranges included, so it can
+    be streamed and seeked in a <video> element.  While the job is still running
+    the segments written so far are available: this URL answers 202 with
+    their list, and ``?segment=N`` downloads one - 410 once they have been
+    joined into out.mp4 and deleted.
+    """
+    def get(self, request, job_id: str):
+        job = JOBS_ROOT / job_id
+        seg = request.query_params.get("segment")
+        if seg is not None:
+            return self._segment(request, job, seg)
+        video_path = job / "out.mp4"
+        if video_path.exists():
+            return serve_file(request, video_path, "video/mp4", "result.mp4")
+        manifest = read_segments(job) if job.is_dir() else None
+        if manifest is None:
+            raise Http404
+        for i, s in enumerate(manifest["segments"]):
+            s["url"] = f"/api/video/result/{job_id}/?segment={i}"
+        return Response({"job_id": job_id, **manifest}, status=status.HTTP_202_ACCEPTED)
+
+    @staticmethod
+    def _gone(job: Path) -> Response:
+        return Response({"error": "segments were joined into the result video",
+                         "video_url": f"/api/video/result/{job.name}/"}, status=status.HTTP_410_GONE)
+
+    @staticmethod
+    def _segment(request, job: Path, seg: str) -> HttpResponse:
+        manifest = read_segments(job) if job.is_dir() else None
+        if manifest is not None and "final" in manifest:
+            return VideoResultAPIView._gone(job)
+        try:
+            n = int(seg)
+            entry = manifest["segments"][n] if n >= 0 else None   # listed once complete
+        except (TypeError, ValueError, IndexError):
+            raise Http404
+        if entry is None:
             raise Http404
-        return FileResponse(open(video_path, "rb"),
-                            content_type="video/mp4",
-                            as_attachment=True,
-                            filename="result.mp4")
+        if not (job / entry["file"]).exists():
+            return VideoResultAPIView._gone(job)    # being joined right now
+        return serve_file(request, job / entry["file"], "video/mp4", f"result_{n:05d}.mp4")
+
+
+class BatchResultAPIView(APIView):
+    """
+    Per-image results of a batch job - upload name, download URL and
+    accelerator time, or the error of an image that could not be decoded.
+    Answers 202 with the images finished so far while the job runs, 200 once
+    it ended; ``?image=N`` downloads one result.
+    """
+    def get(self, request, job_id: str):
+        job = JOBS_ROOT / job_id
+        manifest = read_batch(job) if job.is_dir() else None
+        if manifest is None:
+            raise Http404
+        images = manifest["images"]
+        n = request.query_params.get("image")
+        if n is not None:
+            try:
+                entry = images[int(n)] if int(n) >= 0 else {}
+            except (ValueError, IndexError):
+                raise Http404
+            if "output" not in entry:
+                raise Http404
+            return serve_file(request, job / entry["output"], "image/jpeg",
+                              f"{Path(entry['name']).stem}.jpg")
+
+        results = []
+        for i, im in enumerate(images):
+            r = {"name": im["name"]}
+            if "output" in im:
+                r.update(url=f"/api/batch/result/{job_id}/?image={i}", hw_time=im["hw_time"])
+            if "error" in im:
+                r["error"] = im["error"]
+            results.append(r)
+        body = {"job_id": job_id, "status": read_status(job).get("stage", "queued"),
+                "hw_time": read_time(job), "images": results}
+        ended = (job / "done.txt").exists() or (job / "error.txt").exists()
+        if (job / "out.zip").exists():
+            body["zip_url"] = f"/api/batch/result/{job_id}/zip/"
+        if (job / "error.txt").exists():
+            body["error"] = (job / "error.txt").read_text()
+        return Response(body, status=status.HTTP_200_OK if ended else status.HTTP_202_ACCEPTED)
+
+class BatchZipAPIView(APIView):
+    """Download every result of a finished batch job as one zip."""
+    def get(self, request, job_id: str):
+        zip_path: Path = JOBS_ROOT / job_id / "out.zip"
+        if not zip_path.exists():
+            raise Http404
+        return serve_file(request, zip_path, "application/zip", "results.zip")
+
+
+# --------------------------------------------------------------------------- #
+# Worker scheduler statistics
+# --------------------------------------------------------------------------- #
+class StatsAPIView(APIView):
+    def get(self, _):
+        return Response(jobqueue.scheduler_stats())
+
+
+@require_GET
+def metrics_view(_):
+    """
+    ``GET /api/metrics/`` - queue depth, overlay reloads, jobs per kind and
+    the per-stage timing and fps histograms in the Prometheus text format.
+    """
+    resp = HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+    resp["Cache-Control"] = "no-cache"
+    return resp
 
 
 # --------------------------------------------------------------------------- #
 # Job history
 # --------------------------------------------------------------------------- #
 class HistoryAPIView(APIView):
-    def get(self, _):
-        return Response(list_history())
+    """
+    ``GET ?cursor=<seq>&limit=<n>`` - one page of jobs, newest first, with
+    the cursor of the next page.  The ETag is the history version, so a poll
+    with a matching ``If-None-Match`` gets an empty 304.
+    """
+    def get(self, request):
+        try:
+            cursor = int(request.query_params["cursor"]) if "cursor" in request.query_params else None
+            limit = min(max(int(request.query_params.get("limit", HISTORY_PAGE_SIZE)), 1), 500)
+        except ValueError:
+            return Response({"error": "cursor and limit must be integers"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        version = jobqueue.history_version()
+        etag = f'"h{version}-{cursor or 0}-{limit}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            resp = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            results, nxt = list_history(cursor, limit)
+            resp = Response({"results": results, "next": nxt, "version": version})
+        resp["ETag"] = etag
+        resp["Cache-Control"] = "no-cache"
+        return resp
 
     def delete(self, _):
         # wipe all completed jobs
@@ -210,4 +521,74 @@ class HistoryAPIView(APIView):
         for j in JOBS_ROOT.iterdir():
             shutil.rmtree(j, ignore_errors=True)
             removed.append(j.name)
+        jobqueue.forget()
         return Response({"deleted": removed}, status=204)
+
+
+# --------------------------------------------------------------------------- #
+# Live job status (Server-Sent Events)
+# --------------------------------------------------------------------------- #
+# a sync stream holds a server thread, so it is closed early and EventSource
+# reconnects with Last-Event-ID; under ASGI /api/events/ is the async variant
+SSE_MAX_S  = 25
+SSE_PING_S = 15    # keep-alive comment interval
+FINAL_STAGES = ("finished", "error", "deleted", "cleared")
+
+
+def _event_stream(last_id: int, job_id: str | None):
+    try:
+        sub = notify.Subscriber(jobqueue.EVENTS_CHANNEL)
+    except OSError:
+        sub = None                      # no sockets: poll the journal instead
+    try:
+        yield "retry: 2000\n\n"
+        deadline = time.monotonic() + SSE_MAX_S
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            rows = jobqueue.events_since(last_id, job_id)
+            for r in rows:
+                last_id = r["id"]
+                yield f"id: {r['id']}\nevent: status\ndata: {r['data']}\n\n"
+                if job_id and json.loads(r["data"]).get("stage") in FINAL_STAGES:
+                    return              # nothing more will happen to this job
+            if rows:
+                last_sent = time.monotonic()
+                continue
+            if time.monotonic() - last_sent >= SSE_PING_S:
+                yield ": ping\n\n"
+                last_sent = time.monotonic()
+            if sub is not None:
+                sub.wait(max(min(SSE_PING_S, deadline - time.monotonic()), 0))
+            else:
+                time.sleep(1.0)
+    finally:
+        if sub is not None:
+            sub.close()
+
+
+def _stream_start(request) -> tuple[int, str | None]:
+    """(last event id already seen, job filter) of an event-stream request."""
+    job_id = request.GET.get("job") or None
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.GET.get("since") or -1)
+    except ValueError:
+        last_id = -1
+    if last_id < 0:
+        last_id = 0 if job_id else jobqueue.last_event_id()
+    return last_id, job_id
+
+
+@require_GET
+def events_view(request):
+    """
+    ``GET /api/events/[?job=<id>]`` - ``text/event-stream`` of status records
+    (the same JSON as status.json plus ``job``) as the worker writes them.
+    Without ``job`` every job's events are sent, starting with new ones; with
+    it, the job's whole retained history is replayed first.  Each stream ends
+    after ``SSE_MAX_S`` to give its thread back.
+    """
+    last_id, job_id = _stream_start(request)
+    resp = StreamingHttpResponse(_event_stream(last_id, job_id), content_type="text/event-stream")
+    resp["Cache-Control"] = "no-cache"
+    resp["X-Accel-Buffering"] = "no"    # nginx: do not buffer the stream
+    return resp
@@ -39,7 +39,7 @@ document.getElementById("fltForm").addEventListener("submit", async (ev) => {
     }
 
     const fd = new FormData(form);
-    if (form.use_scipy.checked) fd.append("use_scipy", "on");
+    if (form.use_software.checked) fd.append("use_software", "on");
 
     try {
         showLoading(spinner, submitBtn);
@@ -85,7 +85,7 @@ document.getElementById("fltForm").addEventListener("submit", async (ev) => {
         wrap.insertAdjacentHTML("beforeend", card(`Hardware (${d.hw_time})`,
             `data:image/jpeg;base64,${d.hw_image}`));
         if (d.sw_image)
-            wrap.insertAdjacentHTML("beforeend", card(`SciPy (${d.sw_time})`,
+            wrap.insertAdjacentHTML("beforeend", card(`Software (${d.sw_time})`,
                 `data:image/jpeg;base64,${d.sw_image}`));
     } catch (err) {
         alert(err.message);
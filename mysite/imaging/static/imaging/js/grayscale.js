@@ -10,7 +10,7 @@ document.getElementById("gsForm").addEventListener("submit", async (e) => {
     const form = e.target;
     const submitBtn = form.querySelector("button[type=submit]");
     const fd = new FormData(form);
-    if (form.use_scipy.checked) fd.append("use_scipy", "on");
+    if (form.use_software.checked) fd.append("use_software", "on");
 
     try {
         showLoading(spinner, submitBtn);
@@ -55,7 +55,7 @@ document.getElementById("gsForm").addEventListener("submit", async (e) => {
         wrap.insertAdjacentHTML("beforeend", addCard("Original", URL.createObjectURL(form.image.files[0])));
         wrap.insertAdjacentHTML("beforeend", addCard(`Hardware (${d.hw_time})`, `data:image/jpeg;base64,${d.hw_image}`));
         if (d.sw_image) {
-            wrap.insertAdjacentHTML("beforeend", addCard(`SciPy (${d.sw_time})`, `data:image/jpeg;base64,${d.sw_image}`));
+            wrap.insertAdjacentHTML("beforeend", addCard(`Software (${d.sw_time})`, `data:image/jpeg;base64,${d.sw_image}`));
         }
     } catch (err) {
         alert(err.message);
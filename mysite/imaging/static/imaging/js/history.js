@@ -1,14 +1,68 @@
 // mysite/imaging/static/imaging/js/history.js
 import { getCSRF, fetchOpts } from "./csrf.js";
 import { showLoading, hideLoading } from "./loading.js";
+import { watchJobs, progressPct } from "./jobevents.js";
 
 const spinner = document.getElementById("spinnerOverlay");
 const refreshBtn = document.getElementById("refreshBtn");
 const clearBtn = document.getElementById("clrBtn");
 const tbody = document.getElementById("history-body");
+const moreBtn = document.getElementById("moreBtn");
+
+const PAGE_SIZE = 50;
+const POLL_MS = 3000;         // without a live stream
+const POLL_LIVE_MS = 30000;   // safety net while /api/events/ is connected
+let pages = 1;       // how many pages are on screen
+let etag = null;     // ETag of the last rendered response
+let nextCursor = null;
+
+function progressHtml(pct, status) {
+    return pct
+        ? `<div class="progress" style="height:18px;">
+         <div class="progress-bar ${status === "error" ? "bg-danger" : ""}"
+              role="progressbar"
+              style="width:${pct}%;"
+              aria-valuenow="${pct}" aria-valuemin="0" aria-valuemax="100">
+           ${pct}%
+         </div>
+       </div>` : "-";
+}
+
+function rowHtml(j) {
+    const preview = j.thumb_url
+        ? `<img src="${j.thumb_url}" loading="lazy" style="max-width:100px;">`
+        : "-";
+
+    // Actions column
+    let actions = "-";
+    if (j.status === "finished") {
+        if (j.is_video) {
+            actions = `<a href="${j.video_url}" download class="btn btn-sm btn-secondary">Download</a>`;
+        } else if (j.zip_url) {
+            actions = `<a href="${j.zip_url}" download class="btn btn-sm btn-secondary">Download zip</a>`;
+        } else {
+            actions = `<a href="${j.image_url}" download class="btn btn-sm btn-secondary">Download</a>`;
+        }
+    }
+
+    return `
+        <tr data-job="${j.id}">
+        <td>${j.timestamp}</td>
+        <td>${j.kind}</td>
+        <td class="js-status">${j.status}</td>
+        <td class="js-progress">${progressHtml(j.progress, j.status)}</td>
+        <td>${j.kernel ?? "-"}</td>
+        <td>${j.factor ?? "-"}</td>
+        <td>${j.time}</td>
+        <td>${preview}</td>
+        <td>${actions}</td>
+        </tr>`;
+}
 
 /**
- * Fetch history JSON and rebuild the table.
+ * Fetch history JSON and rebuild the table.  The pages already on screen
+ * are re-fetched as one request; an unchanged history answers 304 and the
+ * table is left alone.
  * @param {boolean} useOverlay  ‑‑ true → show/hide the full‑screen spinner;
  *                               false → silent background refresh.
  */
@@ -16,60 +70,45 @@ export async function loadHistory(useOverlay = false) {
     try {
         if (useOverlay) showLoading(spinner);
 
-        const r = await fetch("/api/history/", { credentials: "same-origin" });
+        const headers = etag ? { "If-None-Match": etag } : {};
+        const r = await fetch(`/api/history/?limit=${PAGE_SIZE * pages}`,
+                              { credentials: "same-origin", cache: "no-store", headers });
+        if (r.status === 304) return;
         if (!r.ok) throw new Error("Failed to fetch history");
-        const list = await r.json();
-
-        tbody.innerHTML = "";
-
-        for (const j of list) {
-            const preview = j.image
-                ? `<img src="data:image/jpeg;base64,${j.image}" style="max-width:100px;">`
-                : "-";
+        const page = await r.json();
 
-            // Actions column
-            let actions = "-";
-            if (j.status === "finished") {
-                if (j.is_video) {
-                    actions = `<a href="${j.video_url}" download class="btn btn-sm btn-secondary">Download</a>`;
-                } else {
-                    actions = `<a href="${j.image_url}" download class="btn btn-sm btn-secondary">Download</a>`;
-                }
-            }
-
-            // Progress column
-            const progBar = j.progress
-                ? `<div class="progress" style="height:18px;">
-             <div class="progress-bar ${j.status === "error" ? "bg-danger" : ""}"
-                  role="progressbar"
-                  style="width:${j.progress}%;"
-                  aria-valuenow="${j.progress}" aria-valuemin="0" aria-valuemax="100">
-               ${j.progress}%
-             </div>
-           </div>` : "-";
-
-            tbody.insertAdjacentHTML("beforeend", `
-                <tr>
-                <td>${j.timestamp}</td>
-                <td>${j.kind}</td>
-                <td>${j.status}</td>
-                <td>${progBar}</td>
-                <td>${j.kernel ?? "-"}</td>
-                <td>${j.factor ?? "-"}</td>
-                <td>${j.time}</td>
-                <td>${preview}</td>
-                <td>${actions}</td>
-                </tr>`);
-        }
+        etag = r.headers.get("ETag");
+        nextCursor = page.next;
+        tbody.innerHTML = page.results.map(rowHtml).join("");
+        moreBtn.hidden = nextCursor === null;
     } catch (err) {
-        alert(err.message);
+        if (useOverlay) alert(err.message);
     } finally {
         if (useOverlay) hideLoading(spinner);
     }
 }
 
+// append the next page below the current ones
+async function loadMore() {
+    if (nextCursor === null) return;
+    try {
+        const r = await fetch(`/api/history/?cursor=${nextCursor}&limit=${PAGE_SIZE}`,
+                              { credentials: "same-origin", cache: "no-store" });
+        if (!r.ok) throw new Error("Failed to fetch history");
+        const page = await r.json();
+        pages += 1;
+        etag = null;    // the next poll re-renders all pages in one go
+        nextCursor = page.next;
+        tbody.insertAdjacentHTML("beforeend", page.results.map(rowHtml).join(""));
+        moreBtn.hidden = nextCursor === null;
+    } catch (err) {
+        alert(err.message);
+    }
+}
+
 // manual refresh button
-refreshBtn.addEventListener("click", () => loadHistory(true));
+refreshBtn.addEventListener("click", () => { etag = null; loadHistory(true); });
+moreBtn.addEventListener("click", loadMore);
 
 // clear‑all button
 clearBtn.addEventListener("click", async () => {
@@ -83,6 +122,7 @@ clearBtn.addEventListener("click", async () => {
         });
         if (!r.ok) throw new Error("Failed to clear history");
         // Rebuild table with overlay once DELETE finishes
+        pages = 1;
         await loadHistory(true);
     } catch (err) {
         alert(err.message);
@@ -91,5 +131,27 @@ clearBtn.addEventListener("click", async () => {
     }
 });
 
-// Initialize
+/**
+ * Live updates: progress of a row on screen is patched in place; anything
+ * that adds, removes or completes a row re-fetches the (ETag-cached) page.
+ */
+const LIVE_STAGES = ["receiving", "kernel_loaded", "processing", "merging"];
+const live = watchJobs((ev) => {
+    const tr = tbody.querySelector(`tr[data-job="${CSS.escape(ev.job)}"]`);
+    if (tr && LIVE_STAGES.includes(ev.stage)) {
+        tr.querySelector(".js-status").textContent = ev.stage;
+        tr.querySelector(".js-progress").innerHTML = progressHtml(progressPct(ev), ev.stage);
+    } else {
+        loadHistory(false);
+    }
+});
+
+// Initialize, then keep polling as a fallback (cheap: unchanged history is a 304)
 loadHistory(true);
+let lastPoll = 0;
+setInterval(() => {
+    const every = live && live.readyState === EventSource.OPEN ? POLL_LIVE_MS : POLL_MS;
+    if (document.hidden || Date.now() - lastPoll < every) return;
+    lastPoll = Date.now();
+    loadHistory(false);
+}, POLL_MS);
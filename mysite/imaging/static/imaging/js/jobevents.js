@@ -0,0 +1,54 @@
+// mysite/imaging/static/imaging/js/jobevents.js
+
+const FINAL = ["finished", "error", "deleted", "cleared"];
+
+/**
+ * Subscribe to live status records from /api/events/.
+ * @param {(ev: object) => void} onStatus  called with every record
+ *        ({job, stage, progress?: {done, total}, note?, ...})
+ * @param {string|null} jobId  only this job; the stream closes once it ends
+ * @returns {EventSource|null}  null when the browser has no EventSource
+ */
+export function watchJobs(onStatus, jobId = null) {
+    if (!("EventSource" in window)) return null;
+    const url = jobId ? `/api/events/?job=${encodeURIComponent(jobId)}` : "/api/events/";
+    const es = new EventSource(url);
+    es.addEventListener("status", (e) => {
+        const ev = JSON.parse(e.data);
+        onStatus(ev);
+        if (jobId && FINAL.includes(ev.stage)) es.close();
+    });
+    return es;
+}
+
+/** Percentage shown for a status record (same rule as the history API). */
+export function progressPct(ev) {
+    const p = ev.progress ?? {};
+    if (p.total) return Math.floor(p.done / p.total * 100);
+    return ev.stage === "finished" ? 100 : 0;
+}
+
+/**
+ * Replace the "queued" alert of a video page with a live progress bar and,
+ * once finished, a download link.
+ */
+export function showVideoProgress(alertWrap, jobId) {
+    const render = (ev) => {
+        const pct = progressPct(ev);
+        const link = ev.stage === "finished"
+            ? `<a class="btn btn-sm btn-primary" href="/api/video/result/${jobId}/" download>Download</a>`
+            : `<a class="btn btn-sm btn-outline-primary" href="/history/">Go to history ↗</a>`;
+        alertWrap.innerHTML = `
+            <div class="alert ${ev.stage === "error" ? "alert-danger" : "alert-info"}" role="alert">
+                <div class="d-flex justify-content-between mb-2">
+                    <span>Job ${ev.stage}${ev.note ? ` - ${ev.note}` : ""}</span>
+                    ${link}
+                </div>
+                <div class="progress" style="height:18px;">
+                    <div class="progress-bar" role="progressbar" style="width:${pct}%;"
+                         aria-valuenow="${pct}" aria-valuemin="0" aria-valuemax="100">${pct}%</div>
+                </div>
+            </div>`;
+    };
+    return watchJobs(render, jobId);
+}
@@ -0,0 +1,61 @@
+// mysite/imaging/static/imaging/js/upload.js
+import { getCSRF, fetchOpts } from "./csrf.js";
+
+const RETRIES = 5;
+
+const sleep = (ms) => new Promise((ok) => setTimeout(ok, ms));
+
+async function json(r) {
+    const d = await r.json().catch(() => ({}));
+    if (!r.ok && r.status !== 409) throw new Error(d.error ?? r.statusText);
+    return d;
+}
+
+/**
+ * Send a video through the chunked upload API (/api/upload/...).  The worker
+ * may start on it while it is still uploading; after a network error the
+ * upload resumes from the offset the server has.
+ * @param {File} file
+ * @param {object} fields  kind ("grayscale" | "filter") plus filter / factor
+ *                         and skip_frames ("" | "exact" | "fuzzy")
+ * @param {(jobId: string) => void} onCreated  called once the job exists
+ * @returns {Promise<object>}  the queued response of the completion call
+ */
+export async function uploadVideo(file, fields, onCreated = () => {}) {
+    const headers = { "X-CSRFToken": getCSRF() };
+    const fd = new FormData();
+    for (const [k, v] of Object.entries({ ...fields, size: file.size })) fd.append(k, v);
+    const up = await json(await fetch("/api/upload/video/", {
+        ...fetchOpts, method: "POST", body: fd, headers,
+    }));
+    onCreated(up.job_id);
+
+    let offset = 0, failures = 0;
+    while (offset < file.size) {
+        const end = Math.min(offset + up.chunk_size, file.size);
+        let r;
+        try {
+            r = await fetch(up.upload_url, {
+                ...fetchOpts,
+                method: "PUT",
+                body: file.slice(offset, end),
+                headers: {
+                    ...headers,
+                    "Content-Type": "application/octet-stream",
+                    "Content-Range": `bytes ${offset}-${end - 1}/${file.size}`,
+                },
+            });
+        } catch (err) {             // connection lost - ask where to resume
+            if (++failures > RETRIES) throw err;
+            await sleep(1000 * failures);
+            offset = await fetch(up.upload_url, { ...fetchOpts, headers })
+                .then(json).then((d) => d.offset).catch(() => offset);
+            continue;
+        }
+        offset = (await json(r)).offset;   // 409 carries the server's offset too
+        failures = 0;
+    }
+    return json(await fetch(`${up.upload_url}complete/`, {
+        ...fetchOpts, method: "POST", headers,
+    }));
+}
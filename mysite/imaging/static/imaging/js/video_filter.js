@@ -1,6 +1,7 @@
 // mysite/imaging/static/imaging/js/video_filter.js
-import { getCSRF, fetchOpts } from "./csrf.js";
 import { showLoading, hideLoading } from "./loading.js";
+import { showVideoProgress } from "./jobevents.js";
+import { uploadVideo } from "./upload.js";
 
 const templateSel = document.getElementById("templateSelect");
 const filtInput = document.getElementById("filterInput");
@@ -37,28 +38,29 @@ document.getElementById("vfForm").addEventListener("submit", async (ev) => {
         return;
     }
 
-    const fd = new FormData(form);
+    const file = form.video.files[0];
 
     try {
         showLoading(spinner, submitBtn);
 
-        const r = await fetch("/api/video/filter/", {
-            ...fetchOpts,
-            method: "POST",
-            body: fd,
-            headers: { "X-CSRFToken": getCSRF() },
-        });
-
-        // job queued - always true for videos
-        if (r.status === 202) {
-            const d = await r.json();
+        // chunked upload - the worker may start before the last byte is in;
+        // live progress (upload, then frames) from /api/events/
+        let live = null;
+        const fields = {
+            kind: "filter", filter: form.filter.value, factor: form.factor.value,
+            skip_frames: form.skip_frames.value,
+        };
+        const d = await uploadVideo(file, fields, (jobId) => {
             hideLoading(spinner, submitBtn);
+            submitBtn.disabled = true;          // until the upload is complete
+            live = showVideoProgress(alertWrap, jobId);
+        });
+        if (!live) {
             alertWrap.innerHTML = `
                         <div class="alert alert-info d-flex justify-content-between" role="alert">
                             <span>${d.message}</span>
                             <a class="btn btn-sm btn-outline-primary" href="/history/">Go to history ↗</a>
                         </div>`;
-            return;
         }
     } catch (err) {
         alert(err.message);
@@ -1,6 +1,7 @@
 // mysite/imaging/static/imaging/js/video_grayscale.js
-import { getCSRF, fetchOpts } from "./csrf.js";
 import { showLoading, hideLoading } from "./loading.js";
+import { showVideoProgress } from "./jobevents.js";
+import { uploadVideo } from "./upload.js";
 
 const spinner = document.getElementById("spinnerOverlay");
 const alertWrap = document.getElementById("alertArea");
@@ -9,28 +10,26 @@ document.getElementById("vgForm").addEventListener("submit", async (e) => {
     e.preventDefault();
     const form = e.target;
     const submitBtn = form.querySelector("button[type=submit]");
-    const fd = new FormData(form);
+    const file = form.video.files[0];
 
     try {
         showLoading(spinner, submitBtn);
 
-        const r = await fetch("/api/video/grayscale/", {
-            ...fetchOpts,
-            method: "POST",
-            body: fd,
-            headers: { "X-CSRFToken": getCSRF() },
-        });
-
-        // job queued - always true for videos
-        if (r.status === 202) {
-            const d = await r.json();
+        // chunked upload - the worker may start before the last byte is in;
+        // live progress (upload, then frames) from /api/events/
+        let live = null;
+        const fields = { kind: "grayscale", skip_frames: form.skip_frames.value };
+        const d = await uploadVideo(file, fields, (jobId) => {
             hideLoading(spinner, submitBtn);
+            submitBtn.disabled = true;          // until the upload is complete
+            live = showVideoProgress(alertWrap, jobId);
+        });
+        if (!live) {
             alertWrap.innerHTML = `
                 <div class="alert alert-info d-flex justify-content-between" role="alert">
                     <span>${d.message}</span>
                     <a class="btn btn-sm btn-outline-primary" href="/history/">Go to history ↗</a>
                 </div>`;
-            return;
         }
     } catch (err) {
         alert(err.message);
@@ -11,6 +11,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -126,3 +127,16 @@ STATICFILES_DIRS = [BASE_DIR / "static"]  # optional, useful during dev
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Result downloads: "" serves files from Django; "x-accel-redirect" (nginx) or
+# "x-sendfile" (Apache / lighttpd) hands them to the front web server.  For
+# nginx, RESULT_ACCEL_PREFIX is an internal location aliased to the jobs dir.
+RESULT_SENDFILE = os.getenv("RESULT_SENDFILE", "")
+RESULT_ACCEL_PREFIX = os.getenv("RESULT_ACCEL_PREFIX", "/_jobs/")
+
+# Set by asgi.py: /api/events/ is then served by the async view, which keeps
+# its streams open without a thread each (the sync one closes them after 25 s)
+ASGI = os.getenv("DJANGO_ASGI", "") == "1"
+
+# Batch image endpoints take one multipart field per image (api.jobutils.MAX_BATCH_IMAGES)
+DATA_UPLOAD_MAX_NUMBER_FILES = 500
@@ -0,0 +1,218 @@
+# videoio.py
+"""
+Video I/O of the worker.
+
+``VideoSource`` is a ``cv2.VideoCapture`` over a job's ``in.mp4`` that may
+still be arriving through the chunked upload API (mysite/api/uploads.py):
+every read first waits until the frame's samples - plus a few more, for
+B-frame reordering and interleaved audio - are on disk, so the decoder
+never runs into the end of a growing file.  Once it has waited
+``UPLOAD_WAIT_S`` in all, the upload is too slow to hold the accelerator:
+it raises ``uploads.Stalled`` and ``park_upload`` hands the job back until
+the upload is complete.
+
+``SegmentWriter`` is a ``cv2.VideoWriter`` that closes a segment file every
+``VIDEO_SEGMENT_S`` seconds of video and lists it in ``segments.json``, so
+the start of a long result can be downloaded while the rest is processed;
+``finish`` then joins the segments into ``out.mp4`` without re-encoding
+and deletes them.
+
+``FrameSkipper`` spots decoded frames that repeat the last processed one,
+for jobs that opted in (``skip.txt``), so their output can be reused
+instead of filtering the frame again.
+"""
+
+from __future__ import annotations
+import hashlib, os, sys, time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent / "mysite"))   # Django-free helpers
+from api import jobqueue, mp4, uploads
+from api.jobstatus import SEGMENT_NAME, SEGMENTS_FILE, write_segments, write_status
+
+UPLOAD_POLL_S  = 0.5
+UPLOAD_WAIT_S  = float(os.getenv("UPLOAD_WAIT_S", "5"))  # then give the lane back
+READ_AHEAD     = 16                 # samples kept between the decoder and the upload
+SEGMENT_S      = float(os.getenv("VIDEO_SEGMENT_S", "4"))  # 0: write out.mp4 directly
+SKIP_THUMB     = (64, 36)           # "fuzzy" frame fingerprint size
+SKIP_TOL       = int(os.getenv("VIDEO_SKIP_TOL", "2"))   # grey levels a "fuzzy" repeat may differ
+
+
+class VideoSource:
+    """Drop-in for ``cv2.VideoCapture(job / "in.mp4")`` (get / read / release)."""
+
+    def __init__(self, job: Path):
+        self.job = job
+        self.path = job / uploads.VIDEO_FILE
+        self.layout: list[int] | None = None
+        self.frames = 0                 # frames returned so far
+        self.waited = 0.0               # seconds spent waiting for the upload
+        self._receiving = uploads.receiving(job)
+        if self._receiving:
+            # queued early only once the moov box is in; wait for it otherwise
+            self._wait(self._find_layout)
+        self.cap = cv2.VideoCapture(str(self.path))
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def get(self, prop: int) -> float:
+        return self.cap.get(prop)
+
+    def read(self):
+        if self._receiving:
+            need = min(self.frames + 1 + READ_AHEAD, len(self.layout or ()))
+            self._wait(lambda: uploads.frames_on_disk(self.layout, uploads.offset(self.job)) >= need)
+        ok, frame = self.cap.read()
+        if ok:
+            self.frames += 1
+        return ok, frame
+
+    def release(self) -> None:
+        self.cap.release()
+
+    def _find_layout(self) -> bool:
+        self.layout = uploads.sample_layout(self.job)
+        return self.layout is not None
+
+    def _wait(self, ready) -> None:
+        """Block until ``ready()`` or the upload is complete; ``Stalled`` if it is too slow."""
+        while True:
+            if not uploads.receiving(self.job):
+                self._receiving = False
+                return
+            if ready():
+                return
+            if self.waited > UPLOAD_WAIT_S:
+                raise uploads.Stalled(f"upload too slow at byte {uploads.offset(self.job)}")
+            time.sleep(UPLOAD_POLL_S)
+            self.waited += UPLOAD_POLL_S
+
+
+def park_upload(job: Path) -> None:
+    """
+    Hand back the job of a ``Stalled`` upload: it leaves the queue and is
+    enqueued again by the upload's completion (jobutils.complete_upload).
+    """
+    st = uploads.update(job, queued=False, parked=True)
+    jobqueue.park(job.name)
+    write_status(job, "receiving", note="waiting for the rest of the upload",
+                 progress=(uploads.offset(job), st["size"]))
+    if st["complete"]:                  # completed meanwhile - it saw queued=True
+        uploads.update(job, queued=True)
+        jobqueue.enqueue(job, st["kind"])
+
+
+class SegmentWriter:
+    """Drop-in for ``cv2.VideoWriter(job / "out.mp4", mp4v, fps, size)`` (write / release)."""
+
+    def __init__(self, job: Path, fps: float, size: tuple[int, int]):
+        self.job, self.fps, self.size = job, fps, size
+        self.seg_frames = round(fps * SEGMENT_S)
+        self.segments: list[dict] = []     # finished, as listed in segments.json
+        self.pending: dict | None = None    # the segment being written
+        self.frames = 0
+        self.vw: cv2.VideoWriter | None = None
+        # left over from an interrupted run
+        for old in [job / "out.mp4", job / SEGMENTS_FILE,
+                    *job.glob(SEGMENT_NAME.replace("{:05d}", "*"))]:
+            old.unlink(missing_ok=True)
+        if self.seg_frames <= 0:
+            self.vw = self._open(job / "out.mp4")
+        else:
+            self._publish(complete=False)
+
+    def _open(self, path: Path) -> cv2.VideoWriter:
+        return cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), self.fps, self.size)
+
+    def _publish(self, complete: bool, final: str | None = None) -> None:
+        manifest = {
+            "fps": self.fps, "width": self.size[0], "height": self.size[1],
+            "segment_frames": self.seg_frames, "segments": self.segments,
+            "complete": complete,
+        }
+        if final:
+            manifest["final"] = final
+        write_segments(self.job, manifest)
+
+    def _close_segment(self) -> None:
+        self.vw.release()
+        self.vw = None
+        seg, self.pending = self.pending, None
+        seg["bytes"] = (self.job / seg["file"]).stat().st_size
+        self.segments.append(seg)
+        self._publish(complete=False)
+
+    def write(self, frame) -> None:
+        if self.seg_frames > 0:
+            if self.vw is None:
+                self.pending = {"file": SEGMENT_NAME.format(len(self.segments)),
+                                "start": self.frames, "frames": 0}
+                self.vw = self._open(self.job / self.pending["file"])
+            self.pending["frames"] += 1
+        self.vw.write(frame)
+        self.frames += 1
+        if self.seg_frames > 0 and self.pending["frames"] == self.seg_frames:
+            self._close_segment()
+
+    def release(self) -> None:
+        if self.pending is not None:
+            self._close_segment()
+        elif self.vw is not None:
+            self.vw.release()
+            self.vw = None
+
+    def finish(self) -> None:
+        """
+        Join the segments into out.mp4 (call after ``release``) and delete
+        them - the result URL serves out.mp4 from then on, so keeping them
+        would only double the job's disk use.  The manifest then lists no
+        segments and names the joined file as ``"final"``.
+        """
+        if self.seg_frames <= 0 or not self.segments:
+            return
+        joined, self.segments = self.segments, []
+        mp4.concat([self.job / s["file"] for s in joined], self.job / "out.mp4")
+        self._publish(complete=True, final="out.mp4")
+        for s in joined:                # a download already open keeps its file
+            (self.job / s["file"]).unlink(missing_ok=True)
+
+
+class FrameSkipper:
+    """
+    ``repeat(frame)`` is True when *frame* matches the last frame that was not
+    a repeat.  "exact" compares a digest of the frame's bytes; "fuzzy" a
+    SKIP_THUMB area-averaged thumbnail within ``SKIP_TOL`` levels, which
+    absorbs the sensor noise of static camera scenes but may also absorb a
+    change smaller than one thumbnail pixel.
+    """
+
+    def __init__(self, mode: str):
+        if mode not in ("exact", "fuzzy"):
+            raise ValueError(f"unknown frame skipping mode «{mode}»")
+        self.mode = mode
+        self.ref = None                 # fingerprint of the last processed frame
+        self.skipped = 0
+
+    @classmethod
+    def for_job(cls, job: Path) -> FrameSkipper | None:
+        try:
+            return cls((job / "skip.txt").read_text().strip())
+        except FileNotFoundError:
+            return None
+
+    def repeat(self, frame: np.ndarray) -> bool:
+        if self.mode == "exact":
+            fp = hashlib.blake2b(np.ascontiguousarray(frame), digest_size=16).digest()
+            same = fp == self.ref
+        else:
+            fp = cv2.resize(frame, SKIP_THUMB, interpolation=cv2.INTER_AREA).astype(np.int16)
+            same = self.ref is not None and int(np.abs(fp - self.ref).max()) <= SKIP_TOL
+        if same:
+            self.skipped += 1
+        else:
+            self.ref = fp
+        return same
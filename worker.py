@@ -3,18 +3,30 @@
 Background worker for FPGA image/video jobs.
 Keeps per-job status in status.json so the front-end can poll progress.
 Only **one** worker process should run on the PYNQ because DMA / overlay
-resources are not thread-safe.  Jobs are processed strictly FIFO.
+resources are not thread-safe; a single "fpga" thread owns them.  Jobs are
+claimed FIFO (grouped by overlay within bounds); with ``CPU_WORKERS`` > 0
+jobs may instead run on a pool of software processes (cpulane.py) when
+that lane is expected to finish them sooner - a video takes the whole pool;
+batch jobs always run on the FPGA.
 """
 
 from __future__ import annotations
-import json, os, sys, time, traceback
+import collections, os, queue, shutil, sys, threading, time, traceback, zipfile
 from pathlib import Path
-from typing import Literal, Optional
+from typing import Optional
 
 import cv2
 import numpy as np
 from PIL import Image
-from pynq import Overlay, allocate, DefaultIP
+
+from backends import BufferPool, bgra_view, get_backend, pack_into, unpack
+from cpulane import CPU_KINDS, CPU_VIDEO_KINDS, CpuLane
+from videoio import FrameSkipper, SegmentWriter, VideoSource, park_upload
+
+sys.path.insert(0, str(Path(__file__).parent / "mysite"))   # Django-free helpers
+from api import jobqueue, notify, resultcache, thumbs, uploads
+from api.jobstatus import read_batch, read_status, write_batch, write_status
+from api.metrics import StageTimer, record_job
 
 # --------------------------------------------------------------------------- #
 # Logging configuration
@@ -37,86 +49,43 @@ BASE_DIR = Path(__file__).parent           # /home/xilinx/f_c_a_api
 OVERLAYS  = BASE_DIR / "overlays"
 
 JOBS_DIR = BASE_DIR / "mysite" / "api" / "jobs"
-MAX_W, MAX_H = 1920, 1080  # resize cap for large videos
-
-STATUS_FILE = "status.json"
+MAX_W, MAX_H = 1920, 1080  # largest frame the accelerator takes in one pass
+# bigger frames are split into MAX_W×MAX_H tiles instead of being downscaled
+TILING = bool(int(os.getenv("FPGA_TILING", "1")))
+TILED_MAX_W, TILED_MAX_H = 7680, 4320  # resize cap for large videos (8K)
+
+IDLE_WAIT_S = 5.0          # re-check the queue even if no wake-up arrives
+UPLOAD_SWEEP_S = 3600.0    # how often abandoned chunked uploads are looked for
+# overlay affinity: a job for the loaded overlay may overtake the head of the
+# queue, but never once the head was passed over this often / waited this long
+AFFINITY_MAX_BYPASS = int(os.getenv("AFFINITY_MAX_BYPASS", "8"))
+AFFINITY_MAX_WAIT_S = float(os.getenv("AFFINITY_MAX_WAIT_S", "30"))
 OVERLAY_PATHS = {
     "grayscale": str(OVERLAYS / "grayscale"  / "grayscale.bit"),
     "filter":    str(OVERLAYS / "filter"     / "filter.bit"),
 }
 
-# --------------------------------------------------------------------------- #
-# FPGA custom driver
-# --------------------------------------------------------------------------- #
-class FilterKernel(DefaultIP):
-    bindto = ["xilinx.com:hls:filter_kernel:1.0"]
-
-    def __init__(self, desc):
-        super().__init__(description=desc)
-        rm = self.register_map
-        self.width_addr  = rm.image_width.address
-        self.height_addr = rm.image_height.address
-        self.factor_addr = rm.kernel_factor.address
-        self.kernel_addr = 0x40
-
-    width  = property(lambda s: s.read(s.width_addr),
-                      lambda s, v: s.write(s.width_addr, v))
-    height = property(lambda s: s.read(s.height_addr),
-                      lambda s, v: s.write(s.height_addr, v))
-    factor = property(lambda s: s.read(s.factor_addr),
-                      lambda s, v: s.write(s.factor_addr, v))
-
-    @property
-    def kernel(self):
-        flat = [self.read(self.kernel_addr + 4*i) for i in range(9)]
-        return np.array(flat, np.int32).reshape(3, 3)
-
-    @kernel.setter
-    def kernel(self, m):
-        flat = np.array(m, np.int32).ravel()
-        if flat.size != 9:
-            raise ValueError("Kernel must be 3×3")
-        for i, v in enumerate(flat):
-            self.write(self.kernel_addr + 4*i, int(v))
+# "pynq" (board), "emulator" (NumPy model of the overlays) or "auto"
+backend = get_backend(os.getenv("WORKER_BACKEND", "auto"))
+DMA_POOL_BYTES = int(os.getenv("DMA_POOL_MB", "64")) << 20
+PIPE_DEPTH   = int(os.getenv("VIDEO_PIPE_DEPTH", "4"))  # frames between stages
+ACCEL_SLOTS  = 2                                         # double-buffered output
+# jobs may also run in software on this many CPU processes (0 = FPGA only)
+CPU_WORKERS  = int(os.getenv("CPU_WORKERS", "0"))
+EWMA_ALPHA   = 0.3
+# end-to-end seconds per megapixel (JPEG I/O included) until measured
+PRIOR_S_PER_MP = {"fpga": 0.05, "cpu": 0.25}
+PRIOR_RELOAD_S = 0.5
 
 # --------------------------------------------------------------------------- #
 # Globals set by load_overlay()
 # --------------------------------------------------------------------------- #
 current_overlay = current_dma = current_ip = None   # FPGA objects
 loaded_kernel  : Optional[str] = None              # "grayscale" | "filter"
-
-# --------------------------------------------------------------------------- #
-# Helper - job status I/O
-# --------------------------------------------------------------------------- #
-def _status_path(job: Path) -> Path:
-    return job / STATUS_FILE
-
-def write_status(job: Path,
-                  stage: Literal[
-                      "queued", "receiving", "kernel_loaded",
-                      "processing", "merging",
-                      "finished", "error"
-                  ],
-                  note: str | None = None,
-                  progress: tuple[int, int] | None = None) -> None:
-    data: dict[str, object] = {
-        "stage": stage,
-        "timestamp": time.time(),
-    }
-    if note is not None:
-        data["note"] = note
-    if progress is not None:
-        done, total = progress
-        data["progress"] = {"done": done, "total": total}
-    tmp = _status_path(job).with_suffix(".tmp")
-    tmp.write_text(json.dumps(data, indent=2))
-    tmp.rename(_status_path(job))
-
-def _read_status(job: Path) -> dict:
-    try:
-        return json.loads(_status_path(job).read_text())
-    except Exception:
-        return {}
+buffer_pool    : Optional[BufferPool] = None       # DMA buffers of that overlay
+# driver handles per overlay kind, resolved once and reused after re-downloads
+_handles: dict[str, tuple[object, object]] = {}
+overlay_load_s : float = 0.0                        # total time spent loading overlays
 
 # --------------------------------------------------------------------------- #
 # Overlay management
@@ -126,39 +95,62 @@ def load_overlay(kind: str) -> None:
     Load bitstream only when necessary.
     ``kind`` is one of "grayscale", "filter".
     """
-    global current_overlay, current_ip, current_dma, loaded_kernel
+    global current_overlay, current_ip, current_dma, loaded_kernel, buffer_pool, overlay_load_s
 
-    base = kind.removesuffix("_video")
+    base = jobqueue.overlay_of(kind)
     if loaded_kernel == base:
         log.debug("overlay %s already loaded", base)
         return
 
     bit = OVERLAY_PATHS[base]
-    log.info("loading overlay: %s", bit)
+    log.info("loading overlay: %s (%s backend)", bit, backend.name)
     t0 = time.perf_counter()
-    current_overlay = Overlay(bit)
-    current_dma     = current_overlay.axi_dma_0
-    current_ip      = (current_overlay.grayscale_kernel_0
+    if buffer_pool is not None:
+        log.debug("releasing DMA pool of %s: %s", loaded_kernel, buffer_pool.stats())
+        buffer_pool.clear()
+    current_overlay = backend.overlay(bit)
+    if base in _handles:
+        current_dma, current_ip = _handles[base]
+        # the download reset the DMA engine - re-arm both channels
+        current_dma.sendchannel.start()
+        current_dma.recvchannel.start()
+    else:
+        current_dma = current_overlay.axi_dma_0
+        current_ip  = (current_overlay.grayscale_kernel_0
                        if base == "grayscale" else current_overlay.filter_kernel_0)
+        _handles[base] = (current_dma, current_ip)
+    current_ip.invalidate_shadow()      # registers are back at reset values
     loaded_kernel  = base
-    log.info("overlay ready (%.1f ms)", (time.perf_counter() - t0)*1e3)
+    buffer_pool     = BufferPool(backend.allocate, DMA_POOL_BYTES)
+    dt_ms = (time.perf_counter() - t0)*1e3
+    overlay_load_s += dt_ms / 1e3
+    jobqueue.bump("overlay_reloads")
+    jobqueue.bump("overlay_reload_ms", dt_ms)
+    tm = backend.timing
+    log.info("overlay ready (%.1f ms: metadata %.1f ms%s, program %.1f ms)", dt_ms,
+             tm.get("parse_ms", 0.0), " cached" if tm.get("cached") else "",
+             tm.get("program_ms", 0.0))
 
 # --------------------------------------------------------------------------- #
 # Low‑level accelerator invocation
 # --------------------------------------------------------------------------- #
-def run_accelerator(rgb: np.ndarray, cfg_func) -> tuple[np.ndarray, float]:
+def run_accelerator(frame: np.ndarray, cfg_func, order: str = "rgb",
+                    slot: int = 0, timer: StageTimer | None = None) -> tuple[np.ndarray, float]:
     """
-    Push one RGB frame through the accelerator.
-    Returns (output_rgb, elapsed_ms).
+    Push one (h, w, 3) RGB - or BGR with ``order="bgr"`` - frame through the
+    accelerator.  Returns (output, elapsed_ms); *output* is a zero-copy
+    (h, w, 4) BGRA view of the pooled DMA buffer, valid until the next frame
+    of the same size and ``slot``.  Use ``unpack()`` for a contiguous copy.
+    ``timer`` gets the pack, config and dma stages.
     """
-    comb = ((rgb[..., 0].astype(np.uint32) << 16) |
-            (rgb[..., 1].astype(np.uint32) <<  8) |
-             rgb[..., 2].astype(np.uint32))
-    input_buffer  = allocate(comb.shape, dtype=np.uint32)
-    output_buffer = allocate(comb.shape, dtype=np.uint32)
-    input_buffer[:] = comb
-
-    cfg_func(rgb)                       # setup IP registers
+    t_pack = time.perf_counter()
+    shape = frame.shape[:2]
+    input_buffer  = buffer_pool.get(shape, np.uint32, "in")
+    output_buffer = buffer_pool.get(shape, np.uint32, f"out{slot}")
+    pack_into(frame, input_buffer, order)
+
+    t_cfg = time.perf_counter()
+    cfg_func(frame)                     # setup IP registers
     current_ip.write(0x00, 1)          # ap_start
 
     t0 = time.perf_counter()
@@ -168,57 +160,185 @@ def run_accelerator(rgb: np.ndarray, cfg_func) -> tuple[np.ndarray, float]:
     current_dma.recvchannel.wait()
     time_elapsed = (time.perf_counter() - t0) * 1e3
 
-    r = (output_buffer >> 16) & 0xFF
-    g = (output_buffer >>  8) & 0xFF
-    b =  output_buffer        & 0xFF
-    rgb_output = np.stack((r, g, b), axis=-1).astype(np.uint8)
+    if timer is not None:
+        timer.add("pack", t_cfg - t_pack)
+        timer.add("config", t0 - t_cfg)
+        timer.add("dma", time_elapsed / 1e3)
+    return bgra_view(output_buffer), time_elapsed
 
-    input_buffer.freebuffer(); output_buffer.freebuffer()
-    return rgb_output, time_elapsed
+# --------------------------------------------------------------------------- #
+# Tiled invocation for frames larger than MAX_W×MAX_H
+# --------------------------------------------------------------------------- #
+def _tile_windows(n: int, limit: int, halo: int) -> list[tuple[int, int, int]]:
+    """
+    Cover [0, n) with equal windows of ``min(n, limit)`` pixels.  Returns
+    (start, lo, hi) per window: the window is read from ``start`` and only
+    [lo, hi) - its interior minus ``halo`` - is kept, except at the image
+    borders.  Equal windows keep every tile on the same pooled DMA buffers.
+    """
+    size = min(n, limit)
+    if size == n:
+        return [(0, 0, n)]
+    count = -(-(n - size) // (size - 2*halo)) + 1
+    out = []
+    for i in range(count):
+        start = round(i * (n - size) / (count - 1))
+        lo = 0 if i == 0 else start + halo
+        hi = n if i == count - 1 else start + size - halo
+        out.append((start, lo, hi))
+    return out
+
+def run_tiled(frame: np.ndarray, cfg_func, order: str = "rgb", halo: int = 1,
+              out: np.ndarray | None = None, timer: StageTimer | None = None,
+              slot: int = 0) -> tuple[np.ndarray, float]:
+    """
+    Stream a frame of any size through the accelerator as back-to-back tiles.
+    Each tile carries ``halo`` pixels of real neighbours so the 3×3 window at
+    a seam sees exactly what a single full-frame pass would; the halo output
+    is discarded when stitching.  Returns a contiguous (h, w, 3) frame in the
+    same channel ``order`` (written into ``out`` when given) and the summed
+    DMA time.  The tiles go through the output buffers of ``slot``.
+    """
+    h, w = frame.shape[:2]
+    if out is None:
+        out = np.empty_like(frame)
+    total_ms = 0.0
+    for ty, y0, y1 in _tile_windows(h, MAX_H, halo):
+        th = min(h, MAX_H)
+        for tx, x0, x1 in _tile_windows(w, MAX_W, halo):
+            tw = min(w, MAX_W)
+            res, t_ms = run_accelerator(frame[ty:ty + th, tx:tx + tw], cfg_func, order,
+                                        slot, timer)
+            total_ms += t_ms
+            t0 = time.perf_counter()
+            unpack(res[y0 - ty:y1 - ty, x0 - tx:x1 - tx], order, dst=out[y0:y1, x0:x1])
+            if timer is not None:
+                timer.add("unpack", time.perf_counter() - t0)
+    return out, total_ms
+
+def _needs_tiling(frame: np.ndarray) -> bool:
+    h, w = frame.shape[:2]
+    return w > MAX_W or h > MAX_H
 
 # --------------------------------------------------------------------------- #
 # Register configuration helpers
 # --------------------------------------------------------------------------- #
 def cfg_grayscale(arr):
     h, w = arr.shape[:2]
-    current_ip.write(0x10, w)
-    current_ip.write(0x18, h)
+    current_ip.width  = w
+    current_ip.height = h
 
-def cfg_filter(arr, job: Path):
+def cfg_filter(arr, factor: int, kernel: np.ndarray):
     h, w = arr.shape[:2]
     current_ip.height = h
     current_ip.width  = w
-    current_ip.factor = int((job / "factor.txt").read_text())
-    k = np.fromstring((job / "filter.txt").read_text(), sep=" ",
-                      dtype=np.int32).reshape(3, 3)
-    current_ip.kernel = k
+    current_ip.factor = factor
+    current_ip.kernel = kernel
+
+def job_config(job: Path, kind: str):
+    """
+    Parse the job's filter files once and return its per-frame register
+    setup.  The IP drivers shadow their registers, so after the first frame
+    this costs no MMIO writes unless the frame size changes.
+    """
+    if kind.startswith("grayscale"):
+        return cfg_grayscale
+    factor = int((job / "factor.txt").read_text())
+    kernel = np.array((job / "filter.txt").read_text().split(), np.int32).reshape(3, 3)
+    return lambda a: cfg_filter(a, factor, kernel)
 
 # --------------------------------------------------------------------------- #
 # Job executors
 # --------------------------------------------------------------------------- #
+def _halo(kind: str) -> int:
+    """Neighbour pixels a tile needs: 1 for the 3×3 filter, none for grayscale."""
+    return 0 if kind.startswith("grayscale") else 1
+
 def process_image(job: Path, kind: str) -> None:
     log.info("▶ IMAGE job %s (%s)", job.name, kind)
-    load_overlay(kind)
+    timer = StageTimer(job)
+    with timer("load_overlay"):
+        load_overlay(kind)
     write_status(job, "kernel_loaded")
 
-    img = np.array(Image.open(job / "in.jpg"))
-    cfg = cfg_grayscale if kind == "grayscale" else lambda a: cfg_filter(a, job)
+    with timer("decode"):
+        img = np.array(Image.open(job / "in.jpg").convert("RGB"))
+    cfg = job_config(job, kind)
 
     write_status(job, "processing")
-    out, t_ms = run_accelerator(img, cfg)
-
-    Image.fromarray(out).save(job / "out.jpg")
+    if _needs_tiling(img):
+        out, t_ms = run_tiled(img, cfg, halo=_halo(kind), timer=timer)
+    else:
+        out, t_ms = run_accelerator(img, cfg, timer=timer)
+        with timer("unpack"):
+            out = unpack(out)
+
+    with timer("encode"):
+        Image.fromarray(out).save(job / "out.jpg")
+        thumbs.make_thumbnail(job)
+    if (job / "cache_key.txt").exists():
+        resultcache.store((job / "cache_key.txt").read_text().strip(), job / "out.jpg")
     (job / "hw_time.txt").write_text(f"{t_ms:.2f} ms")
-    write_status(job, "finished", progress=(1, 1))
+    write_status(job, "finished", progress=(1, 1), timings=timer.as_ms())
     (job / "done.txt").write_text("done")
     log.info("✔ IMAGE job %s finished (%.2f ms)", job.name, t_ms)
 
+# --------------------------------------------------------------------------- #
+# Video pipeline plumbing
+# --------------------------------------------------------------------------- #
+_EOS = object()                         # end-of-stream marker
+_REPEAT = object()                      # frame repeating the last processed one
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """Blocking put that gives up once *stop* is set (back-pressure aware)."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """Blocking get returning ``_EOS`` once *stop* is set."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _EOS
+
+class _Stage(threading.Thread):
+    """Runs one pipeline stage; keeps its exception and stops the others."""
+
+    def __init__(self, name: str, fn, stop: threading.Event):
+        super().__init__(name=name, daemon=True)
+        self.fn, self.stop, self.exc = fn, stop, None
+
+    def run(self) -> None:
+        try:
+            self.fn()
+        except BaseException as exc:
+            self.exc = exc
+            self.stop.set()
+
 def process_video(job: Path, kind: str) -> None:
+    """
+    Decode → accelerator → encode, each stage on its own thread and joined by
+    bounded queues, so the FPGA works on frame N+1 while frame N is encoded.
+    The accelerator alternates between ``ACCEL_SLOTS`` output buffers; a slot
+    is only reused once the encoder has consumed it.  With ``TILING`` frames
+    above MAX_W×MAX_H keep their resolution and go through ``run_tiled``.
+    Jobs that opted into frame skipping send repeated frames past the
+    accelerator; the encoder writes the previous output again.
+    """
     log.info("▶ VIDEO job %s (%s)", job.name, kind)
-    load_overlay(kind)
+    timer = StageTimer(job)
+    with timer("load_overlay"):
+        load_overlay(kind)
     write_status(job, "kernel_loaded")
 
-    cap = cv2.VideoCapture(str(job / "in.mp4"))
+    cap = VideoSource(job)          # in.mp4 may still be uploading
     if not cap.isOpened():
         raise RuntimeError("OpenCV failed to open video")
 
@@ -226,49 +346,272 @@ def process_video(job: Path, kind: str) -> None:
     tot  = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 0
     w    = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     h    = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    scale = max(w/MAX_W, h/MAX_H, 1.0)
+    cap_w, cap_h = (TILED_MAX_W, TILED_MAX_H) if TILING else (MAX_W, MAX_H)
+    scale = max(w/cap_w, h/cap_h, 1.0)
     ow, oh = int(w/scale), int(h/scale)
-
-    vw = cv2.VideoWriter(str(job / "out.mp4"),
-                         cv2.VideoWriter_fourcc(*"mp4v"), fps, (ow, oh))
-    cfg = cfg_grayscale if kind == "grayscale_video" else lambda a: cfg_filter(a, job)
+    tiled = ow > MAX_W or oh > MAX_H
+
+    vw = SegmentWriter(job, fps, (ow, oh))
+    cfg = job_config(job, kind)
+    skipper = FrameSkipper.for_job(job)
+    # a stitched output must survive its slot until the next distinct frame
+    hold = tiled and skipper is not None
+
+    stop      = threading.Event()
+    frames_q  = queue.Queue(PIPE_DEPTH)     # decoder → accelerator
+    results_q = queue.Queue(PIPE_DEPTH)     # accelerator → encoder
+    free_slots = queue.Queue()
+    for slot in range(ACCEL_SLOTS):
+        free_slots.put(slot)
+    # tiled frames are stitched into per-slot BGR frames instead of DMA views
+    stitched = [np.empty((oh, ow, 3), np.uint8) for _ in range(ACCEL_SLOTS)] if tiled else None
 
     first_snap = None
     done, total_ms = 0, 0.0
-    write_status(job, "processing", progress=(0, tot))
-    while True:
-        ok, frm = cap.read()
-        if not ok:
-            break
-        if scale > 1.0:
-            frm = cv2.resize(frm, (ow, oh), cv2.INTER_AREA)
-        rgb = cv2.cvtColor(frm, cv2.COLOR_BGR2RGB)
-        out, t_ms = run_accelerator(rgb, cfg)
-        total_ms += t_ms
-
-        if first_snap is None:
-            first_snap = out.copy()
-        vw.write(cv2.cvtColor(out, cv2.COLOR_RGB2BGR))
-
-        done += 1
-        # update every 5 frames to limit disk I/O
-        if done % 5 == 0 or done == tot:
-            write_status(job, "processing", progress=(done, tot))
-
-    cap.release(); vw.release()
+
+    def decode() -> None:
+        while not stop.is_set():
+            with timer("decode"):
+                ok, frm = cap.read()
+            if not ok:
+                break
+            if skipper is not None:
+                with timer("fingerprint"):
+                    repeat = skipper.repeat(frm)
+                if repeat:
+                    if not _put(frames_q, _REPEAT, stop):
+                        return
+                    continue
+            if scale > 1.0:
+                with timer("resize"):
+                    frm = cv2.resize(frm, (ow, oh), cv2.INTER_AREA)
+            if not _put(frames_q, frm, stop):
+                return
+        _put(frames_q, _EOS, stop)
+
+    def encode() -> None:
+        nonlocal first_snap, done
+        bgr = held = None
+        while (item := _get(results_q, stop)) is not _EOS:
+            if item is not _REPEAT:
+                slot, out = item
+                if tiled:
+                    bgr = out
+                else:
+                    with timer("unpack"):
+                        bgr = unpack(out, "bgr")
+                if first_snap is None:
+                    with timer("cvtcolor"):
+                        first_snap = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+            with timer("encode"):
+                vw.write(bgr)
+            if item is not _REPEAT:
+                if hold:
+                    slot, held = held, slot
+                if slot is not None:
+                    free_slots.put(slot)
+
+            done += 1
+            # update every 5 frames to limit disk I/O
+            if done % 5 == 0 or done == tot:
+                write_status(job, "processing", progress=(done, tot), skipped=skipped())
+
+    def skipped() -> int | None:
+        return skipper.skipped if skipper is not None else None
+
+    write_status(job, "processing", progress=(0, tot), skipped=skipped())
+    t0 = time.perf_counter()
+    stages = [_Stage("decode", decode, stop), _Stage("encode", encode, stop)]
+    for st in stages:
+        st.start()
+    try:
+        while (frm := _get(frames_q, stop)) is not _EOS:
+            if frm is _REPEAT:
+                _put(results_q, _REPEAT, stop)
+                continue
+            slot = _get(free_slots, stop)
+            if slot is _EOS:
+                break
+            if tiled:
+                out, t_ms = run_tiled(frm, cfg, "bgr", _halo(kind), out=stitched[slot], timer=timer)
+            else:
+                out, t_ms = run_accelerator(frm, cfg, order="bgr", slot=slot, timer=timer)
+            total_ms += t_ms
+            _put(results_q, (slot, out), stop)
+        _put(results_q, _EOS, stop)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for st in stages:
+            st.join()
+        cap.release(); vw.release()
+    for st in stages:
+        if st.exc is not None:
+            raise st.exc
+    wall = time.perf_counter() - t0
+
     if first_snap is not None:
         Image.fromarray(first_snap).save(job / "out.jpg")
+        thumbs.make_thumbnail(job)
 
-    note = f"{total_ms:.2f} ms ({done}f, avg {total_ms/max(done,1):.2f} ms/f)"
+    n_skip = skipped() or 0
+    note = f"{total_ms:.2f} ms ({done}f, avg {total_ms/max(done - n_skip, 1):.2f} ms/f"
+    note += f", {n_skip} skipped)" if skipper is not None else ")"
     (job / "hw_time.txt").write_text(note)
-    write_status(job, "merging")                  # quick stage
-    write_status(job, "finished", note=note, progress=(done, done))
+    write_status(job, "merging")                  # quick stage - no re-encode
+    with timer("merge"):
+        vw.finish()
+    write_status(job, "finished", note=note, progress=(done, done), timings=timer.as_ms(),
+                 skipped=skipped())
     (job / "done.txt").write_text("done")
-    log.info("✔ VIDEO job %s finished (%s)", job.name, note)
+    log.info("✔ VIDEO job %s finished (%s, %.1f fps)", job.name, note, done/max(wall, 1e-9))
+    log.info("DMA pool: %s", buffer_pool.stats())
+
+# --------------------------------------------------------------------------- #
+# Batch jobs
+# --------------------------------------------------------------------------- #
+def _zip_results(job: Path, images: list[dict]) -> None:
+    """out.zip of the results under their upload names (JPEGs: stored, not deflated)."""
+    tmp, seen = job / "out.zip.tmp", set()
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf:
+        for i, im in enumerate(images):
+            if "output" not in im:
+                continue
+            arc = f"{Path(im['name']).stem}.jpg"
+            if arc in seen:
+                arc = f"{i:05d}_{arc}"
+            seen.add(arc)
+            zf.write(job / im["output"], arc)
+    tmp.rename(job / "out.zip")
+
+def process_batch(job: Path, kind: str) -> None:
+    """
+    The images of batch.json back to back on one overlay load and one
+    register setup - the drivers shadow the registers, so only a change of
+    image size costs MMIO writes.  As in ``process_video`` decoding and JPEG
+    encoding run on their own threads while the accelerator works, and the
+    accelerator alternates between ``ACCEL_SLOTS`` output buffers.  An image
+    that fails to decode gets an ``error`` in batch.json; the others are
+    written to out/ and zipped into out.zip.
+    """
+    log.info("▶ BATCH job %s (%s)", job.name, kind)
+    timer = StageTimer(job)
+    with timer("load_overlay"):
+        load_overlay(kind)
+    write_status(job, "kernel_loaded")
+
+    manifest = read_batch(job)
+    if manifest is None:
+        raise RuntimeError("batch.json missing")
+    images = manifest["images"]
+    tot = len(images)
+    cfg = job_config(job, kind)
+    (job / "out").mkdir(exist_ok=True)
+
+    stop      = threading.Event()
+    frames_q  = queue.Queue(PIPE_DEPTH)     # decoder → accelerator: (index, rgb | exception)
+    results_q = queue.Queue(PIPE_DEPTH)     # accelerator → encoder: (index, slot, out, ms)
+    free_slots = queue.Queue()
+    for slot in range(ACCEL_SLOTS):
+        free_slots.put(slot)
+    done, total_ms = 0, 0.0
+
+    def decode() -> None:
+        for i, im in enumerate(images):
+            if stop.is_set():
+                return
+            try:
+                with timer("decode"), Image.open(job / im["input"]) as src:
+                    img = np.array(src.convert("RGB"))
+            except Exception as exc:
+                img = exc
+            if not _put(frames_q, (i, img), stop):
+                return
+        _put(frames_q, _EOS, stop)
+
+    def encode() -> None:
+        nonlocal done
+        while (item := _get(results_q, stop)) is not _EOS:
+            i, slot, out, t_ms = item
+            im = images[i]
+            if isinstance(out, Exception):
+                im["error"] = str(out) or type(out).__name__
+            else:
+                if slot is not None:            # a DMA view - copy it out, free the slot
+                    with timer("unpack"):
+                        out = unpack(out)
+                    free_slots.put(slot)
+                with timer("encode"):
+                    Image.fromarray(out).save(job / "out" / f"{i:05d}.jpg")
+                im.update(output=f"out/{i:05d}.jpg", hw_time=f"{t_ms:.2f} ms")
+            done += 1
+            # update every 5 images to limit disk I/O
+            if done % 5 == 0 or done == tot:
+                write_batch(job, manifest)
+                write_status(job, "processing", progress=(done, tot))
+
+    write_status(job, "processing", progress=(0, tot))
+    t0 = time.perf_counter()
+    stages = [_Stage("decode", decode, stop), _Stage("encode", encode, stop)]
+    for st in stages:
+        st.start()
+    try:
+        while (item := _get(frames_q, stop)) is not _EOS:
+            i, img = item
+            if isinstance(img, Exception):
+                _put(results_q, (i, None, img, 0.0), stop)
+                continue
+            slot = _get(free_slots, stop)
+            if slot is _EOS:
+                break
+            if _needs_tiling(img):              # stitched into its own array
+                out, t_ms = run_tiled(img, cfg, halo=_halo(kind), timer=timer, slot=slot)
+                free_slots.put(slot)
+                slot = None
+            else:
+                out, t_ms = run_accelerator(img, cfg, slot=slot, timer=timer)
+            total_ms += t_ms
+            _put(results_q, (i, slot, out, t_ms), stop)
+        _put(results_q, _EOS, stop)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for st in stages:
+            st.join()
+    for st in stages:
+        if st.exc is not None:
+            raise st.exc
+    wall = time.perf_counter() - t0
+
+    ok = [im for im in images if "output" in im]
+    if not ok:
+        write_batch(job, manifest)
+        raise RuntimeError("no image of the batch could be decoded")
+    with timer("zip"):
+        _zip_results(job, images)
+    shutil.copyfile(job / ok[0]["output"], job / "out.jpg")    # history preview
+    thumbs.make_thumbnail(job)
+
+    note = f"{total_ms:.2f} ms ({len(ok)} img, avg {total_ms/len(ok):.2f} ms/img"
+    note += f", {tot - len(ok)} failed)" if len(ok) < tot else ")"
+    (job / "hw_time.txt").write_text(note)
+    write_batch(job, manifest)
+    write_status(job, "finished", note=note, progress=(tot, tot), timings=timer.as_ms())
+    (job / "done.txt").write_text("done")
+    log.info("✔ BATCH job %s finished (%s, %.1f img/s)", job.name, note, tot/max(wall, 1e-9))
 
 # --------------------------------------------------------------------------- #
 # Startup recovery
 # --------------------------------------------------------------------------- #
+def sweep_uploads() -> None:
+    gone = uploads.expire(JOBS_DIR)
+    if gone:
+        jobqueue.forget(gone)           # parked ones are in the index
+        log.info("dropped %d abandoned upload(s)", len(gone))
+
+
 def reset_incomplete_jobs() -> None:
     """
     If the worker crashed mid‑job, stage == 'processing'/'merging'.
@@ -277,55 +620,274 @@ def reset_incomplete_jobs() -> None:
     for job in JOBS_DIR.iterdir():
         if (job / "done.txt").exists() or (job / "error.txt").exists():
             continue
-        st = _read_status(job).get("stage", "queued")
+        st = read_status(job).get("stage", "queued")
         if st in ("processing", "merging", "kernel_loaded"):
             log.warning("restoring job %s from interrupted state «%s»", job.name, st)
             write_status(job, "queued")
 
+# --------------------------------------------------------------------------- #
+# Heterogeneous dispatch - exclusive FPGA lane + optional CPU lane
+# --------------------------------------------------------------------------- #
+class CostModel:
+    """EWMA of measured seconds per megapixel for each (lane, kind)."""
+
+    def __init__(self):
+        self.rate: dict[tuple[str, str], float] = {}
+        self.reload_s = PRIOR_RELOAD_S
+        self.lock = threading.Lock()
+
+    def observe(self, lane: str, kind: str, seconds: float, mpix: float) -> None:
+        if mpix <= 0:
+            return
+        r = seconds / mpix
+        with self.lock:
+            old = self.rate.get((lane, kind))
+            self.rate[(lane, kind)] = r if old is None else old + EWMA_ALPHA * (r - old)
+
+    def observe_reload(self, seconds: float) -> None:
+        with self.lock:
+            self.reload_s += EWMA_ALPHA * (seconds - self.reload_s)
+
+    def estimate(self, lane: str, kind: str, mpix: float) -> float:
+        with self.lock:
+            return self.rate.get((lane, kind), PRIOR_S_PER_MP[lane]) * mpix
+
+def job_megapixels(job: Path, kind: str) -> float:
+    """Work size of a job from the input's header (all frames for videos)."""
+    try:
+        if kind.endswith("_batch"):
+            mpix = 0.0
+            for im in read_batch(job)["images"]:
+                with Image.open(job / im["input"]) as src:
+                    mpix += src.size[0] * src.size[1] / 1e6
+            return mpix
+        if kind.endswith("_video"):
+            cap = cv2.VideoCapture(str(job / "in.mp4"))
+            try:
+                w, h = cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+                return w * h * max(cap.get(cv2.CAP_PROP_FRAME_COUNT), 1) / 1e6
+            finally:
+                cap.release()
+        with Image.open(job / "in.jpg") as im:
+            return im.size[0] * im.size[1] / 1e6
+    except Exception:
+        return 1.0
+
+class FpgaLane(threading.Thread):
+    """
+    The only thread that touches the overlay and DMA: runs its backlog in
+    order and reports each job to ``on_done(job, kind, mpix, ok, seconds)``.
+    """
+
+    def __init__(self, model: CostModel, on_done):
+        super().__init__(name="fpga", daemon=True)
+        self.model, self.on_done = model, on_done
+        self.backlog: collections.deque = collections.deque()   # (job, kind, mpix, est_s)
+        self.running: Optional[tuple[str, float]] = None        # (kind, expected end)
+        self.cond = threading.Condition()
+
+    def submit(self, job: Path, kind: str, mpix: float, est_s: float) -> None:
+        with self.cond:
+            self.backlog.append((job, kind, mpix, est_s))
+            self.cond.notify()
+
+    def idle(self) -> bool:
+        with self.cond:
+            return not self.backlog and self.running is None
+
+    def pending_s(self) -> float:
+        """Estimated seconds until the lane could start a new job."""
+        with self.cond:
+            left = max(self.running[1] - time.monotonic(), 0.0) if self.running else 0.0
+            return left + sum(b[3] for b in self.backlog)
+
+    def tail_overlay(self) -> Optional[str]:
+        """Overlay loaded once the backlog has run."""
+        with self.cond:
+            if self.backlog:
+                return jobqueue.overlay_of(self.backlog[-1][1])
+            if self.running:
+                return jobqueue.overlay_of(self.running[0])
+        return loaded_kernel
+
+    def run(self) -> None:
+        while True:
+            with self.cond:
+                while not self.backlog:
+                    self.cond.wait()
+                job, kind, mpix, est_s = self.backlog.popleft()
+                self.running = (kind, time.monotonic() + est_s)
+            t0, load0 = time.perf_counter(), overlay_load_s
+            ok = False
+            try:                        # this thread must outlive any job
+                ok = run_job(job, kind)
+            except Exception:
+                log.exception("FPGA lane: job %s failed outside run_job", job.name)
+            finally:
+                reload_s = overlay_load_s - load0
+                with self.cond:
+                    self.running = None
+            try:
+                if reload_s:
+                    self.model.observe_reload(reload_s)
+                # the cost model is per job - overlay reloads are estimated separately
+                self.on_done("fpga", job, kind, mpix, ok, time.perf_counter() - t0 - reload_s)
+            except Exception:
+                log.exception("FPGA lane: reporting job %s failed", job.name)
+
+class Dispatcher:
+    """
+    Sends every claimed job to the lane with the earlier estimated
+    completion: the FPGA after its backlog (plus a reload when the overlay
+    differs), or a free CPU process.  Videos only go to the CPU lane when
+    all of its processes are free.
+    """
+
+    def __init__(self, cpu_workers: int):
+        self.model = CostModel()
+        self.cpu = CpuLane(cpu_workers) if cpu_workers > 0 else None
+        self.fpga = FpgaLane(self.model, self._finished)
+        self.freed = threading.Event()   # set whenever a lane finishes a job
+        self.fpga.start()
+
+    def can_take(self) -> bool:
+        return self.fpga.idle() or (self.cpu is not None and self.cpu.free_slots() > 0)
+
+    def dispatch(self, job: Path, kind: str) -> str:
+        """Hand *job* to a lane; returns its name ("fpga" | "cpu")."""
+        mpix = job_megapixels(job, kind)
+        est_f = self.model.estimate("fpga", kind, mpix)
+        eta_f = self.fpga.pending_s() + est_f
+        if jobqueue.overlay_of(kind) != self.fpga.tail_overlay():
+            eta_f += self.model.reload_s
+        if self._cpu_can_run(kind):
+            eta_c = self.model.estimate("cpu", kind, mpix)
+            if eta_c < eta_f:
+                log.debug("job %s → CPU (eta %.2f s vs FPGA %.2f s)", job.name, eta_c, eta_f)
+                on_done = lambda ok, dt: self._finished("cpu", job, kind, mpix, ok, dt)
+                if kind in CPU_VIDEO_KINDS:
+                    cap = (TILED_MAX_W, TILED_MAX_H) if TILING else (MAX_W, MAX_H)
+                    self.cpu.submit_video(job, kind, cap, on_done)
+                else:
+                    self.cpu.submit(job, kind, on_done)
+                return "cpu"
+        log.debug("job %s → FPGA (eta %.2f s)", job.name, eta_f)
+        self.fpga.submit(job, kind, mpix, est_f)
+        return "fpga"
+
+    def _cpu_can_run(self, kind: str) -> bool:
+        if self.cpu is None:
+            return False
+        free = self.cpu.free_slots()
+        if kind in CPU_VIDEO_KINDS:
+            return free == self.cpu.workers
+        return kind in CPU_KINDS and free > 0
+
+    def _finished(self, lane: str, job: Path, kind: str, mpix: float,
+                  ok: bool | None, seconds: float) -> None:
+        if ok is None:                  # parked - not finished
+            self.freed.set()
+            return
+        if ok:
+            self.model.observe(lane, kind, seconds, mpix)
+        elif job.is_dir() and not (job / "error.txt").exists():   # the CPU process died
+            (job / "error.txt").write_text(f"{lane} lane failed")
+            write_status(job, "error", note=f"{lane} lane failed")
+        jobqueue.finish(job.name, "done" if ok else "error")
+        jobqueue.bump(f"jobs_{lane}")
+        record_job(job, kind, lane, ok)
+        self.freed.set()
+
+    def shutdown(self) -> None:
+        if self.cpu is not None:
+            self.cpu.shutdown()
+
 # --------------------------------------------------------------------------- #
 # Main loop
 # --------------------------------------------------------------------------- #
+def run_job(job: Path, kind: str) -> bool | None:
+    """
+    Run one job; failures are recorded in the job dir.  Returns success, or
+    None when a too slow upload handed the job back (``park_upload``).
+    """
+    try:
+        cur_stage = read_status(job).get("stage", "queued")
+        if cur_stage == "queued":
+            write_status(job, "receiving")
+
+        if kind in ("grayscale", "filter"):
+            process_image(job, kind)
+        elif kind in ("grayscale_video", "filter_video"):
+            process_video(job, kind)
+        elif kind in ("grayscale_batch", "filter_batch"):
+            process_batch(job, kind)
+        else:
+            raise ValueError(f"unknown kernel «{kind}»")
+        return True
+
+    except uploads.Stalled as exc:
+        log.info("job %s: %s - runs again once the upload is complete", job.name, exc)
+        park_upload(job)
+        return None
+    except Exception as exc:
+        if not job.is_dir():            # deleted (DELETE /api/history/) while queued or running
+            log.warning("job %s was deleted before it finished", job.name)
+            return False
+        log.error("Exception while processing %s: %s", job.name, exc)
+        log.debug("Trace:\n%s", traceback.format_exc())
+        (job / "error.txt").write_text(str(exc))
+        write_status(job, "error", note=str(exc))
+        return False
+
 def main() -> None:
     log.info("Worker started, watching %s", JOBS_DIR)
+    JOBS_DIR.mkdir(parents=True, exist_ok=True)
     reset_incomplete_jobs()
+    jobqueue.requeue_running()
+    added = jobqueue.backfill(JOBS_DIR)
+    if added:
+        log.info("indexed %d job dir(s) missing from %s", added, jobqueue.QUEUE_DB.name)
 
-    while True:
-        # FIFO: earliest mtime first
-        pending = sorted(
-            (j for j in JOBS_DIR.iterdir()
-             if not (j / "done.txt").exists() and not (j / "error.txt").exists()),
-            key=lambda p: p.stat().st_mtime
-        )
-        if not pending:
-            time.sleep(0.5)
-            continue
-
-        job = pending[0]
-        try:
-            kind = (job / "kernel.txt").read_text().strip()
-        except FileNotFoundError:
-            log.error("job %s has no kernel.txt → marking error", job.name)
-            (job / "error.txt").write_text("missing kernel")
-            write_status(job, "error", note="missing kernel.txt")
-            continue
-
-        try:
-            cur_stage = _read_status(job).get("stage", "queued")
-            if cur_stage == "queued":
-                write_status(job, "receiving")
-
-            if kind in ("grayscale", "filter"):
-                process_image(job, kind)
-            elif kind in ("grayscale_video", "filter_video"):
-                process_video(job, kind)
-            else:
-                raise ValueError(f"unknown kernel «{kind}»")
-
-        except Exception as exc:
-            log.error("Exception while processing %s: %s", job.name, exc)
-            log.debug("Trace:\n%s", traceback.format_exc())
-            (job / "error.txt").write_text(str(exc))
-            write_status(job, "error", note=str(exc))
+    try:
+        wake = notify.Subscriber(jobqueue.WAKE_CHANNEL)
+    except OSError as exc:
+        log.warning("no wake-up channel (%s) - polling every %.0f s", exc, IDLE_WAIT_S)
+        wake = None
+
+    lanes = Dispatcher(CPU_WORKERS)
+    if lanes.cpu is not None:
+        log.info("CPU lane: %d software worker process(es)", CPU_WORKERS)
+    next_sweep = 0.0
+    try:
+        while True:
+            if time.monotonic() >= next_sweep:
+                sweep_uploads()
+                next_sweep = time.monotonic() + UPLOAD_SWEEP_S
+            lanes.freed.clear()
+            if not lanes.can_take():
+                lanes.freed.wait(IDLE_WAIT_S)
+                continue
+            # FIFO by sequence number, grouped by the overlay the FPGA lane
+            # will have loaded once its backlog has run, within bounds
+            overlay = lanes.fpga.tail_overlay()
+            row, reordered = jobqueue.claim_next(overlay, AFFINITY_MAX_BYPASS,
+                                                 AFFINITY_MAX_WAIT_S)
+            if row is None:
+                jobqueue.wait_for_work(wake, IDLE_WAIT_S)
+                continue
+
+            job, kind = JOBS_DIR / row["job_id"], row["kind"]
+            if not job.is_dir():
+                log.warning("job %s was deleted before it ran", job.name)
+                jobqueue.finish(job.name, "error")
+                continue
+            if lanes.dispatch(job, kind) == "fpga" and reordered:
+                jobqueue.bump("overlay_reloads_avoided")
+                log.debug("job %s runs early on the %s overlay", job.name, overlay)
+    finally:
+        lanes.shutdown()
+        if wake is not None:
+            wake.close()
 
 
 if __name__ == "__main__":